@@ -0,0 +1,10 @@
+import sys
+from src.benchmark.runner import main
+
+# Example:
+#   python benchmark.py --baseline benchmarks/baseline.json --save-baseline
+#   python benchmark.py --baseline benchmarks/baseline.json --tolerance 0.25
+#   python benchmark.py get_bars get_column_data --repeats 10
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import os
+import cv2
+import numpy as np
+
+# BGR colors of the drawing layers
+BEAM_COLOR = (0, 0, 255)
+COLUMN_COLOR = (255, 255, 0)
+HORIZONTAL_SCALE_COLOR = (0, 255, 255)
+VERTICAL_SCALE_COLOR = (255, 0, 0)
+TEXT_COLOR = (0, 0, 0)
+
+BEAM_SIZE = (2400, 900)
+PAGE_SIZE = (6000, 4000)
+BEAM_ORIGINS = [(200, 300), (3000, 300), (200, 1600), (3000, 1600)]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Real drawing shipped with the repo, used for the PDF rendering stage
+TEST_PDF = os.path.join(REPO_ROOT, "test_pdf.pdf")
+
+
+def put_label(image, text, origin, scale=1.2, thickness=2):
+    """
+    Draws a text label and returns its box as ((x_min, y_min), (x_max, y_max)).
+    """
+    (width, height), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, thickness)
+    x, y = origin
+    cv2.putText(image, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, scale, TEXT_COLOR, thickness)
+    return (x, y - height), (x + width, y + baseline)
+
+
+def make_beam_image():
+    """
+    Builds a synthetic beam crop: red bars with hooks, one bottom bar split in two fragments,
+    a cyan beam outline with stirrups and black bar callouts.
+
+    Returns:
+        tuple: The BGR image and a dict with the callout "texts" as {"coordinates", "text"} entries.
+    """
+    width, height = BEAM_SIZE
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+
+    # Beam outline, supports and stirrups
+    cv2.line(image, (100, 150), (2300, 150), COLUMN_COLOR, 3)
+    cv2.line(image, (100, 650), (2300, 650), COLUMN_COLOR, 3)
+    for x in (100, 2300):
+        cv2.line(image, (x, 100), (x, 700), COLUMN_COLOR, 3)
+    for x in range(250, 2200, 150):
+        cv2.line(image, (x, 165), (x, 635), COLUMN_COLOR, 2)
+
+    # Top bar with hooks, an extra top bar and a bottom bar in two fragments
+    cv2.line(image, (130, 200), (2270, 200), BEAM_COLOR, 3)
+    cv2.line(image, (130, 200), (130, 350), BEAM_COLOR, 3)
+    cv2.line(image, (2270, 200), (2270, 350), BEAM_COLOR, 3)
+    cv2.line(image, (600, 225), (1800, 225), BEAM_COLOR, 3)
+    cv2.line(image, (130, 600), (1190, 600), BEAM_COLOR, 3)
+    cv2.line(image, (1205, 600), (2270, 600), BEAM_COLOR, 3)
+    cv2.line(image, (130, 450), (130, 600), BEAM_COLOR, 3)
+    cv2.line(image, (2270, 450), (2270, 600), BEAM_COLOR, 3)
+
+    texts = []
+    for text, origin in [("2-#20 (A)", (1000, 110)), ("1-#16 EXTRA", (1050, 275)),
+                         ("2-#20 (B)+1-#25", (950, 760)), ("#10 @ 6\" C/C", (400, 840)),
+                         ("#10 @ 8\" C/C", (1600, 840))]:
+        texts.append({"coordinates": put_label(image, text, origin), "text": text})
+
+    return image, {"texts": texts}
+
+
+def make_page_image():
+    """
+    Builds a synthetic drawing sheet with four beams, a yellow horizontal scale and a blue vertical scale.
+
+    Returns:
+        tuple: The BGR image and a dict with the "beam_detections" and "scale_detections" a detector
+            would return, as (N, 6) arrays of x1, y1, x2, y2, conf, cls.
+    """
+    width, height = PAGE_SIZE
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    beam, _ = make_beam_image()
+    beam_height, beam_width = beam.shape[:2]
+
+    beam_detections = []
+    for x, y in BEAM_ORIGINS:
+        page[y:y + beam_height, x:x + beam_width] = beam
+        beam_detections.append([x, y, x + beam_width, y + beam_height, 0.9, 0])
+
+    # Horizontal scale, a line with its length written above it
+    cv2.line(page, (500, 3400), (1500, 3400), HORIZONTAL_SCALE_COLOR, 4)
+    put_label(page, "5'-0\"", (900, 3350), scale=1.5, thickness=3)
+
+    # Vertical scale, the beam detector reports it next to the beams
+    cv2.line(page, (5500, 2900), (5500, 3700), VERTICAL_SCALE_COLOR, 4)
+    put_label(page, "2'-0\"", (5530, 3300), scale=1.5, thickness=3)
+
+    vertical_box = [5450, 2850, 5650, 3750, 0.9, 1]
+    scale_detections = [[450, 3280, 1550, 3430, 0.9, 0], vertical_box]
+
+    return page, {
+        "beam_detections": np.array(beam_detections + [vertical_box], dtype=np.float32),
+        "scale_detections": np.array(scale_detections, dtype=np.float32),
+    }
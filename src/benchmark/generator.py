@@ -0,0 +1,410 @@
+import argparse
+import json
+import math
+import os
+import string
+import sys
+import fitz  # PyMuPDF
+import numpy as np
+from src.pdf_to_image.pdf_to_image import render_page
+
+# Landscape page sizes in PDF points
+PAGE_SIZES = {
+    "a0": (3370, 2384),
+    "a1": (2384, 1684),
+    "a2": (1684, 1191),
+    "a3": (1191, 842),
+    "a4": (842, 595),
+}
+
+# RGB colors inside the HSV ranges of create_image_mask/clean_mask_image and the scale palette
+BEAM_RGB = (1, 0, 0)
+COLUMN_RGB = (0, 1, 1)
+HORIZONTAL_SCALE_RGB = (1, 0.85, 0)
+VERTICAL_SCALE_RGB = (0, 0, 1)
+TEXT_RGB = (0, 0, 0)
+
+# Drawing scale 1/2" = 1'-0", one foot of the structure is 36 points on the sheet
+POINTS_PER_INCH = 3
+MARGIN = 36
+SCALE_STRIP = 90
+BEAM_ASPECT = 3
+# Share of a grid cell's height between the top bar band and the beam center, see layout_sheet
+SPACING_SHARE = 0.3 * 0.88
+
+# Bar names of the parse_text grammar, Q is the marker letter and never a name
+BAR_NAMES = [letter for letter in string.ascii_uppercase if letter != "Q"]
+BAR_DIAMETERS = [10, 12, 16, 20, 25, 32]
+
+
+def _feet_inches(inches):
+    return f"{int(inches // 12)}'-{int(inches % 12)}\""
+
+
+def layout_sheet(bars=100, bars_per_beam=8, page_size="a1", hook_ratio=0.5, fragment_ratio=0.2,
+                 dpi=300, min_spacing_px=12, seed=0):
+    """
+    Places beams, bars, hooks, callouts and scales on a sheet. Beams are laid out in a grid of BEAM_ASPECT cells,
+    dense sheets get more columns of shorter beams until the bars are min_spacing_px apart. At the default
+    300 DPI, 10,000 bars fit on a0 with up to 16 bars per beam and on a1 with up to 4.
+
+    Args:
+        bars (int): Total number of bars on the sheet.
+        bars_per_beam (int): Bars per beam, half of them top steel and half bottom steel.
+        page_size (str or tuple): Name in PAGE_SIZES or (width, height) in points.
+        hook_ratio (float): Probability that a bar end has a hook.
+        fragment_ratio (float): Probability that a bar is drawn as two or three fragments with small gaps.
+        dpi (int): Resolution the spacing checks are made for.
+        min_spacing_px (int): Smallest allowed distance between neighbouring bars at dpi.
+        seed (int): Seed of the random choices.
+
+    Returns:
+        dict: The sheet layout in PDF points. Raises ValueError if the bars cannot be min_spacing_px apart.
+    """
+    if bars < 1 or bars_per_beam < 1:
+        raise ValueError("bars and bars_per_beam must be at least 1")
+
+    width, height = PAGE_SIZES[page_size.lower()] if isinstance(page_size, str) else page_size
+    rng = np.random.default_rng(seed)
+    to_px = dpi / 72
+
+    beam_count = math.ceil(bars / bars_per_beam)
+    area_width, area_height = width - 2 * MARGIN, height - 2 * MARGIN - SCALE_STRIP
+    columns = max(1, min(beam_count, round(math.sqrt(beam_count * area_width / (area_height * BEAM_ASPECT)))))
+    rows = math.ceil(beam_count / columns)
+
+    # Bars are spread over SPACING_SHARE of the cell height, so dense sheets trade rows for columns,
+    # i.e. shorter and narrower beams, until the bars are min_spacing_px apart or the cells become square
+    min_cell_height = min_spacing_px / to_px * (math.ceil(min(bars_per_beam, bars) / 2) + 1) / SPACING_SHARE
+    max_rows = int(area_height // min_cell_height)
+    if rows > max_rows:
+        rows = max_rows
+        columns = math.ceil(beam_count / rows) if rows else math.inf
+        if area_width / columns < min_cell_height:
+            raise ValueError(f"{beam_count} beams of {bars_per_beam} bars do not fit {min_spacing_px}px apart at "
+                             f"{dpi} DPI, use a larger page, fewer bars per beam or a higher DPI")
+    cell_width, cell_height = area_width / columns, area_height / rows
+
+    beams = []
+    remaining = bars
+    for index in range(beam_count):
+        count = min(bars_per_beam, remaining)
+        remaining -= count
+
+        row, column = divmod(index, columns)
+        x0 = MARGIN + column * cell_width + 0.06 * cell_width
+        x1 = MARGIN + (column + 1) * cell_width - 0.06 * cell_width
+        y0 = MARGIN + row * cell_height + 0.06 * cell_height
+        y1 = MARGIN + (row + 1) * cell_height - 0.06 * cell_height
+
+        # Callouts go in bands above and below the beam outline
+        band = 0.2 * (y1 - y0)
+        top, bottom = y0 + band, y1 - band
+        center = (top + bottom) / 2
+        left, right = x0 + 0.03 * (x1 - x0), x1 - 0.03 * (x1 - x0)
+        cover = 0.02 * (right - left)
+
+        top_count = math.ceil(count / 2)
+        bottom_count = count - top_count
+        spacing = (center - top) / (top_count + 1)
+        if spacing * to_px < min_spacing_px:
+            raise ValueError(f"Bars would be {spacing * to_px:.1f}px apart at {dpi} DPI, use a larger page, "
+                             f"fewer bars per beam or a higher DPI")
+
+        fontsize = min(9, 0.3 * band, 0.8 * spacing * max(top_count, 1))
+        beam_bars = []
+        for position, (steel, side_count) in enumerate([("Top Steel", top_count), ("Bottom Steel", bottom_count)]):
+            for i in range(side_count):
+                # Top bars stack down from the top of the beam, bottom bars up from the bottom
+                y = top + spacing * (i + 1) if position == 0 else bottom - spacing * (i + 1)
+                hook_direction = 1 if position == 0 else -1
+                hook_length = min(0.8 * (center - top), 0.1 * (right - left))
+
+                # Through bars span the beam, the others a random part of it
+                if i == 0 or rng.random() < 0.5:
+                    start, end = left + cover, right - cover
+                else:
+                    span = rng.uniform(0.3, 0.7) * (right - left)
+                    start = rng.uniform(left + cover, right - cover - span)
+                    end = start + span
+
+                pieces = 1 if rng.random() >= fragment_ratio else int(rng.integers(2, 4))
+                gap = 8 / to_px
+                cuts = np.sort(rng.uniform(start + 0.2 * (end - start), end - 0.2 * (end - start), pieces - 1))
+                bounds = [start] + [value for cut in cuts for value in (cut - gap / 2, cut + gap / 2)] + [end]
+                fragments = [(bounds[k], bounds[k + 1]) for k in range(0, len(bounds), 2)]
+
+                name = BAR_NAMES[len(beam_bars) % len(BAR_NAMES)]
+                quantity, diameter = int(rng.integers(2, 7)), int(rng.choice(BAR_DIAMETERS))
+                callout = f"{quantity}-{diameter}{'Q' if rng.random() < 0.3 else ''}({name})"
+
+                beam_bars.append({
+                    "type": steel,
+                    "name": name,
+                    "quantity": quantity,
+                    "diameter": diameter,
+                    "callout": callout,
+                    "y": y,
+                    "start": start,
+                    "end": end,
+                    "fragments": fragments,
+                    "start_hook": hook_direction * hook_length if rng.random() < hook_ratio else 0,
+                    "end_hook": hook_direction * hook_length if rng.random() < hook_ratio else 0,
+                })
+
+        # Spread the callouts of each side over its band
+        for steel, band_top in [("Top Steel", y0), ("Bottom Steel", bottom)]:
+            side = [bar for bar in beam_bars if bar["type"] == steel]
+            for i, bar in enumerate(side):
+                slot = (right - left) / len(side)
+                text_width = fitz.get_text_length(bar["callout"], fontname="helv", fontsize=fontsize)
+                bar["callout_origin"] = (left + slot * (i + 0.5) - text_width / 2, band_top + band / 2 + fontsize / 3)
+                bar["callout_box"] = (bar["callout_origin"][0], bar["callout_origin"][1] - fontsize,
+                                      bar["callout_origin"][0] + text_width, bar["callout_origin"][1] + 0.25 * fontsize)
+
+        beams.append({
+            "box": (x0, y0, x1, y1),
+            "outline": (left, top, right, bottom),
+            "center": center,
+            "fontsize": fontsize,
+            "bars": beam_bars,
+        })
+
+    # Scale bars in the strip along the bottom of the sheet
+    strip_top = height - MARGIN - SCALE_STRIP
+    horizontal_inches, vertical_inches = 60, 24
+    horizontal_length = horizontal_inches * POINTS_PER_INCH
+    vertical_length = vertical_inches * POINTS_PER_INCH
+    scales = {
+        "horizontal": {
+            "line": (MARGIN + 20, strip_top + 70, MARGIN + 20 + horizontal_length, strip_top + 70),
+            "text": _feet_inches(horizontal_inches),
+            "text_origin": (MARGIN + 20 + horizontal_length / 2 - 15, strip_top + 60),
+            "inches": horizontal_inches,
+        },
+        "vertical": {
+            "line": (width - MARGIN - 40, strip_top + 8, width - MARGIN - 40, strip_top + 8 + vertical_length),
+            "text": _feet_inches(vertical_inches),
+            "text_origin": (width - MARGIN - 30, strip_top + 8 + vertical_length / 2 - 15),
+            "inches": vertical_inches,
+        },
+    }
+
+    return {"page_size": (width, height), "dpi": dpi, "seed": seed, "beams": beams, "scales": scales}
+
+
+def draw_pdf(layout, pdf_path):
+    """
+    Writes the layout as a one page vector PDF, with one drawing per color so thousands of bars stay cheap.
+    """
+    width, height = layout["page_size"]
+    document = fitz.open()
+    page = document.new_page(width=width, height=height)
+
+    columns = page.new_shape()
+    beams = page.new_shape()
+    for beam in layout["beams"]:
+        left, top, right, bottom = beam["outline"]
+        columns.draw_line((left, top), (right, top))
+        columns.draw_line((left, bottom), (right, bottom))
+        extension = 0.1 * (bottom - top)
+        for x in (left, right):
+            columns.draw_line((x, top - extension), (x, bottom + extension))
+
+        for bar in beam["bars"]:
+            for start, end in bar["fragments"]:
+                beams.draw_line((start, bar["y"]), (end, bar["y"]))
+            if bar["start_hook"]:
+                beams.draw_line((bar["start"], bar["y"]), (bar["start"], bar["y"] + bar["start_hook"]))
+            if bar["end_hook"]:
+                beams.draw_line((bar["end"], bar["y"]), (bar["end"], bar["y"] + bar["end_hook"]))
+
+    columns.finish(color=COLUMN_RGB, width=1)
+    beams.finish(color=BEAM_RGB, width=1.5)
+    columns.commit()
+    beams.commit()
+
+    scales = page.new_shape()
+    for key, color in [("horizontal", HORIZONTAL_SCALE_RGB), ("vertical", VERTICAL_SCALE_RGB)]:
+        x1, y1, x2, y2 = layout["scales"][key]["line"]
+        scales.draw_line((x1, y1), (x2, y2))
+        scales.finish(color=color, width=2)
+    scales.commit()
+
+    # One shape for all callouts, inserting them one by one rewrites the page each time
+    callouts = page.new_shape()
+    for beam in layout["beams"]:
+        for bar in beam["bars"]:
+            callouts.insert_text(bar["callout_origin"], bar["callout"], fontsize=beam["fontsize"], fontname="helv", color=TEXT_RGB)
+    callouts.commit()
+
+    page.insert_text(layout["scales"]["horizontal"]["text_origin"], layout["scales"]["horizontal"]["text"], fontsize=10, color=TEXT_RGB)
+    page.insert_text(layout["scales"]["vertical"]["text_origin"], layout["scales"]["vertical"]["text"], fontsize=10, color=TEXT_RGB, rotate=90)
+
+    document.save(pdf_path)
+    document.close()
+    return pdf_path
+
+
+def ground_truth(layout):
+    """
+    Converts the layout to ground truth in pixels of the PNG render, with bars in the format get_bars returns.
+    """
+    to_px = layout["dpi"] / 72
+    pixels_per_inch = POINTS_PER_INCH * to_px
+
+    def px(values):
+        return [round(value * to_px, 2) for value in values]
+
+    beams = []
+    for beam in layout["beams"]:
+        bars = []
+        for bar in beam["bars"]:
+            y = bar["y"]
+            start_vertical = [px((bar["start"], y, bar["start"], y + bar["start_hook"]))] if bar["start_hook"] else []
+            end_vertical = [px((bar["end"], y, bar["end"], y + bar["end_hook"]))] if bar["end_hook"] else []
+            horizontal_length = (bar["end"] - bar["start"]) * to_px
+            vertical_length = (abs(bar["start_hook"]) + abs(bar["end_hook"])) * to_px
+            bars.append({
+                "horizontal_bar": px((bar["start"], y, bar["end"], y)),
+                "start_vertical_bars": start_vertical,
+                "end_vertical_bars": end_vertical,
+                "fragments": [px((start, y, end, y)) for start, end in bar["fragments"]],
+                "horizontal_length": round(horizontal_length, 2),
+                "vertical_length": round(vertical_length, 2),
+                "total_length": round(horizontal_length + vertical_length, 2),
+                "total_length_inches": round((horizontal_length + vertical_length) / pixels_per_inch, 2),
+                "type": bar["type"],
+                "name": bar["name"],
+                "quantity": bar["quantity"],
+                "diameter": bar["diameter"],
+                "callout": bar["callout"],
+                "callout_box": px(bar["callout_box"]),
+            })
+
+        beams.append({
+            "box": px(beam["box"]),
+            "outline": px(beam["outline"]),
+            "center_height": round(beam["center"] * to_px, 2),
+            "bars": bars,
+        })
+
+    scales = {}
+    for key, scale in layout["scales"].items():
+        x1, y1, x2, y2 = px(scale["line"])
+        scales[key] = {
+            "line": [x1, y1, x2, y2],
+            "pixel_length": round(math.hypot(x2 - x1, y2 - y1), 2),
+            "text": scale["text"],
+            "inches": scale["inches"],
+        }
+
+    width, height = layout["page_size"]
+    return {
+        "page": {"width_pt": width, "height_pt": height, "dpi": layout["dpi"],
+                 "width_px": math.ceil(width * to_px), "height_px": math.ceil(height * to_px)},
+        "seed": layout["seed"],
+        "bar_count": sum(len(beam["bars"]) for beam in beams),
+        "scales": scales,
+        "beams": beams,
+    }
+
+
+def generate_sheet(output_dir, name="synthetic", png=True, **layout_kwargs):
+    """
+    Writes a synthetic beam elevation sheet as a vector PDF, optionally a PNG render, and its ground truth.
+
+    Args:
+        output_dir (str): Folder to write to.
+        name (str): Base name of the files.
+        png (bool): Also render the sheet to a PNG at the layout DPI.
+        **layout_kwargs: Arguments of layout_sheet (bars, bars_per_beam, page_size, hook_ratio, ...).
+
+    Returns:
+        dict: Paths of the "pdf", "png" (None when not rendered) and "truth" files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    layout = layout_sheet(**layout_kwargs)
+
+    pdf_path = draw_pdf(layout, os.path.join(output_dir, f"{name}.pdf"))
+
+    png_path = None
+    if png:
+        with fitz.open(pdf_path) as document:
+            png_path = render_page(document.load_page(0), os.path.join(output_dir, f"{name}.png"), layout["dpi"])
+
+    truth_path = os.path.join(output_dir, f"{name}.json")
+    with open(truth_path, "w") as f:
+        json.dump(ground_truth(layout), f, indent=2)
+
+    return {"pdf": pdf_path, "png": png_path, "truth": truth_path}
+
+
+def score_bars(predicted, expected, offset=(0, 0), tolerance=10):
+    """
+    Matches detected bars to ground truth bars by their horizontal bar endpoints.
+
+    Args:
+        predicted (list): Bars as returned by get_bars, in the coordinates of the image they were found in.
+        expected (list): Ground truth bars of the same beam.
+        offset (tuple): (x, y) of the image's top left corner in page pixels, added to the predicted bars.
+        tolerance (float): Largest endpoint distance in pixels for a match.
+
+    Returns:
+        dict: Matched count, precision and recall.
+    """
+    def endpoints(bar, dx=0, dy=0):
+        x1, y1, x2, y2 = bar["horizontal_bar"]
+        (x1, y1), (x2, y2) = sorted([(x1 + dx, y1 + dy), (x2 + dx, y2 + dy)])
+        return np.array([x1, y1, x2, y2])
+
+    remaining = [endpoints(bar) for bar in expected]
+    matched = 0
+    for bar in predicted:
+        candidate = endpoints(bar, *offset)
+        distances = [np.abs(candidate - truth).max() for truth in remaining]
+        if distances and min(distances) <= tolerance:
+            remaining.pop(int(np.argmin(distances)))
+            matched += 1
+
+    return {
+        "matched": matched,
+        "precision": matched / len(predicted) if predicted else 1.0,
+        "recall": matched / len(expected) if expected else 1.0,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic beam elevation sheets with ground truth.")
+    parser.add_argument("output_dir", help="Folder to write the PDF, PNG and JSON files to")
+    parser.add_argument("-n", "--name", default="synthetic", help="Base name of the files")
+    parser.add_argument("-b", "--bars", type=int, default=100, help="Total number of bars on the sheet. At 300 DPI, "
+                        "10000 bars need --page-size a0, or a1 with --bars-per-beam 4")
+    parser.add_argument("--bars-per-beam", type=int, default=8, help="Bars per beam")
+    parser.add_argument("--page-size", default="a1", help=f"One of {', '.join(PAGE_SIZES)} or WIDTHxHEIGHT in points")
+    parser.add_argument("--hook-ratio", type=float, default=0.5, help="Probability of a hook at a bar end")
+    parser.add_argument("--fragment-ratio", type=float, default=0.2, help="Probability of a bar being split in fragments")
+    parser.add_argument("--dpi", type=int, default=300, help="Resolution of the PNG and the ground truth")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random layout")
+    parser.add_argument("--no-png", action="store_true", help="Only write the vector PDF and the ground truth")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    page_size = args.page_size.lower()
+    if page_size not in PAGE_SIZES:
+        page_size = tuple(float(value) for value in page_size.split("x"))
+
+    paths = generate_sheet(args.output_dir, args.name, png=not args.no_png, bars=args.bars, bars_per_beam=args.bars_per_beam,
+                           page_size=page_size, hook_ratio=args.hook_ratio, fragment_ratio=args.fragment_ratio,
+                           dpi=args.dpi, seed=args.seed)
+    for kind, path in paths.items():
+        if path:
+            print(f"{kind}: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from src.benchmark.stages import STAGES
+from src.pipeline.tracing import peak_rss_mb
+
+
+def run_stage(name, repeats=5, warmup=1):
+    """
+    Time one stage on its fixture.
+
+    Args:
+        name (str): Stage name, a key of stages.STAGES.
+        repeats (int): Number of timed runs.
+        warmup (int): Untimed runs before the timed ones.
+
+    Returns:
+        dict: Median, min and max wall time in seconds, throughput in megapixels per second,
+            peak RSS of the process and how much of it the stage added on top of its setup, in MB.
+            Stages whose dependencies are missing are reported with "skipped" and the reason,
+            stages that raise with "failed" and the error. Stages without an image have no throughput.
+    """
+    with tempfile.TemporaryDirectory(prefix=f"benchmark_{name}_") as workdir:
+        try:
+            run, megapixels = STAGES[name](workdir)
+        except ImportError as e:
+            return {"skipped": f"missing dependency: {e}"}
+
+        try:
+            rss_before = peak_rss_mb()
+            for _ in range(warmup):
+                run()
+
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                run()
+                times.append(time.perf_counter() - start)
+
+            rss_after = peak_rss_mb()
+        except Exception as e:
+            return {"failed": repr(e)}
+
+    median = statistics.median(times)
+    return {
+        "median_s": median,
+        "min_s": min(times),
+        "max_s": max(times),
+        "repeats": repeats,
+        "megapixels": megapixels,
+        "throughput_mp_per_s": megapixels / median if megapixels and median > 0 else None,
+        "peak_rss_mb": rss_after,
+        "stage_rss_mb": rss_after - rss_before if rss_after is not None else None,
+    }
+
+
+def run_stages(names, repeats=5, warmup=1, isolate=True):
+    """
+    Run the given stages. With isolate every stage runs in a fresh process, so its peak RSS is its own.
+    """
+    results = {}
+    for name in names:
+        if isolate:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                results[name] = executor.submit(run_stage, name, repeats, warmup).result()
+        else:
+            results[name] = run_stage(name, repeats, warmup)
+    return results
+
+
+def compare_results(results, baseline, tolerance=0.25, memory_tolerance=0.5, min_delta=0.005):
+    """
+    Find the stages that got slower or use more memory than in the baseline.
+
+    Args:
+        results (dict): Stage results of this run.
+        baseline (dict): Stage results of the baseline run.
+        tolerance (float): Allowed relative increase of the median time.
+        memory_tolerance (float): Allowed relative increase of the memory the stage adds.
+        min_delta (float): Time differences below this many seconds are treated as noise.
+
+    Returns:
+        list: One message per regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if not reference or any(key in entry for key in ("skipped", "failed") for entry in (result, reference)):
+            continue
+
+        limit = reference["median_s"] * (1 + tolerance)
+        if result["median_s"] > limit and result["median_s"] - reference["median_s"] > min_delta:
+            regressions.append(f"{name}: median {result['median_s']:.4f}s exceeds baseline "
+                               f"{reference['median_s']:.4f}s by more than {tolerance:.0%}")
+
+        if result.get("stage_rss_mb") is not None and reference.get("stage_rss_mb") is not None:
+            # Small stages stay within the noise of the allocator, give them 10 MB of slack
+            memory_limit = max(reference["stage_rss_mb"] * (1 + memory_tolerance), reference["stage_rss_mb"] + 10)
+            if result["stage_rss_mb"] > memory_limit:
+                regressions.append(f"{name}: stage memory {result['stage_rss_mb']:.1f}MB exceeds baseline "
+                                   f"{reference['stage_rss_mb']:.1f}MB by more than {memory_tolerance:.0%}")
+
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)["stages"]
+
+
+def save_baseline(path, results):
+    # Stages missing from this run keep their previous baseline
+    stages = load_baseline(path) if os.path.exists(path) else {}
+    stages.update({name: result for name, result in results.items() if "skipped" not in result and "failed" not in result})
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w") as f:
+        json.dump({"python": platform.python_version(), "platform": platform.platform(), "stages": stages}, f, indent=2)
+
+
+def format_result(name, result):
+    if "skipped" in result:
+        return f"{name:<16} skipped ({result['skipped']})"
+    if "failed" in result:
+        return f"{name:<16} FAILED {result['failed']}"
+
+    throughput = f"{result['throughput_mp_per_s']:8.1f}MP/s" if result["throughput_mp_per_s"] is not None else f"{'-':>8}    "
+    rss = f"{result['peak_rss_mb']:8.1f}MB peak {result['stage_rss_mb']:7.1f}MB stage" if result["peak_rss_mb"] is not None else ""
+    return (f"{name:<16} {result['median_s'] * 1000:9.1f}ms median {result['min_s'] * 1000:9.1f}ms min "
+            f"{throughput} {rss}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the pipeline stages on fixed fixtures.")
+    parser.add_argument("stages", nargs="*", help=f"Stages to run (default: all). Available: {', '.join(STAGES)}")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="Timed runs per stage")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed runs before timing")
+    parser.add_argument("-b", "--baseline", help="JSON baseline to compare against (and to write with --save-baseline)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run's results to the baseline file")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.25, help="Allowed relative slowdown per stage")
+    parser.add_argument("--memory-tolerance", type=float, default=0.5, help="Allowed relative growth of stage memory")
+    parser.add_argument("-o", "--output", help="Write the results of this run as JSON")
+    parser.add_argument("--in-process", action="store_true", help="Run all stages in this process (peak RSS is then shared)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    names = args.stages or list(STAGES)
+    unknown = [name for name in names if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}. Available: {list(STAGES)}")
+
+    results = run_stages(names, args.repeats, args.warmup, isolate=not args.in_process)
+    for name, result in results.items():
+        print(format_result(name, result))
+    failed = any("failed" in result for result in results.values())
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline and args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"Baseline written to {args.baseline}")
+        return 1 if failed else 0
+
+    if args.baseline:
+        regressions = compare_results(results, load_baseline(args.baseline), args.tolerance, args.memory_tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions or failed else 0
+
+    return 1 if failed else 0
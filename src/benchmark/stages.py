@@ -0,0 +1,204 @@
+import os
+import subprocess
+import sys
+import cv2
+from src.benchmark.fixtures import REPO_ROOT, TEST_PDF, make_beam_image, make_page_image
+from src.benchmark.stubs import StubModel, StubOCR
+
+# Model paths the stub detectors are registered under
+STUB_BEAM_MODEL = "stub/beam_detector.pt"
+STUB_SCALE_MODEL = "stub/scale_detector.pt"
+
+PDF_DPI = 200
+
+# Dependencies that take seconds to import or pull in torch, they must load on first use and not with main
+LAZY_MODULES = ("torch", "ultralytics", "easyocr", "sklearn", "scipy", "matplotlib", "openpyxl")
+
+
+def _megapixels(image):
+    return image.shape[0] * image.shape[1] / 1e6
+
+
+def _write(workdir, name, image):
+    path = os.path.join(workdir, name)
+    cv2.imwrite(path, image)
+    return path
+
+
+def _disable_line_cache():
+    # Repeated runs would otherwise only time cache lookups
+    from src.data.helper.artifact_store import configure_artifact_store
+    from src.data.helper.line_detection import clear_line_cache, configure_line_cache
+    configure_line_cache(max_entries=0)
+    configure_artifact_store(None)
+    clear_line_cache()
+
+
+def _prepared_beam():
+    # Beam masks as analyze_beam produces them, shared by the geometry stages
+    from src.data.beam_center import get_center_height
+    from src.data.clean import clean_mask_image
+    from src.data.helper.color_segmentation import segment_colors
+    from src.detection.detect_roi import create_image_mask, crop_mask_border
+
+    beam, info = make_beam_image()
+    segmentation = segment_colors(beam, ["red", "cyan"])
+    masked = crop_mask_border(segmentation)
+    coloured_beam = clean_mask_image(create_image_mask(beam, "red", segmentation=segmentation), segmentation=masked)
+    coloured_column = clean_mask_image(create_image_mask(beam, "cyan", segmentation=segmentation), type="column", segmentation=masked)
+    return beam, info, coloured_beam, coloured_column, get_center_height(coloured_column)
+
+
+def setup_import_cli(workdir):
+    # A fresh interpreter per run, as the CLI and spawned workers start, so the time includes interpreter startup
+    code = ("import sys, main; "
+            f"loaded = [name for name in {LAZY_MODULES!r} if name in sys.modules]; "
+            "sys.exit('main imported ' + ', '.join(loaded) if loaded else 0)")
+
+    def run():
+        result = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit code {result.returncode}")
+
+    return run, None
+
+
+def setup_pdf_to_image(workdir):
+    from src.pdf_to_image.pdf_to_image import pdf_to_image
+
+    if not os.path.exists(TEST_PDF):
+        raise FileNotFoundError(f"Benchmark drawing not found: {TEST_PDF}")
+
+    def run():
+        return pdf_to_image(TEST_PDF, os.path.join(workdir, "pdf"), dpi=PDF_DPI)
+
+    image = cv2.imread(run())
+    return run, _megapixels(image)
+
+
+def setup_detect_beams(workdir):
+    from src.detection.beam_segmentor import detect_beams
+    from src.detection.helper.model_registry import register_model
+
+    page, info = make_page_image()
+    page_path = _write(workdir, "page.png", page)
+    register_model(STUB_BEAM_MODEL, StubModel(info["beam_detections"]))
+
+    def run():
+        return detect_beams(page_path, model_path=STUB_BEAM_MODEL, output_dir=os.path.join(workdir, "beams"))
+
+    return run, _megapixels(page)
+
+
+def setup_detect_scales(workdir):
+    from src.detection.helper.model_registry import register_model
+    from src.detection.scale_detector import detect_scales
+
+    page, info = make_page_image()
+    page_path = _write(workdir, "page.png", page)
+    register_model(STUB_SCALE_MODEL, StubModel(info["scale_detections"]))
+
+    def run():
+        return detect_scales(page_path, model_path=STUB_SCALE_MODEL,
+                             horizontal_output_dir=os.path.join(workdir, "horizontal_scales"),
+                             vertical_output_dir=os.path.join(workdir, "vertical_scales"), add_padding=True)
+
+    return run, _megapixels(page)
+
+
+def setup_get_colors(workdir):
+    from src.detection.color_comp import get_colors
+
+    page, _ = make_page_image()
+    page_path = _write(workdir, "page.png", page)
+
+    def run():
+        return get_colors(page_path)
+
+    return run, _megapixels(page)
+
+
+def setup_mask_and_clean(workdir):
+    from src.data.clean import clean_mask_image
+    from src.data.helper.color_segmentation import segment_colors
+    from src.detection.detect_roi import create_image_mask, crop_mask_border
+
+    beam, _ = make_beam_image()
+
+    def run():
+        segmentation = segment_colors(beam, ["red", "cyan"])
+        masked = crop_mask_border(segmentation)
+        coloured_beam = clean_mask_image(create_image_mask(beam, "red", segmentation=segmentation), segmentation=masked)
+        coloured_column = clean_mask_image(create_image_mask(beam, "cyan", segmentation=segmentation),
+                                           type="column", segmentation=masked)
+        return coloured_beam, coloured_column
+
+    return run, _megapixels(beam)
+
+
+def setup_get_bars(workdir):
+    from src.data.bars import get_bars
+
+    _disable_line_cache()
+    beam, _, coloured_beam, _, center_height = _prepared_beam()
+
+    def run():
+        return get_bars(None, coloured_beam, center_height, 100, 12, 100, 12, output_dir=None)
+
+    return run, _megapixels(beam)
+
+
+def setup_get_column_data(workdir):
+    from src.data.column import get_column_data
+
+    _disable_line_cache()
+    beam, _, _, coloured_column, center_height = _prepared_beam()
+
+    def run():
+        return get_column_data(coloured_column, center_height, 100, 12, output_path=None)
+
+    return run, _megapixels(beam)
+
+
+def setup_detect_text(workdir):
+    from src.ocr.detect_text import detect_text
+
+    beam, info = make_beam_image()
+    beam_path = _write(workdir, "beam.png", beam)
+    ocr = StubOCR(info["texts"])
+
+    def run():
+        return detect_text(beam_path, output_path=os.path.join(workdir, "text_detections.jpg"), ocr=ocr, batch_recognition=True)
+
+    return run, _megapixels(beam)
+
+
+def setup_get_relations(workdir):
+    from src.data.bars import get_bars
+    from src.ocr.relate_text import get_relations
+
+    beam, info, coloured_beam, _, center_height = _prepared_beam()
+    beam_path = _write(workdir, "beam.png", beam)
+    bars = get_bars(None, coloured_beam, center_height, 100, 12, 100, 12, output_dir=None)
+
+    def run():
+        return get_relations(beam_path, bars, info["texts"], output_path=os.path.join(workdir, "relations.jpg"))
+
+    return run, _megapixels(beam)
+
+
+# Stage name -> setup(workdir) returning the function to time and the megapixels it processes.
+# detect_beams and detect_scales run their real crop and save code around stub models.
+# import_cli fails when importing main loads any of LAZY_MODULES.
+STAGES = {
+    "import_cli": setup_import_cli,
+    "pdf_to_image": setup_pdf_to_image,
+    "detect_beams": setup_detect_beams,
+    "detect_scales": setup_detect_scales,
+    "get_colors": setup_get_colors,
+    "mask_and_clean": setup_mask_and_clean,
+    "get_bars": setup_get_bars,
+    "get_column_data": setup_get_column_data,
+    "detect_text": setup_detect_text,
+    "get_relations": setup_get_relations,
+}
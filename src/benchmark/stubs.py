@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class _StubTensor:
+    # Mimics the torch tensor of ultralytics results, .cpu().numpy() returns the array
+    def __init__(self, array):
+        self._array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._array
+
+
+class _StubBoxes:
+    def __init__(self, detections):
+        self.data = _StubTensor(detections)
+
+
+class _StubResult:
+    def __init__(self, detections):
+        self.boxes = _StubBoxes(detections)
+
+
+class StubModel:
+    """
+    Stand-in for an ultralytics.YOLO model that returns fixed detections, so the code around
+    the model can be timed without weights or torch.
+
+    Args:
+        detections (numpy.ndarray): (N, 6) detections of x1, y1, x2, y2, conf, cls in image coordinates.
+    """
+
+    def __init__(self, detections):
+        self.detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+
+    def __call__(self, images, device=None):
+        results = []
+        for image in images:
+            # Keep the detections inside the image, like a model run on a crop or tile would
+            height, width = image.shape[:2]
+            inside = (self.detections[:, 2] <= width) & (self.detections[:, 3] <= height)
+            results.append(_StubResult(self.detections[inside].copy()))
+        return results
+
+    def to(self, device):
+        return self
+
+
+class StubOCR:
+    """
+    Stand-in for OCRService that answers from known text boxes instead of running EasyOCR.
+
+    Args:
+        texts (list): Known texts as {"coordinates": ((x_min, y_min), (x_max, y_max)), "text": str}.
+    """
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def _result(self, text):
+        (x_min, y_min), (x_max, y_max) = text["coordinates"]
+        return ([[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]], text["text"], 0.99)
+
+    def readtext(self, image):
+        return [self._result(text) for text in self.texts]
+
+    def recognize(self, image, boxes):
+        # Texts whose center falls inside one of the boxes
+        results = []
+        for text in self.texts:
+            (x_min, y_min), (x_max, y_max) = text["coordinates"]
+            center_x, center_y = (x_min + x_max) / 2, (y_min + y_max) / 2
+            if any(left <= center_x <= right and top <= center_y <= bottom for (left, top), (right, bottom) in boxes):
+                results.append(self._result(text))
+        return results
@@ -1,20 +1,25 @@
+import bisect
 import cv2
+import math
 import numpy as np
 import os
+from src.data.helper.image_io import load_image
+from src.data.helper.line_processing import merge_line_chains
+from src.data.helper.line_detection import detect_lsd
+from src.data.helper.segments import LineSegments
+from src.pipeline.tracing import traced
 
 
 def calculate_line_length(line):
     # Take a line, extract its coords and get its length
     x1, y1, x2, y2 = line
-    start_point = np.array((x1, y1))
-    end_point = np.array((x2, y2))
-    distance = np.linalg.norm(start_point - end_point)
-    return distance
+    return math.hypot(x2 - x1, y2 - y1)
 
 
 def sort_lines(lines):
     # Sorting lines based on their length in descending order
-    return sorted(lines, key=lambda x: calculate_line_length(x), reverse=True)
+    segments = LineSegments(lines)
+    return segments.to_list(segments.by_length())
 
 
 def calculate_distance(xa, ya, xb, yb):
@@ -22,105 +27,105 @@ def calculate_distance(xa, ya, xb, yb):
     return np.sqrt((xa - xb) ** 2 + (ya - yb) ** 2)
 
 
+# Pairs horizontal lines with the vertical lines touching either of their ends, using one radius query over all endpoints
+def match_endpoint_verticals(horizontal, vertical, tolerance=5, distance_tolerance=15):
+    """
+    Returns the matching (horizontal index, vertical index) pairs sorted by horizontal then vertical index,
+    with boolean arrays telling whether each vertical line touches the start or the end of the horizontal line.
+    """
+    empty = np.empty(0, dtype=np.intp)
+    if len(horizontal) == 0 or len(vertical) == 0:
+        return empty, empty, empty.astype(bool), empty.astype(bool)
+
+    from scipy.spatial import KDTree
+
+    # Every vertical line owns two endpoints in the tree
+    tree = KDTree(np.concatenate([vertical.lines[:, :2], vertical.lines[:, 2:]]))
+    owners = np.tile(np.arange(len(vertical)), 2)
+
+    pairs = []
+    for points in (horizontal.lines[:, :2], horizontal.lines[:, 2:]):
+        neighbours = tree.query_ball_point(points, distance_tolerance)
+        counts = np.fromiter((len(n) for n in neighbours), dtype=np.intp, count=len(neighbours))
+        found = np.fromiter((i for n in neighbours for i in n), dtype=np.intp, count=counts.sum())
+        pairs.append(np.stack([np.repeat(np.arange(len(horizontal)), counts), owners[found]], axis=1))
+
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    h_indices, v_indices = pairs[:, 0], pairs[:, 1]
+
+    x1, y1, x2, y2 = horizontal.lines[h_indices].T
+    vx1, vy1, vx2, vy2 = vertical.lines[v_indices].T
+    aligned = ((np.abs(x1 - vx1) <= tolerance) | (np.abs(x2 - vx1) <= tolerance) |
+               (np.abs(x1 - vx2) <= tolerance) | (np.abs(x2 - vx2) <= tolerance))
+    at_start = aligned & ((np.hypot(x1 - vx1, y1 - vy1) <= distance_tolerance) | (np.hypot(x1 - vx2, y1 - vy2) <= distance_tolerance))
+    at_end = aligned & ((np.hypot(x2 - vx1, y2 - vy1) <= distance_tolerance) | (np.hypot(x2 - vx2, y2 - vy2) <= distance_tolerance))
+
+    return h_indices, v_indices, at_start, at_end
+
+
+def topmost_per_line(h_indices, v_indices, vertical, count):
+    # For each of count horizontal lines, the index of the matched vertical line with the smallest y1 (-1 if none).
+    # Ties keep the first vertical line, the same as a stable sort on y1.
+    chosen = np.full(count, -1, dtype=np.intp)
+    if len(h_indices):
+        order = np.lexsort((v_indices, vertical.lines[v_indices, 1], h_indices))
+        lines, first = np.unique(h_indices[order], return_index=True)
+        chosen[lines] = v_indices[order][first]
+    return chosen
+
+
 # Checks whether there are any vertical lines at the endpoints of horizontal lines
 def check_vertical_at_endpoints(horizontal_line, vertical_lines, tolerance=5, distance_tolerance=15):
-    x1, y1, x2, y2 = horizontal_line
-    start_lines = []
-    end_lines = []
-
-    for v_line in vertical_lines:
-        vx1, vy1, vx2, vy2 = v_line
-        if (abs(x1 - vx1) <= tolerance or abs(x2 - vx1) <= tolerance or abs(x1 - vx2) <= tolerance or abs(x2 - vx2) <= tolerance):
-            dist1 = calculate_distance(x1, y1, vx1, vy1)
-            dist2 = calculate_distance(x1, y1, vx2, vy2)
-            dist3 = calculate_distance(x2, y2, vx1, vy1)
-            dist4 = calculate_distance(x2, y2, vx2, vy2)
-
-            if dist1 <= distance_tolerance or dist2 <= distance_tolerance:
-                start_lines.append(v_line)
-            if dist3 <= distance_tolerance or dist4 <= distance_tolerance:
-                end_lines.append(v_line)
-    
-    return start_lines, end_lines
+    _, v_indices, at_start, at_end = match_endpoint_verticals(LineSegments([horizontal_line]), LineSegments(vertical_lines),
+                                                              tolerance, distance_tolerance)
+    return [vertical_lines[i] for i in v_indices[at_start]], [vertical_lines[i] for i in v_indices[at_end]]
 
 
 def segment_lines(lines, max_diff=5):
-    horizontal_lines, vertical_lines, slanted_lines = [], [], []
-    for line in lines:
-        x1, y1, x2, y2 = line[0]
-        if abs(x1 - x2) <= max_diff:
-            vertical_lines.append([x1, y1, x2, y2])
-        elif abs(y1 - y2) <= max_diff:
-            horizontal_lines.append([x1, y1, x2, y2])
-        else:
-            slanted_lines.append([x1, y1, x2, y2])
-    return horizontal_lines, vertical_lines, slanted_lines
+    segments = LineSegments(lines)
+    horizontal, vertical, slanted = segments.classify(max_diff)
+    return segments.to_list(horizontal), segments.to_list(vertical), segments.to_list(slanted)
 
 
 def remove_duplicate_lines(lines, max_distance=15, max_y_diff=10, is_horizontal=True):
-    def merge_lines(lines, merged_lines):
-        for line in lines:
-            x1, y1, x2, y2 = line
-            merged = False
-            for i, merged_line in enumerate(merged_lines):
-                x3, y3, x4, y4 = merged_line
-                if is_horizontal:
-                    if ((abs(x1 - x4) < max_distance and abs(y1 - y4) < max_y_diff) or
-                        (abs(x2 - x3) < max_distance and abs(y2 - y3) < max_y_diff)):
-                        merged_lines[i] = [min(x1, x3), y1, max(x2, x4), y2]
-                        merged = True
-                        break
-                else:
-                    if ((abs(x1 - x3) < max_y_diff and abs(y1 - y3) < max_distance) or
-                        (abs(x2 - x4) < max_y_diff and abs(y2 - y4) < max_distance)):
-                        merged_lines[i] = [x1, min(y1, y3), x2, max(y2, y4)]
-                        merged = True
-                        break
-            if not merged:
-                merged_lines.append([x1, y1, x2, y2])
-        return merged_lines
-
-    merged_lines = merge_lines(lines, [])
-    if len(lines) == len(merged_lines):
-        return merged_lines
-    else:
-        return remove_duplicate_lines(merged_lines, max_distance, max_y_diff, is_horizontal)
+    # Single pass sweep shared with the column pipeline, see line_processing.merge_line_chains
+    return merge_line_chains(lines, max_distance, max_y_diff, is_horizontal)
 
 
 def detect_bars(horizontal_lines, vertical_lines):
+    # Accepts lists of lines or LineSegments, bars are found by segment index and only converted back to lists at the end
+    horizontal = horizontal_lines if isinstance(horizontal_lines, LineSegments) else LineSegments(horizontal_lines)
+    vertical = vertical_lines if isinstance(vertical_lines, LineSegments) else LineSegments(vertical_lines)
+
+    # Skip bars with horizontal length less than or equal to 50 pixels
+    candidates = np.flatnonzero(horizontal.length > 50)
+    horizontal = horizontal.take(candidates)
+
+    # Keep the topmost vertical line at each end of every horizontal line
+    h_indices, v_indices, at_start, at_end = match_endpoint_verticals(horizontal, vertical)
+    start_choice = topmost_per_line(h_indices[at_start], v_indices[at_start], vertical, len(horizontal))
+    end_choice = topmost_per_line(h_indices[at_end], v_indices[at_end], vertical, len(horizontal))
+
+    horizontal_lengths = horizontal.length.astype(np.float64)
+    vertical_lengths = np.append(vertical.length, 0).astype(np.float64)  # index -1 has no vertical line
+    vertical_total = vertical_lengths[start_choice] + vertical_lengths[end_choice]
+    total_lengths = horizontal_lengths + vertical_total
+
+    # Drop bars where the vertical length is more than 80% of the horizontal length, then keep long enough bars
+    keep = np.flatnonzero(~(vertical_total > horizontal_lengths * 0.8) & (total_lengths > 150))
+
     bar_info = []
-    
-    for h_line in horizontal_lines:
-        h_x1, h_y1, h_x2, h_y2 = h_line
-        start_v_lines, end_v_lines = check_vertical_at_endpoints(h_line, vertical_lines)
-        
-        start_v_lines, end_v_lines = filter_closest_lines(start_v_lines, end_v_lines)
-        
-        horizontal_length = calculate_line_length(h_line)
-        
-        if horizontal_length <= 50:  # Skip bars with horizontal length less than or equal to 50 pixels
-            continue
-        
-        vertical_length = 0
-        
-        for v_line in start_v_lines + end_v_lines:
-            vertical_length += calculate_line_length(v_line)
-        
-        total_length = horizontal_length + vertical_length
-        
-        # New condition to check if total vertical length is greater than horizontal length
-        if vertical_length > horizontal_length * 0.8:
-            continue
-        
-        if total_length > 150:
-            bar_info.append({
-                "horizontal_bar": [h_x1, h_y1, h_x2, h_y2],
-                "start_vertical_bars": start_v_lines,
-                "end_vertical_bars": end_v_lines,
-                "horizontal_length": horizontal_length,
-                "vertical_length": vertical_length,
-                "total_length": total_length,
-            })
+    for i in keep:
+        start_indices = [start_choice[i]] if start_choice[i] >= 0 else []
+        end_indices = [end_choice[i]] if end_choice[i] >= 0 else []
+        bar_info.append({
+            "horizontal_bar": horizontal.lines[i].tolist(),
+            "start_vertical_bars": vertical.to_list(start_indices),
+            "end_vertical_bars": vertical.to_list(end_indices),
+            "horizontal_length": float(horizontal_lengths[i]),
+            "vertical_length": float(vertical_total[i]),
+            "total_length": float(total_lengths[i]),
+        })
         
     return bar_info
 
@@ -189,109 +194,145 @@ def classify_bars(bar_info, center_line_height):
 
 
 def merge_horizontal_lines(bar_info, max_y_distance=5, max_x_distance=20):
-    merged_bars = []
-
-    def can_merge(h1, h2):
-        x1_start, y1, x1_end, _ = h1
-        x2_start, y2, x2_end, _ = h2
-        y_distance = abs(y1 - y2)
-        x_distance = min(abs(x1_start - x2_end), abs(x2_start - x1_end))
-        can_merge_result = y_distance < max_y_distance and x_distance < max_x_distance
-        return can_merge_result
+    # Bars merge when they sit at nearly the same height and one starts where the other ends.
+    # Merging is transitive, so a chain of fragments becomes a single bar in one pass.
+    if not bar_info:
+        return []
+
+    parent = list(range(len(bar_info)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            # Keep the earliest bar as the root, its height and type are kept for the merged bar
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    # Group bars into y-buckets, separated by gaps of at least max_y_distance
+    by_height = sorted(range(len(bar_info)), key=lambda i: bar_info[i]['horizontal_bar'][1])
+    buckets = [[by_height[0]]]
+    for i in by_height[1:]:
+        if bar_info[i]['horizontal_bar'][1] - bar_info[buckets[-1][-1]]['horizontal_bar'][1] >= max_y_distance:
+            buckets.append([i])
+        else:
+            buckets[-1].append(i)
+
+    for bucket in buckets:
+        # Sorted by end x, so the bars ending near a start are found with a binary search
+        bucket.sort(key=lambda i: bar_info[i]['horizontal_bar'][2])
+        ends = [bar_info[i]['horizontal_bar'][2] for i in bucket]
+
+        for i in bucket:
+            x_start, y = bar_info[i]['horizontal_bar'][:2]
+            k = bisect.bisect_right(ends, x_start - max_x_distance)
+            while k < len(bucket) and ends[k] < x_start + max_x_distance:
+                j = bucket[k]
+                if j != i and abs(y - bar_info[j]['horizontal_bar'][1]) < max_y_distance:
+                    union(i, j)
+                k += 1
+
+    groups = {}
+    for i in range(len(bar_info)):
+        groups.setdefault(find(i), []).append(i)
 
-    def merge_bars(bar1, bar2):
-        new_horizontal_bar = [min(bar1['horizontal_bar'][0], bar2['horizontal_bar'][0]), 
-                              bar1['horizontal_bar'][1],
-                              max(bar1['horizontal_bar'][2], bar2['horizontal_bar'][2]), 
-                              bar1['horizontal_bar'][3]]
+    merged_bars = []
+    for root in sorted(groups):
+        members = groups[root]
+        if len(members) == 1:
+            merged_bars.append(bar_info[root])
+            continue
 
-        start_vertical_bars = bar1['start_vertical_bars'] + bar2['start_vertical_bars']
-        end_vertical_bars = bar1['end_vertical_bars'] + bar2['end_vertical_bars']
+        bars = [bar_info[i] for i in members]
+        first = bars[0]['horizontal_bar']
+        new_horizontal_bar = [min(bar['horizontal_bar'][0] for bar in bars),
+                              first[1],
+                              max(bar['horizontal_bar'][2] for bar in bars),
+                              first[3]]
 
+        start_vertical_bars = [v_line for bar in bars for v_line in bar['start_vertical_bars']]
+        end_vertical_bars = [v_line for bar in bars for v_line in bar['end_vertical_bars']]
         start_vertical_bars, end_vertical_bars = filter_closest_lines(start_vertical_bars, end_vertical_bars)
 
+        # Lengths are recomputed once for the whole group
+        horizontal_length = calculate_line_length(new_horizontal_bar)
         vertical_length = 0
         for v_line in start_vertical_bars + end_vertical_bars:
             vertical_length += calculate_line_length(v_line)
 
-        total_length = calculate_line_length(new_horizontal_bar) + vertical_length
-
-        merged_bar = {
+        merged_bars.append({
             "horizontal_bar": new_horizontal_bar,
             "start_vertical_bars": start_vertical_bars,
             "end_vertical_bars": end_vertical_bars,
-            "horizontal_length": calculate_line_length(new_horizontal_bar),
+            "horizontal_length": horizontal_length,
             "vertical_length": vertical_length,
-            "total_length": total_length,
-            "type": bar1["type"]
-        }
+            "total_length": horizontal_length + vertical_length,
+            "type": bars[0]["type"]
+        })
 
-        return merged_bar
-
-    used_indices = set()
-    for i, bar1 in enumerate(bar_info):
-        if i in used_indices:
-            continue
-        merged = False
-        for j, bar2 in enumerate(bar_info):
-            if i != j and j not in used_indices and can_merge(bar1['horizontal_bar'], bar2['horizontal_bar']):
-                merged_bar = merge_bars(bar1, bar2)
-                merged_bars.append(merged_bar)
-                used_indices.update([i, j])
-                merged = True
-                break
-        if not merged:
-            merged_bars.append(bar1)
-            used_indices.add(i)
     return merged_bars
 
+# Turns detected line segments, in LSD format (N, 1, 4), into classified and merged bars
+@traced(counts=lambda bars: {"bars": len(bars)})
+def get_bars_from_lines(lines, center_line_height):
+    segments = LineSegments(lines)
+    horizontal_indices, vertical_indices, _ = segments.classify()
+
+    horizontal = LineSegments(remove_duplicate_lines(segments.to_list(horizontal_indices), is_horizontal=True))
+    horizontal = horizontal.take(horizontal.by_length())
+    vertical = segments.take(segments.by_length(vertical_indices))
+
+    bar_info = detect_bars(horizontal, vertical)
+
+    # Ensure all bars are classified before merging
+    bar_info = classify_bars(bar_info, center_line_height)
+
+    # Merge horizontal lines
+    return merge_horizontal_lines(bar_info)
+
+
 # Rest of the code remains the same
-def get_bars(image_path, masked_image, center_line_height, horizontal_pixel_length, horizontal_actual_length, vertical_pixel_length, vertical_actual_length, output_dir="public/bars"):
+@traced(counts=lambda bars: {"bars": len(bars)})
+def get_bars(image_path, masked_image, center_line_height, horizontal_pixel_length, horizontal_actual_length, vertical_pixel_length, vertical_actual_length, output_dir=None):
 
-    os.makedirs(output_dir, exist_ok=True)
+    # Bar images are only drawn and saved when an output directory is given
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
 
-    # Clear the output directory if it exists
-    for file in os.listdir(output_dir):
-        file_path = os.path.join(output_dir, file)
-        if os.path.isfile(file_path):
-            os.remove(file_path)
+        # Clear the output directory if it exists
+        for file in os.listdir(output_dir):
+            file_path = os.path.join(output_dir, file)
+            if os.path.isfile(file_path):
+                os.remove(file_path)
 
-    image = cv2.imread(masked_image)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    blur = cv2.GaussianBlur(gray, (5, 5), 0)
+    image = load_image(masked_image)
 
-    lsd = cv2.createLineSegmentDetector(cv2.LSD_REFINE_STD)
-    lines = lsd.detect(blur)[0]
+    # LSD on the blurred grayscale mask, through the line detection cache
+    lines = detect_lsd(image, refine=cv2.LSD_REFINE_STD, steps=("gray", ("blur", 5)))
 
     bar_info = []
     
     if lines is not None:
-        horizontal_lines, vertical_lines, _ = segment_lines(lines)
-
-        horizontal_lines = remove_duplicate_lines(horizontal_lines, is_horizontal=True)
-        horizontal_lines = sort_lines(horizontal_lines)
-        vertical_lines = sort_lines(vertical_lines)
-
-        bar_info = detect_bars(horizontal_lines, vertical_lines)
+        bar_info = get_bars_from_lines(lines, center_line_height)
 
         # Calculate the conversion constants
         h_pixels_to_inches = horizontal_actual_length / horizontal_pixel_length
         v_pixels_to_inches = vertical_actual_length / vertical_pixel_length
 
-        # Ensure all bars are classified before merging
-        bar_info = classify_bars(bar_info, center_line_height)
-
-        # Merge horizontal lines
-        bar_info = merge_horizontal_lines(bar_info)
-
-        bar_count = 1
-        for bar in bar_info:
-            bar_image = draw_bar(image, bar, bar_count, h_pixels_to_inches, v_pixels_to_inches)
-            if bar_image is not None:
-                output_path = os.path.join(output_dir, f'bar_{bar_count}.png')
-                cv2.imwrite(output_path, bar_image)
-                print(f"Image 'bar_{bar_count}.png' created successfully.")
-                bar_count += 1
+        # Draw every bar on its own image when an output directory is given
+        if output_dir is not None:
+            bar_count = 1
+            for bar in bar_info:
+                bar_image = draw_bar(image, bar, bar_count, h_pixels_to_inches, v_pixels_to_inches)
+                if bar_image is not None:
+                    output_path = os.path.join(output_dir, f'bar_{bar_count}.png')
+                    cv2.imwrite(output_path, bar_image)
+                    print(f"Image 'bar_{bar_count}.png' created successfully.")
+                    bar_count += 1
     else:
         print("No lines detected in the image.")
 
@@ -1,16 +1,22 @@
-import cv2
 import numpy as np
+from src.data.helper.image_io import load_image
+from src.data.helper.line_detection import detect_lsd
+from src.pipeline.tracing import traced
 
-def get_center_height(image_path):
-    # Load the image
-    image = cv2.imread(image_path)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+@traced()
+def get_center_height(image):
+    # Load the image, or use it directly if it is already an array
+    image = load_image(image)
     
-    # Create LSD detector
-    lsd = cv2.createLineSegmentDetector(0)
-    
-    # Detect lines in the image
-    lines = lsd.detect(gray)[0]  # Position 0 of the returned tuple are the detected lines
+    # Detect lines in the grayscale image, through the line detection cache
+    lines = detect_lsd(image, steps=("gray",))
+
+    return get_center_height_from_lines(lines)
+
+def get_center_height_from_lines(lines):
+    # Lines are in LSD format, an (N, 1, 4) array of x1, y1, x2, y2
+    if lines is None:
+        return None
 
     # Filter horizontal lines with length at least 100 pixels
     horizontal_lines = [
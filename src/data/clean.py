@@ -1,36 +1,27 @@
 import cv2
 import numpy as np
+from src.data.helper.color_segmentation import segment_colors
+from src.data.helper.image_io import load_image, save_debug_image
+from src.pipeline.tracing import traced
 
-def clean_mask_image(image_path, type="beam"):
-    # Read the image
-    img = cv2.imread(image_path)
-    
-    # Convert to HSV color space
-    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+@traced()
+def clean_mask_image(image, type="beam", output_path=None, segmentation=None):
+    # Read the image, or use it directly if it is already an array
+    img = load_image(image)
     
     if type == "beam":
-        # Define range for red color in HSV
-        lower_color1 = np.array([0, 100, 100])
-        upper_color1 = np.array([10, 255, 255])
-        lower_color2 = np.array([160, 100, 100])
-        upper_color2 = np.array([180, 255, 255])
+        mask_color = "red"
         color = (0, 0, 255)  # Red color in BGR
-        output_path = "public/beam-image/cleaned_masked_image.png"
     elif type == "column":
-        # Define range for cyan color in HSV
-        lower_color1 = np.array([80, 100, 100])
-        upper_color1 = np.array([90, 255, 255])
-        lower_color2 = np.array([90, 100, 100])
-        upper_color2 = np.array([100, 255, 255])
+        mask_color = "cyan"
         color = (255, 255, 0)  # Cyan color in BGR
-        output_path = "public/column-image/cleaned_masked_image.png"
     else:
         raise ValueError("Invalid type. Please use 'beam' or 'column'.")
     
-    # Create masks for the selected color
-    mask1 = cv2.inRange(hsv, lower_color1, upper_color1)
-    mask2 = cv2.inRange(hsv, lower_color2, upper_color2)
-    color_mask = mask1 + mask2
+    # Create the mask for the selected color, reusing the segmentation of the image when given
+    if segmentation is None:
+        segmentation = segment_colors(img, [mask_color])
+    color_mask = segmentation.mask(mask_color)
     
     # Reconnect broken horizontal lines
     kernel_close = np.ones((1, 15), np.uint8)  # Horizontal kernel
@@ -47,7 +38,7 @@ def clean_mask_image(image_path, type="beam"):
     result = img.copy()
     cv2.drawContours(result, contours, -1, color, 1)
     
-    # Save the result image
-    cv2.imwrite(output_path, result)
+    # Save the result image only when a debug output path is given
+    save_debug_image(output_path, result)
     
-    return output_path
+    return result
@@ -1,7 +1,9 @@
 import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from src.data.helper.line_processing import *
+from src.data.helper.image_io import load_image, save_debug_image
+from src.data.helper.line_detection import detect_lsd
+from src.pipeline.tracing import traced
 
 
 def merge_lines(lines, vertical_threshold=5, horizontal_threshold=20):
@@ -59,25 +61,27 @@ def line_in_area(line, area):
     return False
 
 
-def get_column_data(image_path, center_y, horizontal_pixel_length, horizontal_actual_length):
-    image = cv2.imread(image_path)
-    
-    if image is None:
-        raise ValueError("Image not found or unable to load.")
+@traced(counts=lambda columns: {"columns": len(columns)})
+def get_column_data(image, center_y, horizontal_pixel_length, horizontal_actual_length, output_path=None):
+    # Raises ValueError if the image cannot be loaded
+    image = load_image(image)
 
-    # Calculate the conversion factor from pixels to inches
-    pixels_per_inch = horizontal_pixel_length / horizontal_actual_length
+    # LSD on the eroded grayscale image, through the line detection cache
+    lines = detect_lsd(image, steps=("gray", ("erode", 2)))
 
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    eroded = cv2.erode(gray, np.ones((2, 2), np.uint8))
+    return get_column_data_from_lines(lines, center_y, horizontal_pixel_length, horizontal_actual_length, image, output_path)
 
-    lsd = cv2.createLineSegmentDetector(0)
-    lines = lsd.detect(eroded)[0]
 
-    if lines is None:
+@traced(counts=lambda columns: {"columns": len(columns)})
+def get_column_data_from_lines(lines, center_y, horizontal_pixel_length, horizontal_actual_length, image=None, output_path=None):
+    # Lines are in LSD format, an (N, 1, 4) array. The detections are only drawn when an image is given
+    if lines is None or len(lines) == 0:
         print("No lines detected.")
         return []
 
+    # Calculate the conversion factor from pixels to inches
+    pixels_per_inch = horizontal_pixel_length / horizontal_actual_length
+
     lines = [line[0].tolist() for line in lines]
     horizontal_lines, _, _ = segment_lines(lines)
     horizontal_lines = remove_duplicate_lines(horizontal_lines)
@@ -89,6 +93,7 @@ def get_column_data(image_path, center_y, horizontal_pixel_length, horizontal_ac
 
     topmost_area = []
     second_topmost_area = []
+    label_topmost = 'B'
 
     if merged_above_center_lines:
         topmost_y = merged_above_center_lines[0][1]
@@ -102,7 +107,7 @@ def get_column_data(image_path, center_y, horizontal_pixel_length, horizontal_ac
 
         label_topmost = 'C' if second_topmost_area else 'B'
 
-    output_image = np.copy(image)
+    output_image = np.copy(image) if image is not None else None
     detection_sequence = []
 
     # Draw the center line
@@ -112,17 +117,19 @@ def get_column_data(image_path, center_y, horizontal_pixel_length, horizontal_ac
                                (second_topmost_area, (0, 255, 0), 'B')]:
         for line in area:
             x1, y1, x2, y2 = map(int, line)
-            cv2.line(output_image, (x1, y1), (x2, y2), color, 4)
             pixel_length = np.sqrt((x2 - x1)**2 + (y2 - y1)**2)
             inch_length = pixel_length / pixels_per_inch
             detection_sequence.append((x1, label, inch_length))
-            mid_point = ((x1 + x2) // 2, (y1 + y2) // 2)
-            cv2.putText(output_image, f"{label} {inch_length:.2f}\"", (int(mid_point[0] - 10), int(mid_point[1] - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+            if output_image is not None:
+                cv2.line(output_image, (x1, y1), (x2, y2), color, 4)
+                mid_point = ((x1 + x2) // 2, (y1 + y2) // 2)
+                cv2.putText(output_image, f"{label} {inch_length:.2f}\"", (int(mid_point[0] - 10), int(mid_point[1] - 10)), cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
 
     detection_sequence.sort()
     detection_sequence = [(label, length) for x1, label, length in detection_sequence]
 
-    cv2.imwrite("column_data.png", output_image)
+    if output_image is not None:
+        save_debug_image(output_path, output_image)
 
 
     return detection_sequence
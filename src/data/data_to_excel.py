@@ -1,16 +1,22 @@
-from openpyxl import Workbook
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import workspace_path
 
-def create_excel_file(data, filename='column_data.xlsx'):
+@traced()
+def create_excel_file(data, filename=None):
     """
     Creates an Excel file from a list of tuples.
     
     Args:
     - data (list of tuples): The data to write to the Excel file. Each tuple should contain two elements.
-    - filename (str): The name of the output Excel file (default is 'output.xlsx').
+    - filename (str, optional): The name of the output Excel file (default is column_data.xlsx in the workspace of the current run).
     
     Returns:
     - None
     """
+    from openpyxl import Workbook
+
+    filename = filename or workspace_path('column_data.xlsx')
+
     # Create a workbook and select the active worksheet
     wb = Workbook()
     ws = wb.active
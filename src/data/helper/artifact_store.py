@@ -0,0 +1,317 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import cv2
+import numpy as np
+
+# Persistent store of intermediate results on disk, keyed by the content of their inputs and the
+# parameters and model weights that produced them, so re-runs skip the stages whose inputs didn't change
+_settings = {"root": None, "max_bytes": 2048 * 1024 * 1024}
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+# Bytes in the store as last counted by this process, None until counted
+_size = {"bytes": None}
+_file_digests = {}
+
+EXTENSIONS = {"npy": ".npy", "png": ".png", "json": ".json"}
+
+
+def configure_artifact_store(root=None, max_mb=2048):
+    """
+    Sets the folder and size limit of the artifact store.
+
+    Inputs:
+    - root: Folder holding the artifacts, shared by runs and worker processes. None disables the store.
+    - max_mb: Size limit in megabytes. The least recently used artifacts are removed when it is exceeded.
+    """
+    with _lock:
+        _settings["root"] = root
+        _settings["max_bytes"] = int(max_mb * 1024 * 1024)
+        _size["bytes"] = None
+
+    if root:
+        os.makedirs(root, exist_ok=True)
+
+
+def artifact_store_enabled():
+    return _settings["root"] is not None
+
+
+def artifact_store_info():
+    # Hit, miss and eviction counters of this process plus the current settings
+    with _lock:
+        return {**_stats, "bytes": _size["bytes"], **_settings}
+
+
+def clear_artifact_store():
+    # Deletes every artifact and resets the counters
+    root = _settings["root"]
+    if root and os.path.isdir(root):
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    with _lock:
+        _stats.update(hits=0, misses=0, evictions=0)
+        _size["bytes"] = 0 if root else None
+
+
+def file_digest(path):
+    """
+    Returns the content hash of a file such as a PDF or model weights.
+
+    The hash is remembered for as long as the file's size and modification time stay the same,
+    so large files are only read once per process.
+    """
+    stat = os.stat(path)
+    file_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    with _lock:
+        digest = _file_digests.get(file_key)
+    if digest is not None:
+        return digest
+
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+
+    with _lock:
+        _file_digests[file_key] = digest
+    return digest
+
+
+def _hash_part(hasher, part):
+    # Arrays are hashed by content, containers item by item, everything else by its repr
+    if isinstance(part, np.ndarray):
+        part = np.ascontiguousarray(part)
+        hasher.update(repr(("array", part.shape, part.dtype.str)).encode())
+        hasher.update(part.data)
+    elif isinstance(part, (list, tuple)):
+        hasher.update(f"{type(part).__name__}:{len(part)}".encode())
+        for item in part:
+            _hash_part(hasher, item)
+    elif isinstance(part, dict):
+        hasher.update(f"dict:{len(part)}".encode())
+        for key in sorted(part, key=repr):
+            _hash_part(hasher, key)
+            _hash_part(hasher, part[key])
+    else:
+        hasher.update(repr(part).encode())
+    hasher.update(b"|")
+
+
+def artifact_key(kind, *parts):
+    """
+    Returns the key of an artifact.
+
+    Inputs:
+    - kind: Kind of artifact, e.g. "page" or "detections". Every kind gets its own folder.
+    - parts: Everything the artifact depends on: input arrays, file digests, stage parameters.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    _hash_part(hasher, kind)
+    for part in parts:
+        _hash_part(hasher, part)
+    return hasher.hexdigest()
+
+
+def _artifact_path(kind, key, extension):
+    return os.path.join(_settings["root"], kind, key[:2], f"{key}{extension}")
+
+
+def _to_json(value):
+    # OCR results come back with numpy coordinates and confidences
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _read(path, format):
+    if format == "npy":
+        return np.load(path, allow_pickle=False)
+    if format == "png":
+        value = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if value is None:
+            raise ValueError(f"Unreadable artifact {path}")
+        return value
+    with open(path) as file:
+        return json.load(file)
+
+
+def _write(path, value, format):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write to a temporary file first so concurrent workers never read a partial artifact
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if format == "npy":
+        with open(temp_path, "wb") as file:
+            np.save(file, value, allow_pickle=False)
+    elif format == "png":
+        ok, encoded = cv2.imencode(".png", value)
+        if not ok:
+            raise ValueError("Could not encode the artifact as PNG")
+        encoded.tofile(temp_path)
+    else:
+        with open(temp_path, "w") as file:
+            json.dump(value, file, default=_to_json)
+    os.replace(temp_path, path)
+
+    _account(os.path.getsize(path))
+
+
+def _account(size):
+    # Count the new artifact and evict when the store is over its limit
+    with _lock:
+        if _size["bytes"] is not None:
+            _size["bytes"] += size
+        over = _size["bytes"] is None or _size["bytes"] > _settings["max_bytes"]
+    if over:
+        evict()
+
+
+def evict(max_bytes=None):
+    """
+    Removes the least recently used artifacts until the store is below 90% of its size limit.
+
+    Every hit refreshes the modification time of the artifact, so it doubles as its last use.
+
+    Returns:
+    - The number of removed artifacts.
+    """
+    root = _settings["root"]
+    if not root or not os.path.isdir(root):
+        return 0
+    max_bytes = _settings["max_bytes"] if max_bytes is None else max_bytes
+
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:  # Evicted by another worker meanwhile
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, path))
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    if total > max_bytes:
+        for _, size, path in sorted(files):
+            if total <= 0.9 * max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+
+    with _lock:
+        _size["bytes"] = total
+        _stats["evictions"] += removed
+    return removed
+
+
+def load_artifact(kind, key, format="npy"):
+    """
+    Reads an artifact from the store.
+
+    Returns:
+    - (True, value) on a hit, (False, None) on a miss or when the store is disabled.
+    """
+    if _settings["root"] is None:
+        return False, None
+
+    path = _artifact_path(kind, key, EXTENSIONS[format])
+    try:
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+        value = _read(path, format)
+        os.utime(path)
+    except (OSError, ValueError):  # Missing, evicted meanwhile or unreadable
+        with _lock:
+            _stats["misses"] += 1
+        return False, None
+
+    with _lock:
+        _stats["hits"] += 1
+    return True, value
+
+
+def store_artifact(kind, key, value, format="npy"):
+    # Writes an artifact to the store, nothing happens when the store is disabled
+    if _settings["root"] is not None:
+        _write(_artifact_path(kind, key, EXTENSIONS[format]), value, format)
+
+
+def cached_artifact(kind, parts, compute, format="npy"):
+    """
+    Returns the stored artifact for the parts, running compute only on a miss.
+
+    Inputs:
+    - kind: Kind of artifact.
+    - parts: Tuple of everything the artifact depends on, see artifact_key.
+    - compute: Function producing the artifact.
+    - format: "npy" for arrays, "png" for images and masks, "json" for lists and dicts.
+
+    Returns:
+    - The artifact. JSON artifacts come back with lists in place of tuples.
+    """
+    if _settings["root"] is None:
+        return compute()
+
+    key = artifact_key(kind, *parts)
+    found, value = load_artifact(kind, key, format)
+    if found:
+        return value
+
+    value = compute()
+    store_artifact(kind, key, value, format)
+    return value
+
+
+def cached_file(kind, parts, output_path, produce):
+    """
+    Makes output_path hold the stored file for the parts, running produce(output_path) only on a miss.
+
+    Used for outputs that are files already, such as rendered page images, so a hit is a file copy.
+
+    Returns:
+    - output_path.
+    """
+    if _settings["root"] is None:
+        produce(output_path)
+        return output_path
+
+    key = artifact_key(kind, *parts)
+    path = _artifact_path(kind, key, os.path.splitext(output_path)[1])
+    try:
+        shutil.copyfile(path, output_path)
+        os.utime(path)
+        with _lock:
+            _stats["hits"] += 1
+        return output_path
+    except OSError:
+        with _lock:
+            _stats["misses"] += 1
+
+    produce(output_path)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    shutil.copyfile(output_path, temp_path)
+    os.replace(temp_path, path)
+    _account(os.path.getsize(path))
+
+    return output_path
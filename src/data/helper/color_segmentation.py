@@ -0,0 +1,104 @@
+import cv2
+import numpy as np
+from src.pipeline.tracing import traced
+
+# HSV ranges of the beam (red) and column (cyan) masks, as (lower, upper) pairs with inclusive bounds
+MASK_COLOR_RANGES = {
+    "red": [((0, 100, 100), (10, 255, 255)), ((160, 100, 100), (180, 255, 255))],
+    "cyan": [((80, 100, 100), (100, 255, 255))],
+}
+
+# Looser HSV ranges used to pick out the scale lines
+SCALE_COLOR_RANGES = {
+    "red": [((0, 50, 50), (10, 255, 255))],
+    "green": [((40, 50, 50), (80, 255, 255))],
+    "blue": [((100, 50, 50), (140, 255, 255))],
+    "yellow": [((20, 50, 50), (30, 255, 255))],
+    "cyan": [((80, 50, 50), (100, 255, 255))],
+    "magenta": [((140, 50, 50), (170, 255, 255))],
+    "orange": [((10, 50, 50), (20, 255, 255))],
+    "purple": [((130, 50, 50), (160, 255, 255))],
+    "black": [((0, 0, 0), (180, 255, 50))],
+}
+
+# Every HSV range gets one bit of the uint8 label map
+MAX_RANGES = 8
+
+
+class ColorSegmentation:
+    """
+    Labels every pixel of an image with the configured colors it belongs to, in a single HSV pass.
+
+    The label map is a uint8 image where bit i is set when the pixel lies in the i-th HSV range, so
+    overlapping ranges are kept exact. Masks of single colors are sliced from it with a 256-entry lookup.
+    Slicing a segmentation (segmentation[y0:y1, x0:x1]) crops the label map and keeps the colors.
+    """
+
+    def __init__(self, label_map, color_bits):
+        self.label_map = label_map
+        self.color_bits = color_bits
+
+    @property
+    def colors(self):
+        return list(self.color_bits)
+
+    def __getitem__(self, key):
+        return ColorSegmentation(self.label_map[key], self.color_bits)
+
+    def masked(self, mask):
+        """
+        Returns the segmentation of the image after cv2.bitwise_and(image, image, mask=mask): pixels outside
+        the mask lose their labels. Black is in none of the ranges, so this equals segmenting the masked image.
+        """
+        return ColorSegmentation(cv2.bitwise_and(self.label_map, self.label_map, mask=mask), self.color_bits)
+
+    def mask(self, color):
+        """
+        Returns the uint8 mask (0 or 255) of the pixels with the given color.
+        """
+        if color not in self.color_bits:
+            raise ValueError(f"Color '{color}' was not segmented. Segmented colors: {self.colors}")
+
+        table = np.where(np.arange(256) & self.color_bits[color], 255, 0).astype(np.uint8)
+        return cv2.LUT(self.label_map, table)
+
+
+@traced()
+def segment_colors(image, colors, color_ranges=MASK_COLOR_RANGES):
+    """
+    Converts an image to HSV once and labels the pixels of all the requested colors.
+
+    Inputs:
+    - image: Image in BGR format.
+    - colors: Names of the colors to label, keys of color_ranges.
+    - color_ranges: HSV ranges of every supported color, as lists of (lower, upper) pairs.
+
+    Returns:
+    - A ColorSegmentation with the label map of the image and the bits of every color.
+    """
+    colors = list(dict.fromkeys(colors))
+    for color in colors:
+        if color not in color_ranges:
+            raise ValueError(f"Unsupported color name '{color}'. Supported colors: {list(color_ranges.keys())}")
+
+    ranges = [(color, bounds) for color in colors for bounds in color_ranges[color]]
+    if len(ranges) > MAX_RANGES:
+        raise ValueError(f"At most {MAX_RANGES} HSV ranges can be segmented at once, got {len(ranges)}")
+
+    # Per channel lookup tables, bit i is set for values inside the i-th range
+    channel_tables = np.zeros((3, 256), dtype=np.uint8)
+    color_bits = dict.fromkeys(colors, 0)
+    values = np.arange(256)
+    for bit, (color, (lower, upper)) in enumerate(ranges):
+        for channel in range(3):
+            inside = (values >= lower[channel]) & (values <= upper[channel])
+            channel_tables[channel, inside] |= 1 << bit
+        color_bits[color] |= 1 << bit
+
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    hue, saturation, value = cv2.split(hsv)
+    label_map = cv2.LUT(hue, channel_tables[0])
+    cv2.bitwise_and(label_map, cv2.LUT(saturation, channel_tables[1]), dst=label_map)
+    cv2.bitwise_and(label_map, cv2.LUT(value, channel_tables[2]), dst=label_map)
+
+    return ColorSegmentation(label_map, color_bits)
@@ -0,0 +1,47 @@
+import os
+import cv2
+import numpy as np
+
+
+def load_image(image):
+    """
+    Returns the image as a BGR numpy array.
+
+    Inputs:
+    - image: Either a path to an image file or an already loaded numpy array.
+
+    Returns:
+    - The image array. Arrays are passed through without copying.
+    """
+    if isinstance(image, np.ndarray):
+        return image
+
+    loaded = cv2.imread(image)
+    if loaded is None:
+        raise ValueError(f"Image not found or unable to load: {image}")
+
+    return loaded
+
+
+def save_debug_image(output_path, image):
+    """
+    Writes an intermediate image to disk when a debug output path is given.
+
+    Inputs:
+    - output_path: Where to write the image, or None to skip writing.
+    - image: The image array to write.
+
+    Returns:
+    - The output path if the image was written, otherwise None.
+    """
+    if not output_path:
+        return None
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if cv2.imwrite(output_path, image):
+        return output_path
+
+    return None
@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from src.data.helper.artifact_store import artifact_key, load_artifact, store_artifact
+from src.pipeline.tracing import count, traced
+
+# Process wide cache of line detections keyed by image content, preprocessing and detector parameters.
+# Detections are also written to the artifact store when it is configured, so they survive between
+# runs and are shared between worker processes.
+_cache = OrderedDict()
+_lock = threading.Lock()
+_settings = {"max_entries": 256}
+_stats = {"hits": 0, "store_hits": 0, "misses": 0}
+
+
+def configure_line_cache(max_entries=None):
+    """
+    Changes the size of the in-memory cache.
+
+    Inputs:
+    - max_entries: Number of detections kept in memory, least recently used ones are dropped first.
+      None keeps the current size, 0 disables the in-memory cache.
+    """
+    with _lock:
+        if max_entries is not None:
+            _settings["max_entries"] = max_entries
+            while len(_cache) > max_entries:
+                _cache.popitem(last=False)
+
+
+def clear_line_cache():
+    # Drops the in-memory detections and resets the counters, the artifact store is left alone
+    with _lock:
+        _cache.clear()
+        _stats.update(hits=0, store_hits=0, misses=0)
+
+
+def line_cache_info():
+    # Hit and miss counters plus the current number of cached detections
+    with _lock:
+        return {**_stats, "entries": len(_cache), **_settings}
+
+
+def preprocess(image, steps):
+    """
+    Applies the preprocessing steps to an image.
+
+    Inputs:
+    - image: The input image.
+    - steps: Sequence of steps, each a name or a tuple of a name and its arguments:
+      "gray" (BGR to grayscale), ("blur", size) (square Gaussian blur), ("erode", size) (square kernel)
+      and ("canny", low, high) (edge detection).
+
+    Returns:
+    - The preprocessed image.
+    """
+    for step in steps:
+        name, *args = (step,) if isinstance(step, str) else step
+        if name == "gray":
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        elif name == "blur":
+            image = cv2.GaussianBlur(image, (args[0], args[0]), 0)
+        elif name == "erode":
+            image = cv2.erode(image, np.ones((args[0], args[0]), np.uint8))
+        elif name == "canny":
+            image = cv2.Canny(image, args[0], args[1])
+        else:
+            raise ValueError(f"Unknown preprocessing step: {step}")
+    return image
+
+
+def cached_detection(image, parameters, detect):
+    """
+    Returns the detection for an image and parameters, running detect only on a cache miss.
+
+    Inputs:
+    - image: The image the detection is computed from, hashed by content.
+    - parameters: Hashable description of the preprocessing and detector settings.
+    - detect: Function computing the detection from the image.
+
+    Returns:
+    - The detected lines, read-only and shared between callers, or None when nothing was found.
+    """
+    key = artifact_key("lines", image, parameters)
+
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            count(line_cache_hits=1)
+            return _cache[key]
+
+    found, lines = load_artifact("lines", key)
+    if found:
+        # Detectors return None when nothing was found, stored as an empty 1-D array
+        lines = None if lines.ndim == 1 else lines
+        with _lock:
+            _stats["store_hits"] += 1
+        count(line_cache_store_hits=1)
+    else:
+        lines = detect(image)
+        store_artifact("lines", key, np.zeros(0, dtype=np.float32) if lines is None else lines)
+        with _lock:
+            _stats["misses"] += 1
+
+    if lines is not None:
+        lines.flags.writeable = False
+
+    with _lock:
+        if _settings["max_entries"] > 0:
+            _cache[key] = lines
+            _cache.move_to_end(key)
+            while len(_cache) > _settings["max_entries"]:
+                _cache.popitem(last=False)
+
+    return lines
+
+
+@traced(counts=lambda lines: {"segments": 0 if lines is None else len(lines)})
+def detect_lsd(image, refine=cv2.LSD_REFINE_NONE, steps=()):
+    """
+    Runs the LSD line segment detector through the cache.
+
+    Inputs:
+    - image: The input image.
+    - refine: LSD refinement mode, cv2.LSD_REFINE_NONE or cv2.LSD_REFINE_STD.
+    - steps: Preprocessing steps applied before detection, see preprocess.
+
+    Returns:
+    - An (N, 1, 4) float32 array of x1, y1, x2, y2, or None when no lines were found.
+    """
+    def detect(source):
+        return cv2.createLineSegmentDetector(refine).detect(preprocess(source, steps))[0]
+
+    return cached_detection(image, ("lsd", refine, tuple(steps)), detect)
+
+
+@traced(counts=lambda lines: {"segments": 0 if lines is None else len(lines)})
+def detect_hough(image, threshold, min_line_length, max_line_gap, rho=1, theta=np.pi / 180, steps=()):
+    """
+    Runs the probabilistic Hough transform through the cache.
+
+    Inputs:
+    - image: The input image.
+    - threshold, min_line_length, max_line_gap, rho, theta: cv2.HoughLinesP parameters.
+    - steps: Preprocessing steps applied before detection, usually ending with a "canny" step.
+
+    Returns:
+    - An (N, 1, 4) int32 array of x1, y1, x2, y2, or None when no lines were found.
+    """
+    def detect(source):
+        return cv2.HoughLinesP(preprocess(source, steps), rho, theta, threshold=threshold,
+                               minLineLength=min_line_length, maxLineGap=max_line_gap)
+
+    return cached_detection(image, ("hough", rho, theta, threshold, min_line_length, max_line_gap, tuple(steps)), detect)
@@ -33,6 +33,115 @@ def segment_lines(lines, max_diff=5):
     return horizontal_lines, vertical_lines, slanted_lines
 
 
+def _merge_band(band, max_distance, max_offset, is_horizontal):
+    """
+    Runs one merge pass over a band of lines, given as (start, end, start offset, end offset, input index)
+    tuples in input order. Merged lines are looked up through a grid over their endpoints instead of
+    comparing each line with every merged line.
+    """
+    merged_lines = []
+    start_cells, end_cells = {}, {}
+
+    def cell(value):
+        return int(value // max_distance)
+
+    def add(index, line):
+        start_cells.setdefault(cell(line[0]), set()).add(index)
+        end_cells.setdefault(cell(line[1]), set()).add(index)
+
+    def nearby(cells, value):
+        center = cell(value)
+        for key in (center - 1, center, center + 1):
+            yield from cells.get(key, ())
+
+    for start, end, start_offset, end_offset, order in band:
+        # Horizontal lines join end to start, vertical lines join start to start or end to end
+        if is_horizontal:
+            candidates = [(i, start_offset, 1, 3) for i in nearby(end_cells, start) if abs(start - merged_lines[i][1]) < max_distance]
+            candidates += [(i, end_offset, 0, 2) for i in nearby(start_cells, end) if abs(end - merged_lines[i][0]) < max_distance]
+        else:
+            candidates = [(i, start_offset, 0, 2) for i in nearby(start_cells, start) if abs(start - merged_lines[i][0]) < max_distance]
+            candidates += [(i, end_offset, 1, 3) for i in nearby(end_cells, end) if abs(end - merged_lines[i][1]) < max_distance]
+
+        # The earliest merged line wins, as in a scan over the merged lines in order
+        matches = [i for i, offset, _, offset_slot in candidates if abs(offset - merged_lines[i][offset_slot]) < max_offset]
+        if not matches:
+            merged_lines.append([start, end, start_offset, end_offset, order])
+            add(len(merged_lines) - 1, merged_lines[-1])
+            continue
+
+        index = min(matches)
+        line = merged_lines[index]
+        start_cells[cell(line[0])].discard(index)
+        end_cells[cell(line[1])].discard(index)
+
+        # Update the merged line to cover the full extent of both lines
+        line[0] = min(start, line[0])
+        line[1] = max(end, line[1])
+        line[2], line[3] = start_offset, end_offset
+        add(index, line)
+
+    return merged_lines
+
+
+def merge_line_chains(lines, max_distance=20, max_offset=15, is_horizontal=True):
+    """
+    Merges duplicate and nearly touching lines without comparing every pair of lines.
+
+    Two lines are merged under the same rule the recursive merge used: a horizontal line merges when its
+    x1 lies within max_distance of the x2 of a merged line (or its x2 within max_distance of the merged
+    line's x1) and their y-coordinates differ by less than max_offset; vertical lines merge when their
+    y1 (or y2) are that close. Endpoints keep their direction, since LSD reports the two edges of a stroke
+    in opposite directions and those are exactly the duplicates that should merge.
+
+    Lines are sorted by their coordinate across the line direction and split into bands wherever there
+    is a gap of at least max_offset, so lines from different bands never merge. Each band is then merged
+    using a grid over the endpoints of the merged lines. Passes repeat until nothing merges, which
+    usually takes two passes.
+
+    Inputs:
+    - lines: A list of lines, where each line is represented as [x1, y1, x2, y2].
+    - max_distance: Maximum distance along the line direction between merged endpoints.
+    - max_offset: Maximum difference across the line direction.
+    - is_horizontal: Whether the lines are horizontal (True) or vertical (False).
+
+    Returns:
+    - A list of merged lines, in the same order the recursive merge produced.
+    """
+    # (start, end, offset at start, offset at end, input index) along the line direction
+    items = []
+    for index, (x1, y1, x2, y2) in enumerate(lines):
+        items.append((x1, x2, y1, y2, index) if is_horizontal else (y1, y2, x1, x2, index))
+
+    while items:
+        # Split into bands wherever the offsets leave a gap of at least max_offset
+        items_by_offset = sorted(items, key=lambda item: min(item[2], item[3]))
+        bands = []
+        band_top = None
+        for item in items_by_offset:
+            if band_top is None or min(item[2], item[3]) - band_top >= max_offset:
+                bands.append([])
+                band_top = max(item[2], item[3])
+            bands[-1].append(item)
+            band_top = max(band_top, item[2], item[3])
+
+        merged_lines = []
+        for band in bands:
+            band.sort(key=lambda item: item[4])
+            merged_lines.extend(_merge_band(band, max_distance, max_offset, is_horizontal))
+
+        # Keep merged lines in the order they were created in
+        merged_lines.sort(key=lambda line: line[4])
+        merged = len(merged_lines) < len(items)
+        items = [(line[0], line[1], line[2], line[3], order) for order, line in enumerate(merged_lines)]
+        if not merged:
+            break
+
+    if is_horizontal:
+        return [[start, start_offset, end, end_offset] for start, end, start_offset, end_offset, _ in items]
+    return [[start_offset, start, end_offset, end] for start, end, start_offset, end_offset, _ in items]
+
+
 def remove_duplicate_lines(lines, max_distance=20, max_y_diff=15, is_horizontal=True):
     """
     Removes duplicate or nearly overlapping lines by merging them into a single line.
@@ -49,40 +158,5 @@ def remove_duplicate_lines(lines, max_distance=20, max_y_diff=15, is_horizontal=
     Returns:
     - A list of merged lines, where duplicates or nearly overlapping lines have been merged.
     """
+    return merge_line_chains(lines, max_distance, max_y_diff, is_horizontal)
 
-    def merge_lines(lines, merged_lines):
-        for line in lines:
-            x1, y1, x2, y2 = line
-            merged = False
-            for i, merged_line in enumerate(merged_lines):
-                x3, y3, x4, y4 = merged_line
-
-                if is_horizontal:
-                    # Merge lines if they are close enough horizontally and vertically
-                    if ((abs(x1 - x4) < max_distance and abs(y1 - y4) < max_y_diff) or
-                        (abs(x2 - x3) < max_distance and abs(y2 - y3) < max_y_diff)):
-                        # Update the merged line to cover the full extent of both lines
-                        merged_lines[i] = [min(x1, x3), y1, max(x2, x4), y2]
-                        merged = True
-                        break
-                else:
-                    # Merge lines if they are close enough vertically and horizontally
-                    if ((abs(x1 - x3) < max_y_diff and abs(y1 - y3) < max_distance) or
-                        (abs(x2 - x4) < max_y_diff and abs(y2 - y4) < max_distance)):
-                        # Update the merged line to cover the full extent of both lines
-                        merged_lines[i] = [x1, min(y1, y3), x2, max(y2, y4)]
-                        merged = True
-                        break
-            
-            # If the line was not merged with any existing line, add it as a new line
-            if not merged:
-                merged_lines.append([x1, y1, x2, y2])
-
-        return merged_lines
-
-    # Recursively merge lines until no more merges are possible
-    merged_lines = merge_lines(lines, [])
-    if len(lines) == len(merged_lines):
-        return merged_lines
-    else:
-        return remove_duplicate_lines(merged_lines, max_distance, max_y_diff, is_horizontal)
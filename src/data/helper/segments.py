@@ -0,0 +1,87 @@
+import numpy as np
+
+
+class LineSegments:
+    """
+    Columnar store of line segments as an (N, 4) float32 array of x1, y1, x2, y2.
+
+    Lengths, orientations and midpoints are derived once for the whole array, so classification,
+    sorting and filtering work on index arrays instead of per-line Python lists.
+    """
+
+    def __init__(self, lines=None):
+        """
+        Inputs:
+        - lines: Line segments in LSD format (N, 1, 4), as an (N, 4) array or as a list of [x1, y1, x2, y2].
+          None or an empty list gives an empty store.
+        """
+        if lines is None or len(lines) == 0:
+            self.lines = np.empty((0, 4), dtype=np.float32)
+        else:
+            self.lines = np.asarray(lines, dtype=np.float32).reshape(-1, 4)
+
+        self._length = None
+        self._orientation = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    @property
+    def dx(self):
+        return self.lines[:, 2] - self.lines[:, 0]
+
+    @property
+    def dy(self):
+        return self.lines[:, 3] - self.lines[:, 1]
+
+    @property
+    def length(self):
+        if self._length is None:
+            self._length = np.hypot(self.dx, self.dy)
+        return self._length
+
+    @property
+    def orientation(self):
+        # Angle in degrees in [0, 180), 0 is horizontal and 90 is vertical
+        if self._orientation is None:
+            self._orientation = np.degrees(np.arctan2(self.dy, self.dx)) % 180
+        return self._orientation
+
+    @property
+    def midpoint(self):
+        return (self.lines[:, :2] + self.lines[:, 2:]) / 2
+
+    def classify(self, max_diff=5):
+        """
+        Splits the segments by orientation.
+
+        Inputs:
+        - max_diff: Largest change in x (for vertical lines) or y (for horizontal lines) along a segment.
+
+        Returns:
+        - Index arrays of the horizontal, vertical and slanted segments, each in input order.
+          Segments that fit both are counted as vertical.
+        """
+        vertical = np.abs(self.dx) <= max_diff
+        horizontal = ~vertical & (np.abs(self.dy) <= max_diff)
+        slanted = ~vertical & ~horizontal
+        return np.flatnonzero(horizontal), np.flatnonzero(vertical), np.flatnonzero(slanted)
+
+    def by_length(self, indices=None):
+        """
+        Returns the given segment indices (all segments by default) ordered from longest to shortest,
+        keeping input order between segments of equal length.
+        """
+        if indices is None:
+            indices = np.arange(len(self))
+        indices = np.asarray(indices, dtype=np.intp)
+        return indices[np.argsort(-self.length[indices], kind="stable")]
+
+    def take(self, indices):
+        # New store holding only the given segments, in the given order
+        return LineSegments(self.lines[np.asarray(indices, dtype=np.intp)])
+
+    def to_list(self, indices=None):
+        # Segments as lists of [x1, y1, x2, y2], the format used in bar results
+        lines = self.lines if indices is None else self.lines[np.asarray(indices, dtype=np.intp)]
+        return lines.tolist()
@@ -0,0 +1,137 @@
+import fitz  # PyMuPDF
+import numpy as np
+from src.data.helper.color_segmentation import segment_colors
+from src.pipeline.tracing import traced
+
+# Filled rectangles thinner than this (in PDF points) are drawn strokes, not areas
+THIN_RECT_POINTS = 2
+
+
+@traced(counts=lambda result: {"segments": len(result[0])})
+def extract_page_segments(page, dpi=450):
+    """
+    Reads the straight line segments of a vector PDF page from its drawing operators.
+
+    Inputs:
+    - page: The fitz.Page to read.
+    - dpi: Resolution of the pixel coordinates to return, matching a render of the page at this DPI.
+
+    Returns:
+    - segments: (N, 4) float32 array of x1, y1, x2, y2 in page pixels.
+    - colors: (N, 3) uint8 array of the RGB stroke (or fill, for thin filled rectangles) color of each segment.
+    """
+    zoom = dpi / 72
+    # Drawings are in unrotated page space, renders are in rotated space
+    transform = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+
+    segments, colors = [], []
+
+    for drawing in page.get_drawings():
+        stroke, fill = drawing.get("color"), drawing.get("fill")
+
+        for item in drawing["items"]:
+            kind = item[0]
+            if kind == "l" and stroke is not None:
+                points = [(item[1], item[2])]
+                color = stroke
+            elif kind == "c" and stroke is not None:
+                # Curves (hook bends) are approximated by their chord
+                points = [(item[1], item[4])]
+                color = stroke
+            elif kind == "re":
+                rect = item[1]
+                if fill is not None and min(rect.width, rect.height) <= THIN_RECT_POINTS:
+                    # Thick lines are often exported as thin filled rectangles, use their center line
+                    if rect.width >= rect.height:
+                        y = (rect.y0 + rect.y1) / 2
+                        points = [((rect.x0, y), (rect.x1, y))]
+                    else:
+                        x = (rect.x0 + rect.x1) / 2
+                        points = [((x, rect.y0), (x, rect.y1))]
+                    color = fill
+                elif stroke is not None:
+                    points = [(rect.tl, rect.tr), (rect.tr, rect.br), (rect.br, rect.bl), (rect.bl, rect.tl)]
+                    color = stroke
+                else:
+                    continue
+            elif kind == "qu" and stroke is not None:
+                quad = item[1]
+                points = [(quad.ul, quad.ur), (quad.ur, quad.lr), (quad.lr, quad.ll), (quad.ll, quad.ul)]
+                color = stroke
+            else:
+                continue
+
+            for start, end in points:
+                start = fitz.Point(start) * transform
+                end = fitz.Point(end) * transform
+                segments.append((start.x, start.y, end.x, end.y))
+                colors.append(color)
+
+    if not segments:
+        return np.zeros((0, 4), dtype=np.float32), np.zeros((0, 3), dtype=np.uint8)
+
+    return (np.array(segments, dtype=np.float32),
+            np.clip(np.rint(np.array(colors, dtype=np.float32)[:, :3] * 255), 0, 255).astype(np.uint8))
+
+
+def is_vector_page(segments, min_segments=50):
+    # Scanned pages carry a single image and (almost) no drawing operators
+    return len(segments) >= min_segments
+
+
+def color_matches(colors, color):
+    # Classify the segment colors with the same HSV ranges create_image_mask uses
+    if len(colors) == 0:
+        return np.zeros(0, dtype=bool)
+    bgr = np.ascontiguousarray(colors[:, ::-1]).reshape(-1, 1, 3)
+    return segment_colors(bgr, [color]).mask(color).reshape(-1) > 0
+
+
+def clip_segments(segments, box):
+    # Keep the parts of axis aligned segments inside the box, slanted segments only if fully inside
+    xmin, ymin, xmax, ymax = box
+    x1, y1, x2, y2 = segments.T
+
+    horizontal = np.abs(y1 - y2) < 1e-3
+    vertical = np.abs(x1 - x2) < 1e-3
+    left, right = np.minimum(x1, x2), np.maximum(x1, x2)
+    top, bottom = np.minimum(y1, y2), np.maximum(y1, y2)
+
+    overlaps = (right >= xmin) & (left <= xmax) & (bottom >= ymin) & (top <= ymax)
+    inside = (left >= xmin) & (right <= xmax) & (top >= ymin) & (bottom <= ymax)
+    keep = np.where(horizontal | vertical, overlaps, inside)
+
+    clipped = segments[keep].copy()
+    clipped[:, [0, 2]] = np.clip(clipped[:, [0, 2]], xmin, xmax)
+    clipped[:, [1, 3]] = np.clip(clipped[:, [1, 3]], ymin, ymax)
+
+    # Drop segments that were clipped down to a point
+    lengths = np.hypot(clipped[:, 2] - clipped[:, 0], clipped[:, 3] - clipped[:, 1])
+    return clipped[lengths > 0]
+
+
+def get_vector_lines(segments, colors, box, color, offset=5):
+    """
+    Selects the segments of one color inside a beam box, in the coordinates of the beam's masked image.
+
+    Inputs:
+    - segments, colors: Output of extract_page_segments.
+    - box: The beam box (xmin, ymin, xmax, ymax) in page pixels.
+    - color: Color name, 'red' or 'cyan' as in create_image_mask.
+    - offset: Pixels create_image_mask crops from each side of the beam, so the
+      coordinates match the raster path.
+
+    Returns:
+    - An (N, 1, 4) float32 array of lines, the same layout cv2's LSD returns.
+    """
+    xmin, ymin, xmax, ymax = box
+    selected = clip_segments(segments[color_matches(colors, color)], (xmin + offset, ymin + offset, xmax - offset, ymax - offset))
+
+    selected[:, [0, 2]] -= xmin + offset
+    selected[:, [1, 3]] -= ymin + offset
+
+    # Orient horizontal lines left to right and vertical lines top to bottom like LSD output sorted by the stages
+    flip = (selected[:, 0] > selected[:, 2]) | ((selected[:, 0] == selected[:, 2]) & (selected[:, 1] > selected[:, 3]))
+    selected[flip] = selected[flip][:, [2, 3, 0, 1]]
+
+    return selected.reshape(-1, 1, 4)
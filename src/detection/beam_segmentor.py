@@ -1,36 +1,16 @@
 import cv2
-import matplotlib.pyplot as plt
-from ultralytics import YOLO
 import os
 import warnings
+from src.detection.helper.model_registry import run_model
 from src.detection.helper.nms import calculate_intersection_over_union, merge_rectangles
 from src.detection.helper.plot_detections import plot_one_box
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import workspace_dir
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-# Using the YOLO object detection model to detect individual beams in an image with multiple beams
-def detect_beams(image_path, model_path="src/models/beam_detector.pt"):
-    model = YOLO(model_path)
-
-    image = cv2.imread(image_path)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    # results will contain detected coords, confidence and the class of the detected object
-    results = model(image_rgb)
-    detections = results[0].boxes.data.cpu().numpy()
-
-    # Saving the individual beam image to a folder
-    beam_output_dir = 'public/Beams'
-    vertical_scale_output_dir = 'public/vertical_scales'
-
-    # If the directory already exists, delete it to remove previous images
-    for output_dir in [beam_output_dir, vertical_scale_output_dir]:
-        if os.path.isdir(output_dir):
-            for file in os.listdir(output_dir):
-                file_path = os.path.join(output_dir, file)
-                os.remove(file_path)
-        os.makedirs(output_dir, exist_ok=True)
-
+# Split beam detector output into beams and vertical scales as (x, y, width, height) rects
+def split_beam_detections(detections):
     beams = []
     vertical_scales = []
 
@@ -57,6 +37,34 @@ def detect_beams(image_path, model_path="src/models/beam_detector.pt"):
         if not merged:
             target_list.append(rect)
 
+    return beams, vertical_scales
+
+# Using the YOLO object detection model to detect individual beams in an image with multiple beams
+@traced(counts=lambda result: {"beams": len(result[0]), "vertical_scales": len(result[1])})
+def detect_beams(image_path, model_path="src/models/beam_detector.pt", device=None, output_dir=None, tiling=None):
+    # Without an output directory the crops go to the workspace of the current run
+    output_dir = output_dir or workspace_dir()
+
+    image = cv2.imread(image_path)
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    # results will contain detected coords, confidence and the class of the detected object
+    detections = run_model(model_path, image_rgb, device=device, tiling=tiling)
+
+    # Saving the individual beam image to a folder
+    beam_output_dir = os.path.join(output_dir, 'Beams')
+    vertical_scale_output_dir = os.path.join(output_dir, 'vertical_scales')
+
+    # If the directory already exists, delete it to remove previous images
+    for directory in [beam_output_dir, vertical_scale_output_dir]:
+        if os.path.isdir(directory):
+            for file in os.listdir(directory):
+                file_path = os.path.join(directory, file)
+                os.remove(file_path)
+        os.makedirs(directory, exist_ok=True)
+
+    beams, vertical_scales = split_beam_detections(detections)
+
     # Saving beams
     for idx, (xmin, ymin, width, height) in enumerate(beams):
         xmax, ymax = xmin + width, ymin + height
@@ -77,11 +85,12 @@ def detect_beams(image_path, model_path="src/models/beam_detector.pt"):
         
         plot_one_box([xmin, ymin, xmax, ymax], image_rgb, color=(0, 255, 0), label="Vertical Scale", line_thickness=2)
 
-    output_path = 'public/beams_and_scales.png'
+    output_path = os.path.join(output_dir, 'beams_and_scales.png')
     cv2.imwrite(output_path, cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR))
 
 
-    return True
+    # Rects as (x, y, width, height), in the order of the saved beam_<idx>.png and vertical_scale_<idx>.png images
+    return beams, vertical_scales
 
 if __name__ == "__main__":
     image_path = "public/images/Class 1/PDF 3_1.png"
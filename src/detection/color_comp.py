@@ -1,7 +1,7 @@
 from PIL import Image
 import numpy as np
 from collections import defaultdict
-from scipy.spatial import KDTree
+from src.pipeline.tracing import traced
 
 # List of General colours
 COLOR_LIST = [
@@ -21,42 +21,227 @@ COLOR_LIST = [
 ]
 
 
+class ColorPalette:
+    """
+    Nearest-colour naming index built once for a list of named colours.
+
+    Args:
+        color_list (list): ((r, g, b), name) tuples, e.g. COLOR_LIST.
+        bits (int): Bits per channel of the RGB lookup table used to label whole images.
+    """
+
+    def __init__(self, color_list=COLOR_LIST, bits=6):
+        self.colors = np.array([color[0] for color in color_list], dtype=np.float32)
+        self.names = [color[1] for color in color_list]
+        self.bits = bits
+        self._tree = None
+        self._lut = None
+
+    @property
+    def tree(self):
+        # KD-tree over the palette, built on first use so importing this module doesn't load scipy
+        if self._tree is None:
+            from scipy.spatial import KDTree
+            self._tree = KDTree(self.colors)
+        return self._tree
+
+    @property
+    def lut(self):
+        # Palette index of the nearest colour for every quantized RGB cell, built on first use
+        if self._lut is None:
+            levels = 1 << self.bits
+            step = 256 // levels
+            centers = np.arange(levels) * step + (step - 1) / 2
+            grid = np.stack(np.meshgrid(centers, centers, centers, indexing='ij'), axis=-1).reshape(-1, 3)
+            _, indices = self.tree.query(grid)
+            dtype = np.uint8 if len(self.names) <= 256 else np.uint16
+            self._lut = indices.astype(dtype)
+        return self._lut
+
+    def nearest(self, colors):
+        # Exact palette index of the nearest colour for an (N, 3) array of RGB colours
+        colors = np.asarray(colors, dtype=np.float32).reshape(-1, 3)
+        _, indices = self.tree.query(colors)
+        return indices
+
+    def name_colors(self, colors):
+        return [self.names[index] for index in self.nearest(colors)]
+
+    def label_image(self, image, bgr=False):
+        """
+        Label every pixel of an image with the index of its nearest palette colour.
+
+        Args:
+            image (numpy.ndarray): (H, W, 3) uint8 image.
+            bgr (bool): Set when the image comes from OpenCV in BGR channel order.
+
+        Returns:
+            numpy.ndarray: (H, W) palette indices, see ColorPalette.names.
+        """
+        shift = 8 - self.bits
+        image = np.asarray(image)
+        r, g, b = (2, 1, 0) if bgr else (0, 1, 2)
+
+        index = (image[..., r] >> shift).astype(np.uint32)
+        index <<= self.bits
+        index |= image[..., g] >> shift
+        index <<= self.bits
+        index |= image[..., b] >> shift
+
+        return self.lut[index]
+
+
+DEFAULT_PALETTE = ColorPalette()
+
+
 def get_color_name(rgb_tuple):
-    tree = KDTree([color[0] for color in COLOR_LIST])
-    
     # Find the closest color
-    _, index = tree.query(rgb_tuple)
-    
-    return COLOR_LIST[index][1]
+    return DEFAULT_PALETTE.name_colors([rgb_tuple])[0]
 
 
-def get_colors(image_path, num_colors=10, similarity_threshold=10):
-    img = Image.open(image_path)
-    img = img.convert('RGB')
-    
-    pixels = list(img.getdata())
+def get_color_names(rgb_colors, palette=DEFAULT_PALETTE):
+    return palette.name_colors(rgb_colors) if len(rgb_colors) else []
 
-    color_counts = defaultdict(int)
-    for pixel in pixels:
-        color_counts[pixel] += 1
-    
-    # Merging colors that are similar
-    merged_colors = defaultdict(int)
-    for color, count in color_counts.items():
-        found_similar = False
-        for merged_color in merged_colors:
-            if all(abs(c1 - c2) <= similarity_threshold for c1, c2 in zip(color, merged_color)):
-                merged_colors[merged_color] += count
-                found_similar = True
+
+# Pack an (N, 3) uint8 RGB array into a single 24 bit integer per pixel
+def pack_rgb(pixels):
+    # Built in place to avoid widening the whole (N, 3) array to uint32
+    packed = pixels[:, 0].astype(np.uint32)
+    packed <<= 8
+    packed |= pixels[:, 1]
+    packed <<= 8
+    packed |= pixels[:, 2]
+    return packed
+
+
+def unpack_rgb(packed):
+    packed = np.asarray(packed, dtype=np.uint32)
+    return np.stack(((packed >> 16) & 255, (packed >> 8) & 255, packed & 255), axis=-1)
+
+
+def load_pixels(image):
+    # Accepts a path, a PIL image or an RGB array and returns an (N, 3) uint8 array
+    if isinstance(image, np.ndarray):
+        pixels = image
+    else:
+        if not isinstance(image, Image.Image):
+            image = Image.open(image)
+        pixels = np.asarray(image.convert('RGB'))
+
+    return pixels.reshape(-1, 3)
+
+
+def sample_size_for_error(max_error, confidence=0.99):
+    # Hoeffding bound: with this many samples every colour's pixel share is
+    # within max_error of its true share with the requested confidence
+    return int(np.ceil(np.log(2 / (1 - confidence)) / (2 * max_error ** 2)))
+
+
+def color_histogram(pixels, sample_error=None, confidence=0.99, seed=0):
+    """
+    Count the occurrences of every distinct colour.
+
+    Args:
+        pixels (numpy.ndarray): (N, 3) uint8 RGB pixels.
+        sample_error (float, optional): If given, count a random sample of pixels instead of all of them.
+            The share of every colour is then off by at most this fraction of the image (e.g. 0.001).
+        confidence (float): Probability with which the sample_error bound holds.
+        seed (int): Seed for the pixel sample, so repeated runs give the same palette.
+
+    Returns:
+        tuple: Packed RGB colours and their pixel counts (scaled to the full image when sampling).
+    """
+    total = len(pixels)
+
+    if sample_error is not None:
+        sample_size = sample_size_for_error(sample_error, confidence)
+        if sample_size < total:
+            rng = np.random.default_rng(seed)
+            pixels = pixels[rng.integers(0, total, size=sample_size)]
+
+    packed = pack_rgb(pixels)
+
+    # A dense 2^24 bincount is a single linear pass, much faster than sorting for full pages
+    if len(packed) > 1 << 20:
+        counts = np.bincount(packed, minlength=1 << 24)
+        colors = np.flatnonzero(counts).astype(np.uint32)
+        counts = counts[colors]
+    else:
+        colors, counts = np.unique(packed, return_counts=True)
+
+    if len(packed) != total:
+        counts = np.rint(counts * (total / len(packed))).astype(np.int64)
+
+    return colors, counts
+
+
+def merge_similar_colors(colors, counts, similarity_threshold=10):
+    """
+    Merge colours whose channels all differ by at most similarity_threshold.
+
+    Colours are first bucketed into a grid with cells similarity_threshold + 1 wide, so every cell
+    only holds similar colours and is represented by its most common one. Cell representatives are
+    then merged greedily, most common first, only looking at the 27 neighbouring cells.
+
+    Returns:
+        list: ((r, g, b), count) tuples sorted by count in descending order.
+    """
+    if len(colors) == 0:
+        return []
+
+    step = similarity_threshold + 1
+    rgb = unpack_rgb(colors).astype(np.int64)
+    cells = rgb // step
+    cell_keys = (cells[:, 0] << 16) | (cells[:, 1] << 8) | cells[:, 2]
+
+    # Group by cell with the most common colour of each cell first
+    order = np.lexsort((-counts, cell_keys))
+    cell_keys = cell_keys[order]
+    starts = np.flatnonzero(np.r_[True, cell_keys[1:] != cell_keys[:-1]])
+    cell_counts = np.add.reduceat(counts[order], starts)
+    representatives = rgb[order][starts].tolist()
+    rep_cells = cells[order][starts].tolist()
+    cell_counts = cell_counts.tolist()
+
+    # Merge neighbouring cells, most common first
+    merged = []
+    grid = defaultdict(list)
+    offsets = [(dr, dg, db) for dr in (-1, 0, 1) for dg in (-1, 0, 1) for db in (-1, 0, 1)]
+
+    for idx in sorted(range(len(cell_counts)), key=lambda i: cell_counts[i], reverse=True):
+        color = representatives[idx]
+        r, g, b = rep_cells[idx]
+        target = None
+        for dr, dg, db in offsets:
+            for candidate in grid.get((r + dr, g + dg, b + db), ()):
+                if all(abs(c1 - c2) <= similarity_threshold for c1, c2 in zip(color, merged[candidate][0])):
+                    target = candidate
+                    break
+            if target is not None:
                 break
-        if not found_similar:
-            merged_colors[color] = count
-    
-    # Sort by number of pixels
-    sorted_colors = sorted(merged_colors.items(), key=lambda x: x[1], reverse=True)
-    
+
+        if target is None:
+            grid[(r, g, b)].append(len(merged))
+            merged.append([tuple(color), cell_counts[idx]])
+        else:
+            merged[target][1] += cell_counts[idx]
+
+    merged.sort(key=lambda x: x[1], reverse=True)
+
+    return [(color, count) for color, count in merged]
+
+
+@traced(counts=lambda result: {"colors": len(result[0])})
+def get_colors(image_path, num_colors=10, similarity_threshold=10, sample_error=None):
+    pixels = load_pixels(image_path)
+
+    colors, counts = color_histogram(pixels, sample_error=sample_error)
+
+    # Merging colors that are similar, sorted by number of pixels
+    sorted_colors = merge_similar_colors(colors, counts, similarity_threshold)
+
     top_colors = sorted_colors[:num_colors]
-    named_colors = [get_color_name(rgb) for rgb, _ in top_colors]
+    named_colors = get_color_names([rgb for rgb, _ in top_colors])
     
     return named_colors, top_colors
 
@@ -0,0 +1,143 @@
+import os
+import threading
+import numpy as np
+from src.data.helper.artifact_store import artifact_store_enabled, cached_artifact, file_digest
+from src.detection.helper.tiling import predict_tiled
+from src.pipeline.tracing import traced
+
+# Process wide cache of loaded YOLO models keyed by (weights path, device)
+_models = {}
+_lock = threading.Lock()
+
+
+def _model_key(model_path, device):
+    return os.path.abspath(model_path), str(device) if device is not None else "auto"
+
+
+def get_model(model_path, device=None, warmup=False):
+    """
+    Return the YOLO model for the given weights, loading it on first use only.
+
+    Args:
+        model_path (str): Path to the .pt weights.
+        device (str, optional): Device to run the model on, e.g. "cpu" or "cuda:0". Defaults to ultralytics' choice.
+        warmup (bool): Run a dummy inference after loading so the first real call does not pay for setup.
+
+    Returns:
+        ultralytics.YOLO: The shared model instance.
+    """
+    key = _model_key(model_path, device)
+
+    with _lock:
+        model = _models.get(key)
+        if model is None:
+            # ultralytics pulls in torch, so it is imported with the first model and not with this module
+            from ultralytics import YOLO
+            model = YOLO(model_path)
+            if device is not None:
+                model.to(device)
+            _models[key] = model
+
+            if warmup:
+                predict(model, np.zeros((64, 64, 3), dtype=np.uint8), device=device)
+
+    return model
+
+
+def register_model(model_path, model, device=None):
+    """
+    Put an already loaded model (or a stand-in with the same call interface) in the cache,
+    so every later call for model_path uses it instead of loading the weights.
+
+    Args:
+        model_path (str): Path the model is registered under.
+        model: Object called like an ultralytics.YOLO model.
+        device (str, optional): Device the model is registered for.
+
+    Returns:
+        The registered model.
+    """
+    with _lock:
+        _models[_model_key(model_path, device)] = model
+
+    return model
+
+
+def predict(model, image_rgb, device=None):
+    # Run a model on an RGB image and return its detections as an (N, 6) array of x1, y1, x2, y2, conf, cls
+    return predict_batch(model, [image_rgb], device=device)[0]
+
+
+def predict_batch(model, images, device=None):
+    if device is not None:
+        results = model(images, device=device)
+    else:
+        results = model(images)
+
+    return [result.boxes.data.cpu().numpy() for result in results]
+
+
+@traced(counts=lambda detections: {"detections": len(detections)})
+def run_model(model_path, image_rgb, device=None, tiling=None):
+    """
+    Run the cached model for model_path on an RGB image.
+
+    Args:
+        model_path (str): Path to the .pt weights.
+        image_rgb (numpy.ndarray or PageRaster): Image to run on. A PageRaster is only rendered tile by tile
+            when tiling is given, otherwise it is rendered whole first.
+        device (str, optional): Device to run the model on.
+        tiling (dict, optional): Run on overlapping tiles instead of the whole image, with the keyword
+            arguments of tiling.predict_tiled, e.g. {"tile_size": 1280, "overlap": 256, "max_memory_mb": 512}.
+
+    Returns:
+        numpy.ndarray: (N, 6) detections in image coordinates. With the artifact store configured, detections
+        of an image already seen by the same weights are read from the store instead.
+    """
+    def detect():
+        model = get_model(model_path, device)
+
+        if tiling:
+            return predict_tiled(lambda crops: predict_batch(model, crops, device=device), image_rgb, **tiling)
+
+        image = image_rgb if isinstance(image_rgb, np.ndarray) else image_rgb[:, :]
+        return predict(model, image, device=device)
+
+    if not artifact_store_enabled():
+        return detect()
+
+    # Models registered without a weights file are identified by their path
+    weights = file_digest(model_path) if os.path.isfile(model_path) else os.path.abspath(model_path)
+    return cached_artifact("detections", (weights, image_rgb, tiling), detect)
+
+
+def evict_model(model_path=None, device=None):
+    """
+    Drop cached models so their memory can be reclaimed.
+
+    Args:
+        model_path (str, optional): Weights to evict. If not given, every cached model is evicted.
+        device (str, optional): Only evict the model loaded on this device.
+
+    Returns:
+        int: Number of models evicted.
+    """
+    with _lock:
+        if model_path is None:
+            keys = list(_models)
+        elif device is None:
+            path = os.path.abspath(model_path)
+            keys = [key for key in _models if key[0] == path]
+        else:
+            keys = [_model_key(model_path, device)]
+
+        evicted = 0
+        for key in keys:
+            if _models.pop(key, None) is not None:
+                evicted += 1
+
+    return evicted
+
+
+def loaded_models():
+    return list(_models)
@@ -0,0 +1,200 @@
+import numpy as np
+
+
+def tile_starts(length, tile_size, overlap):
+    # Start offsets along one axis, the last tile is aligned with the image edge
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def iter_tiles(height, width, tile_size=1280, overlap=256):
+    """
+    Lazily yield overlapping windows covering an image.
+
+    Args:
+        height (int): Image height.
+        width (int): Image width.
+        tile_size (int): Side of the square windows.
+        overlap (int): Pixels shared by neighbouring windows, should exceed the size of the objects to detect.
+
+    Yields:
+        tuple: Window as (x0, y0, x1, y1).
+    """
+    if overlap >= tile_size:
+        raise ValueError("Tile overlap must be smaller than the tile size.")
+
+    for y0 in tile_starts(height, tile_size, overlap):
+        for x0 in tile_starts(width, tile_size, overlap):
+            yield x0, y0, min(x0 + tile_size, width), min(y0 + tile_size, height)
+
+
+def batch_size_for_memory(tile_size, batch_size, max_memory_mb=None):
+    # Each tile costs its uint8 crop plus the float32 tensor the model builds from it
+    if max_memory_mb is None:
+        return batch_size
+    tile_bytes = tile_size * tile_size * 3 * (1 + 4)
+    return max(1, min(batch_size, int(max_memory_mb * 1024 * 1024 // tile_bytes)))
+
+
+def clipped_sides(boxes, window, image_shape, margin=2):
+    # Marks the sides (left, top, right, bottom) of boxes that touch an inner window edge, so are likely cut off by the tile
+    x0, y0, x1, y1 = window
+    height, width = image_shape[:2]
+    return np.stack([(boxes[:, 0] <= x0 + margin) & (x0 > 0),
+                     (boxes[:, 1] <= y0 + margin) & (y0 > 0),
+                     (boxes[:, 2] >= x1 - margin) & (x1 < width),
+                     (boxes[:, 3] >= y1 - margin) & (y1 < height)], axis=1)
+
+
+def _extent_overlap(starts, ends):
+    # Pairwise intersection over union of 1D extents
+    intersection = np.clip(np.minimum(ends[:, None], ends[None, :]) - np.maximum(starts[:, None], starts[None, :]), 0, None)
+    union = np.maximum(ends[:, None], ends[None, :]) - np.minimum(starts[:, None], starts[None, :])
+    return intersection / np.maximum(union, 1e-9)
+
+
+def seam_pairs(boxes, windows, sides, alignment=0.5):
+    """
+    Pairs of boxes that are the two halves of one object cut by a tile seam.
+
+    Box i (tile A) and box j (tile B) are halves when B starts inside A along one axis and the tiles share
+    the band across it, i was cut by A's far edge and j by B's near edge on that axis, and both cover
+    nearly the same extent along the seam (IoU of that extent at least alignment). Two different objects
+    that merely touch at a seam have different extents along it, so they are kept apart.
+
+    Returns:
+        numpy.ndarray: (N, N) bool, symmetric.
+    """
+    pairs = np.zeros((len(boxes), len(boxes)), dtype=bool)
+    for axis in (0, 1):
+        across = 1 - axis
+        # A is before B on this axis and they overlap, and the tiles share the band across it
+        before = (windows[:, None, axis] < windows[None, :, axis]) & (windows[None, :, axis] < windows[:, None, axis + 2])
+        shared = ((windows[:, None, across] < windows[None, :, across + 2]) &
+                  (windows[None, :, across] < windows[:, None, across + 2]))
+        cut = sides[:, None, axis + 2] & sides[None, :, axis]
+        aligned = _extent_overlap(boxes[:, across], boxes[:, across + 2]) >= alignment
+        pairs |= before & shared & cut & aligned
+
+    return pairs | pairs.T
+
+
+def fuse_detections(detections, windows, sides, iou_threshold=0.5, containment_threshold=0.7):
+    """
+    Fuse detections coming from overlapping tiles back into one detection per object.
+
+    Two detections of the same class are merged when their IoU exceeds iou_threshold, when one
+    mostly lies inside the other, or when they overlap and are the two halves of an object cut by a
+    seam, see seam_pairs. Merging is transitive, so an object split over several tiles becomes a single box.
+
+    Args:
+        detections (numpy.ndarray): (N, 6) x1, y1, x2, y2, conf, cls in page coordinates.
+        windows (numpy.ndarray): (N, 4) tile window (x0, y0, x1, y1) each detection came from.
+        sides (numpy.ndarray): (N, 4) bool, which sides of each detection touched an inner tile edge, see clipped_sides.
+
+    Returns:
+        numpy.ndarray: (M, 6) fused detections; boxes are the union of their group, conf the maximum.
+    """
+    if len(detections) == 0:
+        return detections.reshape(0, 6)
+
+    boxes = detections[:, :4]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    ix1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    iy1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    ix2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    iy2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    intersection = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+
+    union = areas[:, None] + areas[None, :] - intersection
+    smaller = np.minimum(areas[:, None], areas[None, :])
+    iou = intersection / np.maximum(union, 1e-9)
+    containment = intersection / np.maximum(smaller, 1e-9)
+
+    same_class = detections[:, None, 5] == detections[None, :, 5]
+    seam = seam_pairs(boxes, windows, sides) & (intersection > 0)
+    mergeable = same_class & ((iou > iou_threshold) | (containment > containment_threshold) | seam)
+
+    # Union find over the mergeable pairs
+    parent = list(range(len(detections)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(np.triu(mergeable, k=1))):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    groups = {}
+    for i in range(len(detections)):
+        groups.setdefault(find(i), []).append(i)
+
+    fused = []
+    for members in groups.values():
+        group = detections[members]
+        fused.append([group[:, 0].min(), group[:, 1].min(), group[:, 2].max(), group[:, 3].max(),
+                      group[:, 4].max(), group[0, 5]])
+
+    return np.array(fused, dtype=detections.dtype)
+
+
+def predict_tiled(predict_batch, image_rgb, tile_size=1280, overlap=256, batch_size=4, max_memory_mb=None, iou_threshold=0.5):
+    """
+    Run a detector over overlapping tiles of a large image and stitch the detections back together.
+
+    Args:
+        predict_batch (callable): Takes a list of RGB crops and returns one (N, 6) detection array per crop.
+        image_rgb (numpy.ndarray or PageRaster): Full page image, or a tile source with a shape that renders
+            only the windows sliced from it, such as pdf_to_image.PageRaster. With a tile source the memory
+            used is bounded by the batch of tiles, not the page.
+        tile_size (int): Side of the square tiles.
+        overlap (int): Overlap between neighbouring tiles in pixels.
+        batch_size (int): Maximum number of tiles sent to the model at once.
+        max_memory_mb (float, optional): Memory budget for a batch of tiles, lowers batch_size if needed.
+        iou_threshold (float): IoU above which detections from different tiles are fused.
+
+    Returns:
+        numpy.ndarray: (M, 6) detections in page coordinates.
+    """
+    height, width = image_rgb.shape[:2]
+    batch_size = batch_size_for_memory(tile_size, batch_size, max_memory_mb)
+
+    all_detections = []
+    all_windows = []
+    all_sides = []
+
+    def run(windows):
+        # Crops are views into the page, or rendered on demand by a tile source, only the batch being inferred is in memory
+        crops = [image_rgb[y0:y1, x0:x1] for x0, y0, x1, y1 in windows]
+        for window, detections in zip(windows, predict_batch(crops)):
+            if len(detections) == 0:
+                continue
+            detections = detections.copy()
+            detections[:, [0, 2]] += window[0]
+            detections[:, [1, 3]] += window[1]
+            all_detections.append(detections)
+            all_windows.append(np.tile(window, (len(detections), 1)))
+            all_sides.append(clipped_sides(detections, window, image_rgb.shape))
+
+    windows = []
+    for window in iter_tiles(height, width, tile_size, overlap):
+        windows.append(window)
+        if len(windows) == batch_size:
+            run(windows)
+            windows = []
+    if windows:
+        run(windows)
+
+    if not all_detections:
+        return np.zeros((0, 6), dtype=np.float32)
+
+    return fuse_detections(np.concatenate(all_detections), np.concatenate(all_windows), np.concatenate(all_sides), iou_threshold)
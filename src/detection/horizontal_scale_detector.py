@@ -1,20 +1,32 @@
 import cv2
-from ultralytics import YOLO
 import os
 import warnings
+from src.detection.helper.model_registry import run_model
 from src.detection.helper.plot_detections import plot_one_box
+from src.pipeline.workspace import workspace_dir
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-def detect_and_save_horizontal(image_path, model_path="src/models/scale_detector.pt", output_dir="public/horizontal_scales", add_padding=False):
+# Horizontal scale boxes as (xmin, ymin, xmax, ymax), optionally padded left and right
+def get_horizontal_boxes(detections, image_shape, add_padding=False, padding=30):
+    horizontal_scales = []
 
-    model = YOLO(model_path)
-    image = cv2.imread(image_path)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    for idx, (*xyxy, conf, cls) in enumerate(detections):
+        xmin, ymin, xmax, ymax = map(int, xyxy)
+        width, height = xmax - xmin, ymax - ymin
+        
+        # Identify horizontal scales based on width being greater than height
+        if width > height:
+            horizontal_scales.append((xmin, ymin, xmax, ymax))
 
-    # Detect objects in the image using the YOLO model
-    results = model(image_rgb)
-    detections = results[0].boxes.data.cpu().numpy()
+    if add_padding:
+        horizontal_scales = [(max(0, xmin - padding), ymin, min(image_shape[1], xmax + padding), ymax)
+                             for xmin, ymin, xmax, ymax in horizontal_scales]
+
+    return horizontal_scales
+
+def save_horizontal_scales(image_rgb, detections, output_dir=None, add_padding=False):
+    output_dir = output_dir or workspace_dir("horizontal_scales")
 
     # Clear the output directory before saving new images
     if os.path.isdir(output_dir):
@@ -24,33 +36,35 @@ def detect_and_save_horizontal(image_path, model_path="src/models/scale_detector
 
     os.makedirs(output_dir, exist_ok=True)
 
-    horizontal_scales = []
+    horizontal_scales = get_horizontal_boxes(detections, image_rgb.shape, add_padding)
 
-    for idx, (*xyxy, conf, cls) in enumerate(detections):
-        xmin, ymin, xmax, ymax = map(int, xyxy)
-        width, height = xmax - xmin, ymax - ymin
-        
-        # Identify horizontal scales based on width being greater than height
-        if width > height:
-            horizontal_scales.append((xmin, ymin, xmax, ymax))
+    # Annotate a copy so the boxes don't end up in the saved crops
+    annotated_image = image_rgb.copy()
 
     for idx, (xmin, ymin, xmax, ymax) in enumerate(horizontal_scales):
-        if add_padding:
-            padding = 30
-            xmin = max(0, xmin - padding)
-            xmax = min(image_rgb.shape[1], xmax + padding)
-        
         rect_image = image_rgb[ymin:ymax, xmin:xmax]
 
         rect_image_path = os.path.join(output_dir, f'horizontal_scale_{idx}.png')
         cv2.imwrite(rect_image_path, cv2.cvtColor(rect_image, cv2.COLOR_RGB2BGR))
 
         # Annotate the original image with bounding boxes
-        plot_one_box([xmin, ymin, xmax, ymax], image_rgb, color=(255, 0, 0), line_thickness=2)
+        plot_one_box([xmin, ymin, xmax, ymax], annotated_image, color=(255, 0, 0), line_thickness=2)
 
     # Save the annotated image showing all detected horizontal scales
     output_path = os.path.join(output_dir, 'horizontal_scale_annotated.png')
-    cv2.imwrite(output_path, cv2.COLOR_RGB2BGR)
+    cv2.imwrite(output_path, cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR))
+
+    # Boxes in the order of the saved horizontal_scale_<idx>.png images
+    return horizontal_scales
+
+def detect_and_save_horizontal(image_path, model_path="src/models/scale_detector.pt", output_dir=None, add_padding=False, device=None, tiling=None):
+    image = cv2.imread(image_path)
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    # Detect objects in the image using the YOLO model
+    detections = run_model(model_path, image_rgb, device=device, tiling=tiling)
+
+    save_horizontal_scales(image_rgb, detections, output_dir, add_padding)
 
     return True
 
@@ -0,0 +1,31 @@
+import cv2
+import warnings
+from src.detection.helper.model_registry import run_model
+from src.detection.horizontal_scale_detector import save_horizontal_scales
+from src.detection.vertical_scale_detector import save_vertical_scales
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import workspace_dir
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+# Runs the scale detector once and splits its detections into horizontal and vertical scales
+@traced(counts=lambda result: {"horizontal_scales": len(result[0]), "vertical_scales": len(result[1])})
+def detect_scales(image_path, model_path="src/models/scale_detector.pt", horizontal_output_dir=None, vertical_output_dir=None, add_padding=False, device=None, tiling=None):
+    # Without output directories the crops go to the workspace of the current run
+    horizontal_output_dir = horizontal_output_dir or workspace_dir("horizontal_scales")
+    vertical_output_dir = vertical_output_dir or workspace_dir("vertical_scales")
+
+    image = cv2.imread(image_path)
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    detections = run_model(model_path, image_rgb, device=device, tiling=tiling)
+
+    horizontal_scales = save_horizontal_scales(image_rgb, detections, horizontal_output_dir, add_padding)
+    vertical_scales = save_vertical_scales(image_rgb, detections, vertical_output_dir, add_padding)
+
+    # Boxes of the saved horizontal and vertical scale crops
+    return horizontal_scales, vertical_scales
+
+if __name__ == "__main__":
+    image_path = "public/images/Class 1/PDF 3_1.png"
+    detect_scales(image_path, add_padding=True)
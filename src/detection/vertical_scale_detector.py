@@ -1,9 +1,10 @@
 import cv2
-from ultralytics import YOLO
 import os
 import warnings
 import re
+from src.detection.helper.model_registry import run_model
 from src.detection.helper.plot_detections import plot_one_box
+from src.pipeline.workspace import workspace_dir
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
@@ -13,17 +14,8 @@ def get_next_file_number(directory):
     numbers = [int(re.search(r'vertical_scale_(\d+)', f).group(1)) for f in existing_files if re.search(r'vertical_scale_(\d+)', f)]
     return max(numbers) + 1 if numbers else 0
 
-def detect_and_save_vertical(image_path, model_path="src/models/scale_detector.pt", output_dir="public/vertical_scales", add_padding=False):
-
-    model = YOLO(model_path)
-    image = cv2.imread(image_path)
-    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    results = model(image_rgb)
-    detections = results[0].boxes.data.cpu().numpy()
-
-    os.makedirs(output_dir, exist_ok=True)
-
+# Vertical scale boxes as (xmin, ymin, xmax, ymax), optionally padded on every side
+def get_vertical_boxes(detections, image_shape, add_padding=False, padding=30):
     vertical_scales = []
 
     for idx, (*xyxy, conf, cls) in enumerate(detections):
@@ -34,26 +26,45 @@ def detect_and_save_vertical(image_path, model_path="src/models/scale_detector.p
         if height > width:
             vertical_scales.append((xmin, ymin, xmax, ymax))
 
+    # Don't need to add padding in vertical scale generally
+    if add_padding:
+        vertical_scales = [(max(0, xmin - padding), max(0, ymin - padding), min(image_shape[1], xmax + padding), min(image_shape[0], ymax + padding))
+                           for xmin, ymin, xmax, ymax in vertical_scales]
+
+    return vertical_scales
+
+def save_vertical_scales(image_rgb, detections, output_dir=None, add_padding=False):
+    output_dir = output_dir or workspace_dir("vertical_scales")
+    os.makedirs(output_dir, exist_ok=True)
+
+    vertical_scales = get_vertical_boxes(detections, image_rgb.shape, add_padding)
+
     next_file_number = get_next_file_number(output_dir)
 
+    # Annotate a copy so the boxes don't end up in the saved crops
+    annotated_image = image_rgb.copy()
+
     for idx, (xmin, ymin, xmax, ymax) in enumerate(vertical_scales, start=next_file_number):
-        # Don't need to add padding in vertical scale generally
-        if add_padding:
-            padding = 30
-            xmin = max(0, xmin - padding)
-            xmax = min(image_rgb.shape[1], xmax + padding)
-            ymin = max(0, ymin - padding)
-            ymax = min(image_rgb.shape[0], ymax + padding)
-  
         rect_image = image_rgb[ymin:ymax, xmin:xmax]
 
         rect_image_path = os.path.join(output_dir, f'vertical_scale_{idx}.png')
         cv2.imwrite(rect_image_path, cv2.cvtColor(rect_image, cv2.COLOR_RGB2BGR))
 
-        plot_one_box([xmin, ymin, xmax, ymax], image_rgb, color=(0, 255, 0), line_thickness=2)
+        plot_one_box([xmin, ymin, xmax, ymax], annotated_image, color=(0, 255, 0), line_thickness=2)
 
     output_path = os.path.join(output_dir, f'vertical_scale_annotated_{next_file_number}.png')
-    cv2.imwrite(output_path, cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR))
+    cv2.imwrite(output_path, cv2.cvtColor(annotated_image, cv2.COLOR_RGB2BGR))
+
+    # Boxes in the order of the saved vertical_scale_<idx>.png images, numbered from next_file_number
+    return vertical_scales
+
+def detect_and_save_vertical(image_path, model_path="src/models/scale_detector.pt", output_dir=None, add_padding=False, device=None, tiling=None):
+    image = cv2.imread(image_path)
+    image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+    detections = run_model(model_path, image_rgb, device=device, tiling=tiling)
+
+    save_vertical_scales(image_rgb, detections, output_dir, add_padding)
 
     return True
 
@@ -1,9 +1,10 @@
 import cv2
-import easyocr
 import warnings
-from sklearn.cluster import DBSCAN
 import numpy as np
 import re
+from src.data.helper.image_io import save_debug_image
+from src.ocr.ocr_service import get_ocr_service
+from src.pipeline.tracing import count, traced
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
@@ -58,9 +59,37 @@ def parse_text(text):
 
     return "; ".join(parsed_results)
 
-def detect_text(image_path, output_path='text_detections.jpg'):
-    # Initialize EasyOCR reader
-    reader = easyocr.Reader(['en'])  # Specify the languages you want to read
+def recognize_regions(reader, image, boxes):
+    """
+    Recognize the text of every merged box in one batched call, without detecting text again.
+
+    Args:
+        reader (OCRService): OCR service used for recognition.
+        image (numpy.ndarray): Image the boxes belong to.
+        boxes (list): Merged boxes as ((x_min, y_min), (x_max, y_max)).
+
+    Returns:
+        list: The merged text of each box, in the order of boxes.
+    """
+    results = reader.recognize(image, boxes)
+
+    # EasyOCR may reorder the results, so map each one back to the box containing its center
+    box_texts = [[] for _ in boxes]
+    for (bbox, text, prob) in results:
+        center_x = (bbox[0][0] + bbox[2][0]) / 2
+        center_y = (bbox[0][1] + bbox[2][1]) / 2
+        for i, (top_left, bottom_right) in enumerate(boxes):
+            if top_left[0] <= center_x <= bottom_right[0] and top_left[1] <= center_y <= bottom_right[1]:
+                if text.strip():
+                    box_texts[i].append(text)
+                break
+
+    return [" ".join(texts) for texts in box_texts]
+
+@traced(counts=lambda texts: {"texts": len(texts)})
+def detect_text(image_path, output_path=None, ocr=None, batch_recognition=False):
+    # Shared EasyOCR reader, loaded once per process
+    reader = ocr or get_ocr_service()
 
     # Load image
     image = cv2.imread(image_path)
@@ -74,11 +103,17 @@ def detect_text(image_path, output_path='text_detections.jpg'):
         top_left = tuple(map(int, bbox[0]))
         bottom_right = tuple(map(int, bbox[2]))
         boxes.append((top_left, bottom_right))
+    count(ocr_boxes=len(boxes))
+
+    if not boxes:
+        save_debug_image(output_path, image)
+        return []
 
     # Convert to numpy array for DBSCAN
     centers = np.array([( (box[0][0] + box[1][0]) // 2, ( (box[0][1] + box[1][1]) // 2) ) for box in boxes])
 
-    # Perform DBSCAN clustering
+    # Perform DBSCAN clustering, sklearn is slow to import so it is loaded only once there are boxes to cluster
+    from sklearn.cluster import DBSCAN
     db = DBSCAN(eps=50, min_samples=1).fit(centers)
     labels = db.labels_
 
@@ -109,19 +144,26 @@ def detect_text(image_path, output_path='text_detections.jpg'):
         if not is_inside:
             final_boxes.append(merged_boxes[i])
 
+    count(merged_regions=len(final_boxes))
     detected_texts = []
 
-    # Draw final rectangles around detected text and run OCR again on merged areas
-    for (top_left, bottom_right) in final_boxes:
-        # Extract the merged region from the image
-        merged_region = image[int(top_left[1]):int(bottom_right[1]), int(top_left[0]):int(bottom_right[0])]
-        
-        # Run OCR again on the merged region
-        new_results = reader.readtext(merged_region)
-        
-        # Merge the detected text
-        merged_text = " ".join([text for (bbox, text, prob) in new_results if text.strip()])
-        
+    # Run OCR again on the merged areas, before anything is drawn on the image
+    if batch_recognition:
+        merged_texts = recognize_regions(reader, image, final_boxes)
+    else:
+        merged_texts = []
+        for (top_left, bottom_right) in final_boxes:
+            # Extract the merged region from the image
+            merged_region = image[int(top_left[1]):int(bottom_right[1]), int(top_left[0]):int(bottom_right[0])]
+
+            # Run OCR again on the merged region
+            new_results = reader.readtext(merged_region)
+
+            # Merge the detected text
+            merged_texts.append(" ".join([text for (bbox, text, prob) in new_results if text.strip()]))
+
+    # Draw final rectangles around detected text
+    for (top_left, bottom_right), merged_text in zip(final_boxes, merged_texts):
         # Parse the detected text using the parse_text function
         parsed_result = parse_text(merged_text)
         
@@ -140,8 +182,8 @@ def detect_text(image_path, output_path='text_detections.jpg'):
                 'parsed_result': parsed_result
             })
 
-    # Save the output image
-    cv2.imwrite(output_path, image)
+    # Save the output image when a debug output path is given
+    save_debug_image(output_path, image)
 
     return detected_texts
 
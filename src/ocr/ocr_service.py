@@ -0,0 +1,172 @@
+import functools
+import importlib.metadata
+import os
+import threading
+import warnings
+import numpy as np
+from src.data.helper.artifact_store import cached_artifact, file_digest
+
+warnings.filterwarnings("ignore", category=FutureWarning)
+
+_services = {}
+_lock = threading.Lock()
+
+
+class OCRService:
+    """
+    Keeps one EasyOCR reader warm and runs it on single images or batches of crops.
+
+    Args:
+        languages (tuple): Languages passed to easyocr.Reader.
+        gpu (bool, optional): Force GPU on or off. Defaults to EasyOCR's choice.
+        batch_size (int): Number of crops recognized per batch.
+        model_storage_directory (str, optional): Folder of the EasyOCR weights. Defaults to EasyOCR's own folder.
+    """
+
+    def __init__(self, languages=('en',), gpu=None, batch_size=16, model_storage_directory=None):
+        self.languages = list(languages)
+        self.gpu = gpu
+        self.batch_size = batch_size
+        self.model_storage_directory = model_storage_directory
+        self._reader = None
+        self._lock = threading.Lock()
+
+    @property
+    def reader(self):
+        # The detector and recognizer weights are loaded on first use only
+        with self._lock:
+            if self._reader is None:
+                # easyocr pulls in torch, so it is imported with the first reader and not with this module
+                import easyocr
+                options = {}
+                if self.gpu is not None:
+                    options['gpu'] = self.gpu
+                if self.model_storage_directory is not None:
+                    options['model_storage_directory'] = self.model_storage_directory
+                self._reader = easyocr.Reader(self.languages, **options)
+        return self._reader
+
+    def _artifact_key(self, *parts):
+        # Stored results are only reused by the same EasyOCR release running the same weights
+        return (self.languages, easyocr_version(), model_digests(self.model_storage_directory)) + parts
+
+    def readtext(self, image, **kwargs):
+        kwargs.setdefault('batch_size', self.batch_size)
+        if not isinstance(image, np.ndarray):
+            return self.reader.readtext(image, **kwargs)
+
+        # Results of images already read are served from the artifact store without loading the reader
+        return cached_artifact("ocr", self._artifact_key("readtext", image, kwargs),
+                               lambda: self.reader.readtext(image, **kwargs), format="json")
+
+    def readtext_batch(self, images, **kwargs):
+        """
+        Detect and recognize text in a list of crops.
+
+        Crops of similar size are grouped and padded with background to a common shape, so
+        EasyOCR can run them through the network together. Boxes stay in each crop's own coordinates.
+
+        Args:
+            images (list): Crops as numpy arrays (grayscale or BGR).
+
+        Returns:
+            list: One readtext result list per crop, in input order.
+        """
+        results = [[] for _ in images]
+
+        # Sorting by size keeps the padding within each batch small
+        order = sorted((i for i, image in enumerate(images) if image is not None and image.size),
+                       key=lambda i: (images[i].shape[0], images[i].shape[1]))
+
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            height = max(images[i].shape[0] for i in chunk)
+            width = max(images[i].shape[1] for i in chunk)
+            padded = [pad_image(images[i], height, width) for i in chunk]
+
+            batch_results = cached_artifact("ocr", self._artifact_key("readtext_batched", padded, self.batch_size, kwargs),
+                                            lambda: self.reader.readtext_batched(padded, batch_size=self.batch_size, **kwargs),
+                                            format="json")
+            for i, result in zip(chunk, batch_results):
+                results[i] = result
+
+        return results
+
+    def recognize(self, image, boxes, **kwargs):
+        """
+        Recognize text in already located boxes of an image, skipping text detection.
+
+        Args:
+            image (numpy.ndarray): Grayscale or BGR image.
+            boxes (list): Boxes as ((x_min, y_min), (x_max, y_max)).
+
+        Returns:
+            list: readtext style (bbox, text, confidence) results.
+        """
+        if not boxes:
+            return []
+
+        horizontal_list = [[int(x_min), int(x_max), int(y_min), int(y_max)] for (x_min, y_min), (x_max, y_max) in boxes]
+        kwargs.setdefault('batch_size', self.batch_size)
+        return cached_artifact("ocr", self._artifact_key("recognize", image, horizontal_list, kwargs),
+                               lambda: self.reader.recognize(image, horizontal_list=horizontal_list, free_list=[], **kwargs),
+                               format="json")
+
+
+@functools.lru_cache(maxsize=None)
+def easyocr_version():
+    # Read from the package metadata, importing easyocr would pull in torch
+    try:
+        return importlib.metadata.version('easyocr')
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def model_digests(model_storage_directory=None):
+    """
+    Content hashes of the EasyOCR weights, so OCR results stored by other weights are never reused.
+
+    Args:
+        model_storage_directory (str, optional): Folder of the weights. Defaults to the folder EasyOCR downloads to.
+
+    Returns:
+        tuple: (file name, digest) of every file in the folder, empty if it does not exist yet.
+    """
+    if model_storage_directory is None:
+        # Same lookup as easyocr.config
+        module_path = os.environ.get('EASYOCR_MODULE_PATH') or os.environ.get('MODULE_PATH') or os.path.expanduser('~/.EasyOCR/')
+        model_storage_directory = os.path.join(module_path, 'model')
+
+    if not os.path.isdir(model_storage_directory):
+        return ()
+
+    # file_digest remembers the hash of unchanged files, so this only lists the folder on later calls
+    return tuple((name, file_digest(os.path.join(model_storage_directory, name)))
+                 for name in sorted(os.listdir(model_storage_directory))
+                 if os.path.isfile(os.path.join(model_storage_directory, name)))
+
+
+def pad_image(image, height, width, value=255):
+    # Pad at the bottom and right so box coordinates inside the crop stay valid
+    pad_height, pad_width = height - image.shape[0], width - image.shape[1]
+    if not pad_height and not pad_width:
+        return image
+
+    padding = ((0, pad_height), (0, pad_width)) + ((0, 0),) * (image.ndim - 2)
+    return np.pad(image, padding, mode='constant', constant_values=value)
+
+
+def get_ocr_service(languages=('en',), gpu=None):
+    # Process wide OCR service, so every call site shares the same loaded reader
+    key = (tuple(languages), gpu)
+    with _lock:
+        service = _services.get(key)
+        if service is None:
+            service = OCRService(languages, gpu=gpu)
+            _services[key] = service
+    return service
+
+
+def clear_ocr_services():
+    with _lock:
+        _services.clear()
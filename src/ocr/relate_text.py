@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from src.pipeline.workspace import workspace_path
 
 def calculate_distance(center1, center2):
     return np.sqrt((center1[0] - center2[0]) ** 2 + (center1[1] - center2[1]) ** 2)
@@ -10,7 +11,7 @@ def get_center(bbox):
     return (center_x, center_y)
     
 
-def get_relations(image_path, bars, texts, output_path='output_image_relations.jpg'):
+def get_relations(image_path, bars, texts, output_path=None):
     # Load the image
     image = cv2.imread(image_path)
 
@@ -55,8 +56,8 @@ def get_relations(image_path, bars, texts, output_path='output_image_relations.j
         # Draw line connecting bar and text
         cv2.line(image, (int(bar['center'][0]), int(bar['center'][1])), (int(text['center'][0]), int(text['center'][1])), (0, 0, 255), 2)
 
-    # Save or display the image
-    cv2.imwrite(output_path, image)
+    # Save the image, to the workspace of the current run by default
+    cv2.imwrite(output_path or workspace_path('output_image_relations.jpg'), image)
 
 if __name__ == "__main__":
     # Example usage
@@ -0,0 +1,73 @@
+import fitz  # PyMuPDF
+from src.pipeline.tracing import traced
+
+
+@traced(counts=lambda words: {"words": len(words)})
+def get_page_words(page, dpi=450):
+    """
+    Read the embedded text of a PDF page, grouped into lines like EasyOCR groups its detections.
+
+    Args:
+        page (fitz.Page): The page to read.
+        dpi (int): Resolution of the pixel coordinates to return, matching a render of the page at this DPI.
+
+    Returns:
+        list: (x_min, y_min, x_max, y_max, text) tuples in page pixels, in reading order.
+    """
+    zoom = dpi / 72
+    # Text is extracted in unrotated page space, renders are in rotated space
+    transform = page.rotation_matrix * fitz.Matrix(zoom, zoom)
+
+    lines = {}
+    for x0, y0, x1, y1, word, block_no, line_no, _ in page.get_text("words", sort=True):
+        rect = fitz.Rect(x0, y0, x1, y1) * transform
+        key = (block_no, line_no)
+        if key in lines:
+            line_rect, words = lines[key]
+            lines[key] = (line_rect | rect, words + [word])
+        else:
+            lines[key] = (rect, [word])
+
+    return [(rect.x0, rect.y0, rect.x1, rect.y1, " ".join(words)) for rect, words in lines.values()]
+
+
+def has_text_layer(words, min_words=1):
+    # Scanned pages have no embedded text
+    return len(words) >= min_words
+
+
+class TextLayerReader:
+    """
+    Serves the embedded PDF text of one crop through the same interface as OCRService.
+
+    Args:
+        words (list): Output of get_page_words.
+        box (tuple): The crop (x_min, y_min, x_max, y_max) in page pixels.
+        rotate_clockwise (bool): Set when the crop is rotated 90 degrees clockwise before it is read,
+            as get_vertical_scale does.
+    """
+
+    def __init__(self, words, box, rotate_clockwise=False):
+        x_min, y_min, x_max, y_max = box
+        height = y_max - y_min
+        self.results = []
+
+        for wx0, wy0, wx1, wy1, text in words:
+            # Keep words whose center lies inside the crop
+            center_x, center_y = (wx0 + wx1) / 2, (wy0 + wy1) / 2
+            if not (x_min <= center_x <= x_max and y_min <= center_y <= y_max):
+                continue
+
+            left, top, right, bottom = wx0 - x_min, wy0 - y_min, wx1 - x_min, wy1 - y_min
+            if rotate_clockwise:
+                left, top, right, bottom = height - bottom, left, height - top, right
+
+            bbox = [[int(left), int(top)], [int(right), int(top)], [int(right), int(bottom)], [int(left), int(bottom)]]
+            self.results.append((bbox, text, 1.0))
+
+    def readtext(self, image=None, **kwargs):
+        # The image is ignored, the results always cover the whole crop
+        return list(self.results)
+
+    def recognize(self, image, boxes, **kwargs):
+        return list(self.results)
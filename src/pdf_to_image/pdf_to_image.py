@@ -1,41 +1,183 @@
 import fitz  # PyMuPDF
+import numpy as np
 import os
+from src.data.helper.artifact_store import artifact_store_enabled, cached_artifact, cached_file, file_digest
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import workspace_dir
 
-def pdf_to_image(pdf_path, output_dir="public/test-image", dpi=450):
+def _page_source(page):
+    # Content hash of the page's PDF and the page number, None when the store is off or the PDF isn't a file
+    path = page.parent.name
+    if not artifact_store_enabled() or not path or not os.path.isfile(path):
+        return None
+    return file_digest(path), page.number
+
+@traced()
+def render_page(page, output_image_path, dpi=450):
+    def render(path):
+        # Set the zoom factor based on DPI
+        zoom = dpi / 72  # 72 is the default DPI for PDFs
+
+        mat = fitz.Matrix(zoom, zoom)
+        pix = page.get_pixmap(matrix=mat, alpha=False)
+
+        pix.save(path)
+
+    # Renders of unchanged PDFs are copied from the artifact store
+    source = _page_source(page)
+    if source is None:
+        render(output_image_path)
+        return output_image_path
+    return cached_file("pages", (*source, dpi), output_image_path, render)
+
+
+@traced()
+def pdf_to_image(pdf_path, output_dir=None, dpi=450, page_number=0):
     """
-    Converts a one-page PDF to an image while maintaining high quality and preserving the PDF's name.
+    Converts one page of a PDF to an image while maintaining high quality and preserving the PDF's name.
 
     Parameters:
     pdf_path (str): The path to the PDF file.
-    output_dir (str): The directory where the output image will be saved.
-    dpi (int): The resolution of the output image in DPI (dots per inch). Default is 300.
+    output_dir (str, optional): The directory where the output image will be saved. Default is the workspace of the current run.
+    dpi (int): The resolution of the output image in DPI (dots per inch). Default is 450.
+    page_number (int): The page to convert. Default is the first page.
     """
 
     # Open the PDF file
     pdf_document = fitz.open(pdf_path)
     
-    # Ensure the PDF has at least one page
-    if pdf_document.page_count < 1:
-        print('The PDF does not contain any pages.')
+    # Ensure the PDF has the requested page
+    if pdf_document.page_count <= page_number:
+        print('The PDF does not contain enough pages.')
         return
 
-    # Get the first page
-    page = pdf_document.load_page(0)
+    page = pdf_document.load_page(page_number)
 
-    # Set the zoom factor based on DPI
-    zoom = dpi / 72  # 72 is the default DPI for PDFs
+    # Extract the PDF name and change the extension to .png
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    output_dir = output_dir or workspace_dir()
+    output_image_path = os.path.join(output_dir, f"{pdf_name}.png")
 
+    os.makedirs(output_dir, exist_ok=True)
 
-    mat = fitz.Matrix(zoom, zoom)
-    pix = page.get_pixmap(matrix=mat, alpha=False)
+    return render_page(page, output_image_path, dpi)
 
-    # Extract the PDF name and change the extension to .png
+
+@traced()
+def page_to_array(page, dpi=450, clip=None):
+    """
+    Renders a page, or the clip rectangle of it, straight to an RGB numpy array.
+
+    Parameters:
+    page (fitz.Page): The page to render.
+    dpi (int): The resolution to render at.
+    clip (fitz.Rect, optional): Area of the page to render, in PDF points.
+    """
+    def render():
+        zoom = dpi / 72
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+
+        return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n).copy()
+
+    source = _page_source(page)
+    if source is None:
+        return render()
+    return cached_artifact("renders", (*source, dpi, None if clip is None else tuple(clip)), render, format="png")
+
+
+def render_box(page, box, detect_dpi, dpi=450):
+    """
+    Re-renders a box found on a low resolution render of the page at a higher resolution.
+
+    Parameters:
+    page (fitz.Page): The page the box was detected on.
+    box (tuple): (xmin, ymin, xmax, ymax) in pixels of the detect_dpi render.
+    detect_dpi (int): The resolution the box was detected at.
+    dpi (int): The resolution of the returned crop.
+    """
+    scale = 72 / detect_dpi
+    xmin, ymin, xmax, ymax = box
+    clip = fitz.Rect(xmin * scale, ymin * scale, xmax * scale, ymax * scale)
+
+    return page_to_array(page, dpi, clip=clip)
+
+
+class PageRaster:
+    """
+    A page render that is never held in memory as a whole: slicing it, e.g. raster[y0:y1, x0:x1],
+    renders only that window of the page as an RGB array.
+
+    Stands in for the page's RGB array in tiling.predict_tiled, so a large sheet is detected at full
+    resolution with only one batch of tiles in memory.
+
+    Parameters:
+    page (fitz.Page): The page to render. Must stay open while the raster is used.
+    dpi (int): The resolution to render at.
+    """
+
+    def __init__(self, page, dpi=450):
+        self.page = page
+        self.dpi = dpi
+        self._matrix = fitz.Matrix(dpi / 72, dpi / 72)
+        # Interpreted once, every window is rasterized from it
+        self._display_list = page.get_displaylist()
+
+        size = (page.rect * self._matrix).irect
+        self.shape = (size.height, size.width, 3)
+
+    def __getitem__(self, key):
+        rows, columns = key[:2]
+        y0, y1, _ = rows.indices(self.shape[0])
+        x0, x1, _ = columns.indices(self.shape[1])
+
+        zoom = self.dpi / 72
+        clip = fitz.Rect(x0 / zoom, y0 / zoom, x1 / zoom, y1 / zoom)
+        pix = self._display_list.get_pixmap(matrix=self._matrix, clip=clip, alpha=False)
+        window = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+        # Rounding can make the clip a pixel larger or smaller than asked, pad with white to the exact size
+        height, width = y1 - y0, x1 - x0
+        window = window[:height, :width]
+        if window.shape[:2] != (height, width):
+            window = np.pad(window, ((0, height - window.shape[0]), (0, width - window.shape[1]), (0, 0)), constant_values=255)
+        return np.ascontiguousarray(window)
+
+    def __repr__(self):
+        # Stable across runs for unchanged PDFs, so detections on the raster can be keyed in the artifact store
+        source = _page_source(self.page) or (self.page.parent.name, self.page.number)
+        return f"PageRaster({source!r}, {self.dpi})"
+
+
+def get_page_count(pdf_path):
+    with fitz.open(pdf_path) as pdf_document:
+        return pdf_document.page_count
+
+
+def render_pages(pdf_path, output_dir=None, dpi=450, pages=None):
+    """
+    Lazily renders the pages of a PDF, one page at a time.
+
+    Parameters:
+    pdf_path (str): The path to the PDF file.
+    output_dir (str, optional): The directory where the page images will be saved. Default is the workspace of the current run.
+    dpi (int): The resolution of the output images.
+    pages (iterable, optional): Page numbers to render. Default is every page.
+
+    Yields:
+    tuple: The page number and the path of its image.
+    """
     pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
-    output_image_path = os.path.join(output_dir, f"{pdf_name}.png")
+    output_dir = output_dir or workspace_dir()
+    os.makedirs(output_dir, exist_ok=True)
 
-    pix.save(output_image_path)
+    with fitz.open(pdf_path) as pdf_document:
+        if pages is None:
+            pages = range(pdf_document.page_count)
 
-    return output_image_path
+        for page_number in pages:
+            page = pdf_document.load_page(page_number)
+            output_image_path = os.path.join(output_dir, f"{pdf_name}_page_{page_number}.png")
+            yield page_number, render_page(page, output_image_path, dpi)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+import argparse
+import functools
+import glob
+import json
+import os
+import numpy as np
+from src.pipeline.beam_pipeline import analyze_page
+from src.pipeline.document_pipeline import document_key, process_documents
+from src.pipeline.tracing import write_trace
+from src.pipeline.workspace import RunContext
+
+
+def collect_pdfs(inputs):
+    """
+    Expand PDF paths, directories and glob patterns into a sorted list of PDF files.
+    """
+    pdf_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "*.pdf"))
+        else:
+            matches = glob.glob(item)
+        pdf_paths.extend(path for path in matches if path.lower().endswith(".pdf"))
+
+    # Keep the order stable and drop duplicates, also when spelled differently such as ./a.pdf and a.pdf
+    return sorted(set(os.path.normpath(path) for path in pdf_paths))
+
+
+def load_config(config_path):
+    if config_path is None:
+        return {}
+    with open(config_path) as f:
+        return json.load(f)
+
+
+def to_json(value):
+    # Bars and lengths come out of OpenCV and NumPy as numpy scalars and arrays
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def write_document_results(document, output_dir):
+    # Same folder as the document's pages
+    document_dir = os.path.join(output_dir, document_key(document["pdf"]))
+    os.makedirs(document_dir, exist_ok=True)
+
+    results_path = os.path.join(document_dir, "results.json")
+    with open(results_path, "w") as f:
+        json.dump(document, f, indent=2, default=to_json)
+
+    return results_path
+
+
+def run_batch(inputs, config=None, output_dir="public/documents", workers=None, continue_on_error=True,
+              trace_path=None, trace_format="json", trace_memory=False, job_id=None):
+    """
+    Process every beam on every page of the given PDFs without any prompts.
+
+    Args:
+        inputs (list): PDF paths, directories or glob patterns.
+        config (dict, optional): Project config, see beam_pipeline.DEFAULT_CONFIG.
+        output_dir (str): Root folder. Every run gets its own workspace folder in it, so runs started at the same
+            time never share or clear each other's files. Every document gets a sub folder and results.json there.
+        workers (int, optional): Number of worker processes.
+        continue_on_error (bool): Keep going past failing pages and beams.
+        trace_path (str, optional): Write the time, memory and counts of every pipeline stage of the run here.
+        trace_format (str): "json" or "chrome", see tracing.write_trace.
+        trace_memory (bool): Also trace the peak allocations of every stage, which slows the run down.
+        job_id (str, optional): Name of the run's workspace folder. Defaults to a fresh, unique one.
+
+    Returns:
+        dict: Results per document.
+    """
+    pdf_paths = collect_pdfs(inputs)
+    if not pdf_paths:
+        raise ValueError(f"No PDF files found in {inputs}")
+
+    page_function = functools.partial(analyze_page, config=config, continue_on_error=continue_on_error,
+                                      trace=trace_path is not None, trace_memory=trace_memory)
+    with RunContext(output_dir, job_id) as run:
+        documents = process_documents(pdf_paths, run.workspace, workers=workers, page_function=page_function, continue_on_error=continue_on_error)
+
+    # The spans come back with every page, and with the errors of failing pages, gather them into one trace for the run
+    events = []
+    for document in documents.values():
+        for page in document["pages"]:
+            events.extend(page.pop("trace", []))
+        events.extend(document.pop("trace", []))
+    if trace_path is not None:
+        write_trace(trace_path, events, trace_format)
+
+    for document in documents.values():
+        document["results_path"] = write_document_results(document, run.workspace)
+
+    return documents
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Detect beams, bars and columns in structural drawing PDFs.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories of PDFs or glob patterns")
+    parser.add_argument("-c", "--config", help="JSON project config with beam/column colors and scale settings")
+    parser.add_argument("-o", "--output-dir", default="public/documents", help="Folder to write the results to")
+    parser.add_argument("--job-id", help="Name of the run's folder in the output folder (default: a fresh, unique one). "
+                                         "Runs with the same job id share and overwrite their outputs")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--beam-workers", type=int, default=None,
+                        help="Worker processes per page for its beams (default: the config's beam_workers, 1). "
+                             "Use with --workers 1 for single-page drawings with many beams")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop at the first failing page or beam")
+    parser.add_argument("--trace", help="Write the time, memory and counts of every pipeline stage to this JSON file")
+    parser.add_argument("--trace-format", choices=["json", "chrome"], default="json",
+                        help="Trace as spans with a per stage summary, or in the Chrome trace format for chrome://tracing and Perfetto")
+    parser.add_argument("--trace-memory", action="store_true", help="Also trace peak allocations per stage with tracemalloc (slower)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    config = load_config(args.config)
+    if args.beam_workers is not None:
+        config["beam_workers"] = args.beam_workers
+
+    documents = run_batch(args.inputs, config, args.output_dir, args.workers, continue_on_error=not args.fail_fast,
+                          trace_path=args.trace, trace_format=args.trace_format, trace_memory=args.trace_memory,
+                          job_id=args.job_id)
+
+    failed = False
+    for pdf_path, document in documents.items():
+        beams = sum(len(page["beam_results"]) for page in document["pages"])
+        beam_errors = sum(len(page["errors"]) for page in document["pages"])
+        print(f"{pdf_path}: {len(document['pages'])} pages, {beams} beams, "
+              f"{len(document['errors'])} failed pages, {beam_errors} failed beams -> {document['results_path']}")
+        failed = failed or bool(document["errors"]) or bool(beam_errors)
+
+    if args.trace:
+        print(f"Trace written to {args.trace}")
+
+    return 1 if failed else 0
@@ -0,0 +1,344 @@
+import os
+import fitz  # PyMuPDF
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from src.pipeline.document_pipeline import process_page
+from src.detection.detect_roi import create_image_mask, crop_mask_border
+from src.data.clean import clean_mask_image
+from src.data.beam_center import get_center_height, get_center_height_from_lines
+from src.data.bars import get_bars, get_bars_from_lines
+from src.data.column import get_column_data, get_column_data_from_lines
+from src.data.vector_lines import extract_page_segments, is_vector_page, get_vector_lines
+from src.data.data_to_excel import create_excel_file
+from src.data.helper.artifact_store import cached_artifact, configure_artifact_store
+from src.data.helper.color_segmentation import MASK_COLOR_RANGES, segment_colors
+from src.data.helper.image_io import load_image
+from src.scale.get_vertical_scale import get_vertical_scale
+from src.scale.get_horizontal_scale import get_horizontal_scale
+from src.scale.parse_measurement_text import parse_measurement
+from src.ocr.detect_text import detect_text
+from src.ocr.text_layer import get_page_words, has_text_layer, TextLayerReader
+from src.pipeline.tracing import add_events, start_trace, stop_trace, traced
+
+# Settings used when the project config doesn't override them
+DEFAULT_CONFIG = {
+    "beam_color": "red",
+    "column_color": "cyan",
+    "horizontal_scale": {"index": 0, "color": "yellow"},
+    "vertical_scale": {"index": 0, "color": "blue"},
+    "dpi": 450,
+    "add_padding": True,
+    "save_bar_images": False,
+    "tiling": None,
+    "detect_dpi": None,
+    "vector": "auto",
+    "text_layer": "auto",
+    "artifact_dir": None,
+    "artifact_max_mb": 2048,
+    "beam_workers": 1,
+}
+
+# Part of the key of stored beam masks, raised whenever get_beam_masks changes its output
+BEAM_MASKS_VERSION = 2
+
+
+def merge_config(config=None):
+    merged = dict(DEFAULT_CONFIG)
+    for key, value in (config or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+@traced()
+def get_page_scales(page_dir, config, words=None, horizontal_boxes=None, vertical_boxes=None):
+    """
+    Measure the configured horizontal and vertical scale of a page.
+
+    Args:
+        page_dir (str): Output folder of the page, holding the saved scale crops.
+        config (dict): Project config with the scale image index and color.
+        words (list, optional): Embedded text of the page from get_page_words, used instead of OCR.
+        horizontal_boxes, vertical_boxes (list, optional): Page boxes of the scale crops, needed with words.
+
+    Returns:
+        dict: Pixel length and length in inches of both scales.
+    """
+    horizontal, vertical = config["horizontal_scale"], config["vertical_scale"]
+
+    horizontal_reader = vertical_reader = None
+    if words is not None:
+        # Same errors as the checks on the saved crops below, so the batch errors name the missing scale
+        if not 0 <= int(vertical["index"]) < len(vertical_boxes):
+            raise ValueError(f"Vertical scale {vertical['index']} not found in {page_dir}")
+        if not 0 <= int(horizontal["index"]) < len(horizontal_boxes):
+            raise ValueError(f"Horizontal scale {horizontal['index']} not found in {page_dir}")
+
+        horizontal_reader = TextLayerReader(words, horizontal_boxes[int(horizontal["index"])])
+        # get_vertical_scale reads its crop rotated clockwise
+        vertical_reader = TextLayerReader(words, vertical_boxes[int(vertical["index"])], rotate_clockwise=True)
+
+    vertical_result = get_vertical_scale(vertical["index"], vertical["color"], ocr=vertical_reader,
+                                         scale_dir=os.path.join(page_dir, "vertical_scales"), detect_quotes=words is None)
+    if vertical_result is None:
+        raise ValueError(f"Vertical scale {vertical['index']} not found in {page_dir}")
+    vertical_line_length, vertical_scale_text = vertical_result
+
+    # get_horizontal_scale has no check of its own for a missing crop
+    horizontal_dir = os.path.join(page_dir, "horizontal_scales")
+    if not os.path.isfile(os.path.join(horizontal_dir, f"horizontal_scale_{horizontal['index']}.png")):
+        raise ValueError(f"Horizontal scale {horizontal['index']} not found in {page_dir}")
+
+    horizontal_line_length, horizontal_scale_text = get_horizontal_scale(horizontal["index"], horizontal["color"], ocr=horizontal_reader,
+                                                                         scale_dir=horizontal_dir, detect_quotes=words is None)
+
+    if not vertical_line_length or not vertical_scale_text:
+        raise ValueError("Could not measure the vertical scale")
+    if not horizontal_line_length or not horizontal_scale_text:
+        raise ValueError("Could not measure the horizontal scale")
+
+    return {
+        "vertical_line_length": vertical_line_length,
+        "vertical_scale_in_inches": parse_measurement(vertical_scale_text[0][0]),
+        "horizontal_line_length": horizontal_line_length,
+        "horizontal_scale_in_inches": parse_measurement(horizontal_scale_text[0][0]),
+    }
+
+
+def get_beam_masks(beam_image, beam_color, column_color):
+    # One HSV pass labels every color the stages need, each mask is sliced from the label map
+    segmentation = segment_colors(beam_image, [beam_color, column_color, "red", "cyan"])
+
+    # Cleaning works on the masked image, so it only sees the labels of the pixels the color mask kept
+    beam_segmentation = crop_mask_border(segmentation.masked(segmentation.mask(beam_color)))
+    column_segmentation = crop_mask_border(segmentation.masked(segmentation.mask(column_color)))
+
+    coloured_beam = clean_mask_image(create_image_mask(beam_image, beam_color, segmentation=segmentation),
+                                     segmentation=beam_segmentation)
+    coloured_column = clean_mask_image(create_image_mask(beam_image, column_color, segmentation=segmentation),
+                                       type="column", segmentation=column_segmentation)
+    return coloured_beam, coloured_column
+
+
+@traced()
+def analyze_beam(beam_image_path, scales, config, output_dir, vector_lines=None, text_reader=None):
+    """
+    Run mask -> clean -> center -> bars -> column -> text on one beam crop.
+
+    Args:
+        beam_image_path (str): Path of the beam crop.
+        scales (dict): Result of get_page_scales for the beam's page.
+        config (dict): Project config.
+        output_dir (str): Folder for the beam's outputs.
+        vector_lines (dict, optional): "beam" and "column" lines read from the PDF drawing. When given,
+            the masking and line detection are skipped.
+        text_reader (TextLayerReader, optional): Embedded PDF text of the beam, used instead of OCR.
+
+    Returns:
+        dict: Bars, column data and detected texts of the beam.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    if vector_lines is not None:
+        center_height = get_center_height_from_lines(vector_lines["column"])
+        bar_info = get_bars_from_lines(vector_lines["beam"], center_height) if len(vector_lines["beam"]) else []
+        column_info = get_column_data_from_lines(vector_lines["column"], center_height,
+                                                 scales["horizontal_line_length"], scales["horizontal_scale_in_inches"])
+    else:
+        # The beam is loaded once and passed between the stages as an array
+        beam_image = load_image(beam_image_path)
+
+        beam_color, column_color = config["beam_color"].lower(), config["column_color"].lower()
+        # Both masks have the crop's shape, so they are stored stacked as one image
+        masks = cached_artifact("masks", (beam_image, beam_color, column_color, MASK_COLOR_RANGES, BEAM_MASKS_VERSION),
+                                lambda: np.concatenate(get_beam_masks(beam_image, beam_color, column_color)), format="png")
+        coloured_beam, coloured_column = np.split(masks, 2)
+
+        center_height = get_center_height(coloured_column)
+
+        bar_output_dir = os.path.join(output_dir, "bars") if config["save_bar_images"] else None
+        bar_info = get_bars(beam_image_path, coloured_beam, center_height,
+                            scales["horizontal_line_length"], scales["horizontal_scale_in_inches"],
+                            scales["vertical_line_length"], scales["vertical_scale_in_inches"],
+                            output_dir=bar_output_dir)
+        column_info = get_column_data(coloured_column, center_height,
+                                      scales["horizontal_line_length"], scales["horizontal_scale_in_inches"],
+                                      output_path=os.path.join(output_dir, "column_data.png"))
+
+    create_excel_file(column_info, filename=os.path.join(output_dir, "column_data.xlsx"))
+
+    # The text layer already has the merged regions' text, so only the batched lookup path applies to it
+    text_info = detect_text(beam_image_path, output_path=os.path.join(output_dir, "text_detections.jpg"),
+                            ocr=text_reader, batch_recognition=text_reader is not None)
+
+    return {
+        "beam": beam_image_path,
+        "output_dir": output_dir,
+        "source": "vector" if vector_lines is not None else "raster",
+        "center_height": center_height,
+        "bars": bar_info,
+        "columns": column_info,
+        "texts": text_info,
+    }
+
+
+def analyze_page(pdf_path, page_number, output_dir=None, config=None, continue_on_error=True, trace=False, trace_memory=False):
+    """
+    Detect everything on a page and analyze every beam found on it.
+
+    The page writes to <output_dir>/<document key>/page_<n>, output_dir defaults to the workspace of the current run.
+
+    Failing beams are recorded in the page's "errors" when continue_on_error is set,
+    otherwise the first failure is raised. With trace the spans of every traced stage run
+    for the page are returned in the page's "trace", see tracing.write_trace. A failing page
+    raises with the spans recorded up to the failure in the exception's "trace" attribute.
+    """
+    if not trace:
+        return _analyze_page(pdf_path, page_number, output_dir, config, continue_on_error)
+
+    # Pages run in worker processes, so every page records its own spans and hands them back with its result
+    start_trace(memory=trace_memory)
+    try:
+        page = _analyze_page(pdf_path, page_number, output_dir, config, continue_on_error, trace, trace_memory)
+    except Exception as e:
+        # Exception attributes are pickled with it, so the spans of a failing page reach the caller too
+        e.trace = stop_trace()
+        raise
+    except BaseException:
+        stop_trace()
+        raise
+    page["trace"] = stop_trace()
+    return page
+
+
+def _analyze_beam_task(beam_image_path, scales, config, output_dir, vector_lines, text_reader, trace, trace_memory):
+    # Runs in a beam worker, which records its own spans and hands them back with the result
+    configure_artifact_store(config["artifact_dir"], config["artifact_max_mb"])
+    if not trace:
+        return analyze_beam(beam_image_path, scales, config, output_dir, vector_lines, text_reader), []
+
+    start_trace(memory=trace_memory)
+    try:
+        result = analyze_beam(beam_image_path, scales, config, output_dir, vector_lines, text_reader)
+    except Exception as e:
+        e.trace = stop_trace()
+        raise
+    except BaseException:
+        stop_trace()
+        raise
+    return result, stop_trace()
+
+
+def analyze_beams(jobs, workers=1, continue_on_error=True, trace=False, trace_memory=False):
+    """
+    Run analyze_beam for every beam of a page, on a pool of worker processes when workers is above 1.
+
+    Args:
+        jobs (list): (beam name, analyze_beam arguments) per beam.
+        workers (int, optional): Number of beam worker processes, None for the CPU count. 1 runs the beams in this process.
+        continue_on_error (bool): Return failing beams' exceptions in place of their results. Otherwise the first failure is raised.
+        trace, trace_memory (bool): Record the beam workers' spans into this process's trace.
+
+    Returns:
+        list: (beam name, result or exception) in the order of jobs.
+    """
+    results = []
+
+    if workers == 1 or len(jobs) < 2:
+        for beam_name, arguments in jobs:
+            try:
+                results.append((beam_name, analyze_beam(*arguments)))
+            except Exception as e:
+                if not continue_on_error:
+                    raise
+                results.append((beam_name, e))
+        return results
+
+    # The pool lives only as long as the page. A pool kept for later pages would outlive a page worker's
+    # tasks, and the page worker's exit would then wait forever on beam workers that were never shut down
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(beam_name, pool.submit(_analyze_beam_task, *arguments, trace, trace_memory)) for beam_name, arguments in jobs]
+
+        # Collect in submission order, so the results come back in beam order whatever finishes first
+        for beam_name, future in futures:
+            try:
+                result, events = future.result()
+            except Exception as e:
+                # A failing beam hands back the spans it recorded up to the failure with its exception
+                add_events(getattr(e, "trace", []))
+                if not continue_on_error:
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    raise
+                results.append((beam_name, e))
+                continue
+            add_events(events)
+            results.append((beam_name, result))
+
+    return results
+
+
+@traced(name="analyze_page", counts=lambda page: {"beams": len(page["beam_results"]), "failed_beams": len(page["errors"])})
+def _analyze_page(pdf_path, page_number, output_dir, config, continue_on_error, trace=False, trace_memory=False):
+    config = merge_config(config)
+
+    # Renders, detections, masks, line sets and OCR results are kept across runs and workers when a folder is set
+    configure_artifact_store(config["artifact_dir"], config["artifact_max_mb"])
+
+    page = process_page(pdf_path, page_number, output_dir, dpi=config["dpi"], add_padding=config["add_padding"], tiling=config["tiling"], detect_dpi=config["detect_dpi"])
+    page["beam_results"] = []
+    page["errors"] = {}
+
+    # Warn when the configured colors don't show up among the page's prominent colors
+    page["warnings"] = [f"{config[key]} not among the page colors {page['colors']}"
+                        for key in ("beam_color", "column_color")
+                        if config[key].lower().title() not in page["colors"]]
+
+    # Read the line work and text straight from the PDF when the page has them, scanned pages use raster and OCR
+    segments = words = None
+    if config["vector"] or config["text_layer"]:
+        with fitz.open(pdf_path) as pdf_document:
+            pdf_page = pdf_document.load_page(page_number)
+            if config["vector"]:
+                segments, segment_colors = extract_page_segments(pdf_page, page["dpi"])
+                if config["vector"] == "auto" and not is_vector_page(segments):
+                    segments = None
+            if config["text_layer"]:
+                words = get_page_words(pdf_page, page["dpi"])
+                if config["text_layer"] == "auto" and not has_text_layer(words):
+                    words = None
+    page["source"] = "vector" if segments is not None else "raster"
+    page["text_source"] = "text_layer" if words is not None else "ocr"
+
+    scales = get_page_scales(page["output_dir"], config, words, page["horizontal_scale_boxes"], page["vertical_scale_boxes"])
+    page["scales"] = scales
+
+    # Each beam writes to its own results/<beam name> folder, so beams can run in any order or process
+    jobs = []
+    for idx, beam_image_path in enumerate(page["beams"]):
+        beam_name = os.path.splitext(os.path.basename(beam_image_path))[0]
+        try:
+            vector_lines = None
+            if segments is not None:
+                box = page["beam_boxes"][idx]
+                vector_lines = {
+                    "beam": get_vector_lines(segments, segment_colors, box, config["beam_color"].lower()),
+                    "column": get_vector_lines(segments, segment_colors, box, config["column_color"].lower()),
+                }
+            text_reader = TextLayerReader(words, page["beam_boxes"][idx]) if words is not None else None
+        except Exception as e:
+            if not continue_on_error:
+                raise
+            page["errors"][beam_name] = repr(e)
+            continue
+        jobs.append((beam_name, (beam_image_path, scales, config, os.path.join(page["output_dir"], "results", beam_name),
+                                 vector_lines, text_reader)))
+
+    for beam_name, result in analyze_beams(jobs, config["beam_workers"], continue_on_error, trace, trace_memory):
+        if isinstance(result, Exception):
+            page["errors"][beam_name] = repr(result)
+        else:
+            page["beam_results"].append(result)
+
+    return page
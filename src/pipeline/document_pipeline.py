@@ -0,0 +1,253 @@
+import hashlib
+import os
+import re
+import cv2
+import fitz  # PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.pdf_to_image.pdf_to_image import PageRaster, get_page_count, render_pages, page_to_array, render_box
+from src.detection.beam_segmentor import detect_beams, split_beam_detections
+from src.detection.scale_detector import detect_scales
+from src.detection.horizontal_scale_detector import get_horizontal_boxes
+from src.detection.vertical_scale_detector import get_vertical_boxes
+from src.detection.helper.model_registry import run_model
+from src.detection.color_comp import get_colors
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import current_run, safe_name
+
+
+def list_images(directory):
+    if not os.path.isdir(directory):
+        return []
+    # Natural order, so beam_10 comes after beam_9
+    files = [f for f in os.listdir(directory) if f.endswith('.png')]
+    files.sort(key=lambda f: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', f)])
+    return [os.path.join(directory, f) for f in files]
+
+
+def document_key(pdf_path):
+    """
+    Folder name of a document: its path without the extension, plus a short hash of its absolute path.
+
+    PDFs with the same file name in different folders, e.g. a/S-101.pdf and b/S-101.pdf,
+    get different folders, so their pages never share or clear each other's outputs.
+    """
+    parts = [part for part in os.path.splitext(os.path.normpath(pdf_path))[0].split(os.sep) if part not in ("", ".", "..")]
+    name = safe_name("_".join(parts))[-80:]
+    digest = hashlib.blake2b(os.path.abspath(pdf_path).encode(), digest_size=4).hexdigest()
+    return f"{name}-{digest}"
+
+
+def page_output_dir(output_dir, pdf_path, page_number):
+    # Every page gets its own namespace so workers never share output folders
+    return os.path.join(output_dir, document_key(pdf_path), f"page_{page_number}")
+
+
+def save_crops(page, boxes, detect_dpi, dpi, output_dir, prefix):
+    # Re-render every box from the PDF at full resolution and save it like the detectors do
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Remove crops left over from a previous run
+    for file in os.listdir(output_dir):
+        if file.startswith(f"{prefix}_"):
+            os.remove(os.path.join(output_dir, file))
+
+    for idx, box in enumerate(boxes):
+        crop = render_box(page, box, detect_dpi, dpi)
+        cv2.imwrite(os.path.join(output_dir, f"{prefix}_{idx}.png"), cv2.cvtColor(crop, cv2.COLOR_RGB2BGR))
+
+
+# Resolution of the page image kept for the color check when the detectors read their tiles straight from the PDF
+PREVIEW_DPI = 150
+
+
+@traced()
+def detect_coarse_to_fine(pdf_path, page_number, page_dir, detect_dpi=150, dpi=450, add_padding=True, tiling=None,
+                          beam_model_path="src/models/beam_detector.pt", scale_model_path="src/models/scale_detector.pt"):
+    """
+    Detect beams and scales on a low resolution render, then render only the detected boxes at full resolution.
+
+    The crops are saved to the same folders detect_beams and detect_scales use, so the per beam stages
+    work on them unchanged.
+
+    With tiling the detectors render their tiles straight from the PDF (see PageRaster), so the detect_dpi
+    render is never held whole and detect_dpi can be as high as dpi: memory is bounded by the tile batch,
+    the crops and a PREVIEW_DPI page image for the color check.
+
+    Returns:
+        tuple: Path of the low resolution page image, the page's RGB array at that resolution and the beam,
+        horizontal scale and vertical scale boxes at full resolution.
+    """
+    with fitz.open(pdf_path) as pdf_document:
+        page = pdf_document.load_page(page_number)
+        if tiling:
+            detect_image = PageRaster(page, detect_dpi)
+            preview_dpi = min(detect_dpi, PREVIEW_DPI)
+            image_rgb = page_to_array(page, preview_dpi)
+        else:
+            detect_image = image_rgb = page_to_array(page, detect_dpi)
+            preview_dpi = detect_dpi
+
+        beam_detections = run_model(beam_model_path, detect_image, tiling=tiling)
+        scale_detections = run_model(scale_model_path, detect_image, tiling=tiling)
+
+        beams, beam_vertical_scales = split_beam_detections(beam_detections)
+
+        # The padding is given in full resolution pixels
+        padding = 30 * detect_dpi / dpi
+        beams = [(x, y, x + width, y + height) for x, y, width, height in beams]
+        vertical_scales = [(x, y, x + width, y + height) for x, y, width, height in beam_vertical_scales]
+        vertical_scales += get_vertical_boxes(scale_detections, detect_image.shape, add_padding, padding)
+        horizontal_scales = get_horizontal_boxes(scale_detections, detect_image.shape, add_padding, padding)
+
+        save_crops(page, beams, detect_dpi, dpi, os.path.join(page_dir, 'Beams'), 'beam')
+        save_crops(page, vertical_scales, detect_dpi, dpi, os.path.join(page_dir, 'vertical_scales'), 'vertical_scale')
+        save_crops(page, horizontal_scales, detect_dpi, dpi, os.path.join(page_dir, 'horizontal_scales'), 'horizontal_scale')
+
+    pdf_name = os.path.splitext(os.path.basename(pdf_path))[0]
+    image_path = os.path.join(page_dir, f"{pdf_name}_page_{page_number}_{preview_dpi}dpi.png")
+    cv2.imwrite(image_path, cv2.cvtColor(image_rgb, cv2.COLOR_RGB2BGR))
+
+    scale = dpi / detect_dpi
+    beam_boxes, horizontal_boxes, vertical_boxes = [[tuple(int(round(value * scale)) for value in box) for box in boxes]
+                                                     for boxes in (beams, horizontal_scales, vertical_scales)]
+
+    return image_path, image_rgb, beam_boxes, horizontal_boxes, vertical_boxes
+
+
+@traced(counts=lambda page: {"beams": len(page["beams"])})
+def process_page(pdf_path, page_number, output_dir=None, dpi=450, add_padding=True, tiling=None, detect_dpi=None):
+    """
+    Render one page of a PDF and run the page level detection stages on it.
+
+    Args:
+        pdf_path (str): Path to the PDF.
+        page_number (int): Page to process.
+        output_dir (str, optional): Root folder, the page writes to <output_dir>/<document key>/page_<n>, see document_key.
+            Defaults to the workspace of the current run.
+        dpi (int): Render resolution.
+        add_padding (bool): Pad the scale crops.
+        tiling (dict, optional): Run the detectors on overlapping tiles, see model_registry.run_model. Tiling only
+            bounds memory together with detect_dpi; without it the page is rendered whole at dpi for the detectors.
+        detect_dpi (int, optional): Detect on a render at this resolution and only render the detected boxes at dpi.
+
+    Returns:
+        dict: Paths of the page image, beam and scale crops, their boxes in page pixels and the most prominent colors.
+    """
+    page_dir = page_output_dir(output_dir or current_run().workspace, pdf_path, page_number)
+
+    if detect_dpi is not None:
+        image_path, image_rgb, beam_boxes, horizontal_boxes, vertical_boxes = detect_coarse_to_fine(pdf_path, page_number, page_dir, detect_dpi, dpi, add_padding, tiling)
+        colors, _ = get_colors(image_rgb, sample_error=0.001)
+    else:
+        _, image_path = next(render_pages(pdf_path, page_dir, dpi, pages=[page_number]))
+
+        beam_rects, beam_vertical_rects = detect_beams(image_path, output_dir=page_dir, tiling=tiling)
+        beam_boxes = [(x, y, x + width, y + height) for x, y, width, height in beam_rects]
+        horizontal_boxes, vertical_boxes = detect_scales(image_path,
+                                                         horizontal_output_dir=os.path.join(page_dir, 'horizontal_scales'),
+                                                         vertical_output_dir=os.path.join(page_dir, 'vertical_scales'),
+                                                         add_padding=add_padding,
+                                                         tiling=tiling)
+        # detect_beams saves its vertical scales first, the scale detector numbers its own after them
+        vertical_boxes = [(x, y, x + width, y + height) for x, y, width, height in beam_vertical_rects] + vertical_boxes
+
+        colors, _ = get_colors(image_path, sample_error=0.001)
+
+    return {
+        'page': page_number,
+        'output_dir': page_dir,
+        'image_path': image_path,
+        'dpi': dpi,
+        'beam_boxes': beam_boxes,
+        'horizontal_scale_boxes': horizontal_boxes,
+        'vertical_scale_boxes': vertical_boxes,
+        'beams': list_images(os.path.join(page_dir, 'Beams')),
+        'horizontal_scales': list_images(os.path.join(page_dir, 'horizontal_scales')),
+        'vertical_scales': list_images(os.path.join(page_dir, 'vertical_scales')),
+        'colors': colors,
+    }
+
+
+def _record_page_error(document, page_number, error):
+    document['errors'][page_number] = repr(error)
+    # Pages traced by beam_pipeline.analyze_page raise with the spans recorded up to the failure
+    events = getattr(error, 'trace', None)
+    if events:
+        document.setdefault('trace', []).extend(events)
+
+
+def process_documents(pdf_paths, output_dir=None, workers=None, page_function=process_page, continue_on_error=True, **page_kwargs):
+    """
+    Process every page of several PDFs on a shared pool of worker processes.
+
+    Pages are handed to the workers as (pdf path, page number) so each worker renders
+    its own page; images are never sent between processes. Models and OCR readers are
+    loaded once per worker and reused for every page it handles.
+
+    Args:
+        pdf_paths (list): PDFs to process.
+        output_dir (str, optional): Root output folder. Defaults to the workspace of the current run.
+        workers (int, optional): Number of worker processes. Defaults to the CPU count, 1 runs in process.
+        page_function (callable): Function run for every page, called as page_function(pdf_path, page_number, output_dir, **page_kwargs).
+        continue_on_error (bool): Record failing pages and keep going. Otherwise the first failure is raised.
+
+    Returns:
+        dict: For every PDF, its page results in page order and the pages that failed.
+            A PDF that can't be opened has its error under 'document' instead. Spans that failing pages
+            raise with, see beam_pipeline.analyze_page, are gathered in the document's 'trace'.
+    """
+    # Resolved here, worker processes don't know the caller's run
+    output_dir = output_dir or current_run().workspace
+
+    documents = {pdf_path: {'pdf': pdf_path, 'pages': [], 'errors': {}} for pdf_path in pdf_paths}
+    tasks = []
+    for pdf_path in pdf_paths:
+        # An unreadable PDF fails on its own instead of the whole batch
+        try:
+            page_count = get_page_count(pdf_path)
+        except Exception as e:
+            if not continue_on_error:
+                raise
+            documents[pdf_path]['errors']['document'] = repr(e)
+            continue
+        tasks.extend((pdf_path, page_number) for page_number in range(page_count))
+
+    if workers == 1:
+        for pdf_path, page_number in tasks:
+            try:
+                documents[pdf_path]['pages'].append(page_function(pdf_path, page_number, output_dir, **page_kwargs))
+            except Exception as e:
+                if not continue_on_error:
+                    raise
+                _record_page_error(documents[pdf_path], page_number, e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(page_function, pdf_path, page_number, output_dir, **page_kwargs): (pdf_path, page_number)
+                for pdf_path, page_number in tasks
+            }
+            for future in as_completed(futures):
+                pdf_path, page_number = futures[future]
+                try:
+                    documents[pdf_path]['pages'].append(future.result())
+                except Exception as e:
+                    if not continue_on_error:
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        raise
+                    _record_page_error(documents[pdf_path], page_number, e)
+
+    # Merge the page results of every document back into page order
+    for document in documents.values():
+        document['pages'].sort(key=lambda page: page['page'])
+
+    return documents
+
+
+def process_document(pdf_path, output_dir=None, workers=None, **page_kwargs):
+    return process_documents([pdf_path], output_dir, workers, **page_kwargs)[pdf_path]
+
+
+if __name__ == "__main__":
+    result = process_document("test_pdf.pdf")
+    for page in result['pages']:
+        print(f"Page {page['page']}: {len(page['beams'])} beams, colors: {page['colors']}")
@@ -0,0 +1,262 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows has no getrusage, peak RSS is not reported there
+    resource = None
+
+# Spans recorded in this process while a trace is running, None when tracing is off
+_events = None
+_lock = threading.Lock()
+_settings = {"memory": False}
+# Open spans of the current thread, innermost last
+_local = threading.local()
+
+MB = 1024 * 1024
+
+
+def peak_rss_mb():
+    # High water mark of the resident set size of this process
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / MB if sys.platform == "darwin" else peak / 1024
+
+
+def start_trace(memory=False):
+    """
+    Starts recording a span for every traced function called in this process.
+
+    Args:
+        memory (bool): Also measure the peak Python and NumPy allocations of every span with tracemalloc.
+            This slows the traced code down noticeably.
+    """
+    global _events
+    with _lock:
+        _events = []
+        _settings["memory"] = memory
+
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop_trace():
+    """
+    Stops recording and returns the spans recorded since start_trace, in the order they finished.
+    """
+    global _events
+    with _lock:
+        events, _events = _events or [], None
+
+    if _settings["memory"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _settings["memory"] = False
+
+    return events
+
+
+def is_tracing():
+    return _events is not None
+
+
+def add_events(events):
+    # Adds spans recorded in another process, e.g. a beam worker, to the running trace
+    with _lock:
+        if _events is not None:
+            _events.extend(events)
+
+
+def _describe(value):
+    # Arrays are described by their shape, collections by their length, paths and numbers as they are
+    if hasattr(value, "shape") and hasattr(value, "dtype"):
+        return {"shape": list(value.shape), "dtype": str(value.dtype)}
+    if isinstance(value, (list, tuple, dict)):
+        return {"len": len(value)}
+    if isinstance(value, (str, int, float, bool)) and not (isinstance(value, str) and len(value) > 256):
+        return value
+    return None
+
+
+def _open_span(name, inputs):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    span = {
+        "name": name,
+        "pid": os.getpid(),
+        "tid": threading.get_native_id(),
+        "depth": len(stack),
+        "start": time.time(),
+        "inputs": inputs,
+        "counts": {},
+        "_wall": time.perf_counter(),
+        "_cpu": time.process_time(),
+    }
+
+    if _settings["memory"] and tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        # The peak is reset for every span, so hand the enclosing span what it has seen so far
+        if stack:
+            stack[-1]["_peak"] = max(stack[-1]["_peak"], peak)
+        tracemalloc.reset_peak()
+        span["_memory"], span["_peak"] = current, current
+
+    stack.append(span)
+    return span
+
+
+def _close_span(span):
+    stack = _local.stack
+    stack.pop()
+
+    span["wall_s"] = time.perf_counter() - span.pop("_wall")
+    span["cpu_s"] = time.process_time() - span.pop("_cpu")
+    span["peak_rss_mb"] = peak_rss_mb()
+
+    if "_memory" in span:
+        if tracemalloc.is_tracing():
+            peak = max(tracemalloc.get_traced_memory()[1], span["_peak"])
+            if stack:
+                stack[-1]["_peak"] = max(stack[-1].get("_peak", 0), peak)
+            span["alloc_peak_mb"] = (peak - span["_memory"]) / MB
+        del span["_memory"], span["_peak"]
+
+    with _lock:
+        if _events is not None:
+            _events.append(span)
+
+
+def count(**values):
+    """
+    Adds to the counts of the innermost running span, e.g. count(ocr_boxes=12). Does nothing when not tracing.
+    """
+    stack = getattr(_local, "stack", None)
+    if _events is None or not stack:
+        return
+
+    counts = stack[-1]["counts"]
+    for key, value in values.items():
+        counts[key] = counts.get(key, 0) + value
+
+
+def traced(name=None, counts=None):
+    """
+    Decorator recording a span for every call while a trace is running.
+
+    A span holds the wall and CPU time of the call, the process peak RSS after it, the peak allocations
+    during it when memory tracing is on, the sizes of the arguments and counts of the result.
+    Without a running trace the function is called directly.
+
+    Args:
+        name (str, optional): Span name, the function name by default.
+        counts (callable, optional): Maps the return value to a dict of counts, e.g. detections found.
+    """
+    def decorator(function):
+        span_name = name or function.__name__
+        parameter_names = list(inspect.signature(function).parameters)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return function(*args, **kwargs)
+
+            inputs = {}
+            for key, value in list(zip(parameter_names, args)) + list(kwargs.items()):
+                description = _describe(value)
+                if description is not None:
+                    inputs[key] = description
+
+            span = _open_span(span_name, inputs)
+            try:
+                result = function(*args, **kwargs)
+                if counts is not None:
+                    for key, value in counts(result).items():
+                        span["counts"][key] = span["counts"].get(key, 0) + value
+                return result
+            except Exception as e:
+                span["error"] = repr(e)
+                raise
+            finally:
+                _close_span(span)
+
+        return wrapper
+
+    return decorator
+
+
+def summarize(events):
+    """
+    Totals per span name: calls, wall and CPU time, highest peak RSS and allocations, summed counts.
+    """
+    summary = {}
+    for event in events:
+        entry = summary.setdefault(event["name"], {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": None, "counts": {}})
+        entry["calls"] += 1
+        entry["wall_s"] += event["wall_s"]
+        entry["cpu_s"] += event["cpu_s"]
+        if event["peak_rss_mb"] is not None:
+            entry["peak_rss_mb"] = max(entry["peak_rss_mb"] or 0, event["peak_rss_mb"])
+        if "alloc_peak_mb" in event:
+            entry["alloc_peak_mb"] = max(entry.get("alloc_peak_mb", 0), event["alloc_peak_mb"])
+        for key, value in event["counts"].items():
+            entry["counts"][key] = entry["counts"].get(key, 0) + value
+
+    # Slowest first
+    return dict(sorted(summary.items(), key=lambda item: item[1]["wall_s"], reverse=True))
+
+
+def to_chrome_trace(events):
+    # Complete ("X") events in microseconds, one row per process and thread in chrome://tracing or Perfetto
+    trace_events = []
+    for event in events:
+        args = {key: value for key, value in event.items()
+                if key not in ("name", "pid", "tid", "start", "wall_s", "depth")}
+        trace_events.append({
+            "name": event["name"],
+            "cat": "pipeline",
+            "ph": "X",
+            "ts": event["start"] * 1e6,
+            "dur": event["wall_s"] * 1e6,
+            "pid": event["pid"],
+            "tid": event["tid"],
+            "args": args,
+        })
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def write_trace(path, events, format="json"):
+    """
+    Writes recorded spans to a file.
+
+    Args:
+        path (str): Output file.
+        events (list): Spans from stop_trace, possibly gathered from several processes.
+        format (str): "json" for the spans with a per stage summary, "chrome" for the Chrome trace event format.
+
+    Returns:
+        str: The path written.
+    """
+    if format == "chrome":
+        content = to_chrome_trace(events)
+    elif format == "json":
+        content = {"summary": summarize(events), "events": sorted(events, key=lambda event: event["start"])}
+    else:
+        raise ValueError(f"Unknown trace format {format}, use 'json' or 'chrome'")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w") as f:
+        json.dump(content, f, indent=2, default=str)
+
+    return path
@@ -0,0 +1,145 @@
+import atexit
+import functools
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+# Folder the workspaces of runs without an explicit root are created in
+DEFAULT_ROOT = "public/runs"
+
+# Runs entered with `with` in the current thread, innermost last
+_local = threading.local()
+_lock = threading.Lock()
+# Workspace of code running outside any run, created on first use, one per process and removed when it exits
+_default = {"run": None}
+
+
+class RunContext:
+    """
+    Workspace of one job, e.g. a batch run or a single page. Every stage writes its images,
+    crops and spreadsheets below it, so jobs running at the same time on one machine never
+    share, or clear, each other's folders.
+
+    Stages use the innermost run entered with `with RunContext(...)` in the current thread,
+    see current_run. Threads started inside a run don't see it, hand them their work through
+    wrap so they enter it too. Worker processes get the paths they write to from their caller.
+
+    Args:
+        root (str, optional): Folder the workspace is created in. Defaults to DEFAULT_ROOT.
+        job_id (str, optional): Name of the workspace folder. When not given a fresh, unique folder
+            is created, so two jobs can never end up with the same workspace.
+        keep (bool): Keep the workspace when the run is left. Otherwise it is deleted with everything in it.
+    """
+
+    def __init__(self, root=None, job_id=None, keep=True):
+        root = root or DEFAULT_ROOT
+        os.makedirs(root, exist_ok=True)
+
+        if job_id is None:
+            # mkdtemp creates the folder atomically, so concurrent jobs always get different ones
+            self.workspace = tempfile.mkdtemp(prefix=time.strftime("%Y%m%d-%H%M%S-"), dir=root)
+        else:
+            self.workspace = os.path.join(root, safe_name(job_id))
+            os.makedirs(self.workspace, exist_ok=True)
+
+        self.job_id = os.path.basename(self.workspace)
+        self.keep = keep
+        self.pid = os.getpid()
+        # Threads currently inside the run, the workspace of a run that is not kept goes with the last one
+        self._entries = 0
+
+    def path(self, *parts):
+        # Path inside the workspace, the folders leading up to it are created
+        path = os.path.join(self.workspace, *parts)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return path
+
+    def directory(self, *parts):
+        # Folder inside the workspace, created if missing
+        path = os.path.join(self.workspace, *parts)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def cleanup(self):
+        shutil.rmtree(self.workspace, ignore_errors=True)
+
+    def wrap(self, function):
+        """
+        Returns function made to run inside this run in whatever thread calls it,
+        e.g. executor.submit(run.wrap(process_page), pdf_path, page_number).
+        """
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        with _lock:
+            self._entries += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        _local.stack.remove(self)
+        with _lock:
+            self._entries -= 1
+            last = not self._entries
+        if last and not self.keep:
+            self.cleanup()
+        return False
+
+    def __repr__(self):
+        return f"RunContext({self.workspace!r})"
+
+
+def safe_name(name):
+    # Folder name for a job or document name, without path separators or other special characters
+    name = re.sub(r"[^\w.\- ]+", "_", str(name)).strip(" .")
+    return name or "job"
+
+
+def current_run():
+    """
+    Returns the innermost run entered in this thread.
+
+    Code running outside any run shares one workspace per process, created below DEFAULT_ROOT on first use
+    and removed when the process exits. Pass output folders or enter a RunContext to keep what a job writes.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack:
+        return stack[-1]
+
+    with _lock:
+        run = _default["run"]
+        # A forked worker inherits the parent's default run, it gets its own
+        if run is None or run.pid != os.getpid():
+            run = _default["run"] = RunContext(keep=False)
+    return run
+
+
+@atexit.register
+def _remove_default_run():
+    # Only the process that created the default run removes it, never a forked child holding a copy
+    run = _default["run"]
+    if run is not None and run.pid == os.getpid() and not run.keep:
+        run.cleanup()
+
+
+def workspace_path(*parts):
+    # Path inside the workspace of the current run
+    return current_run().path(*parts)
+
+
+def workspace_dir(*parts):
+    # Folder inside the workspace of the current run
+    return current_run().directory(*parts)
@@ -1,24 +1,15 @@
 import cv2
-import numpy as np
-import easyocr
 import warnings
 import os
+from src.data.helper.color_segmentation import SCALE_COLOR_RANGES as COLOR_RANGES, segment_colors
+from src.data.helper.line_detection import detect_hough
+from src.ocr.ocr_service import get_ocr_service
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import workspace_dir
 
 # Suppress FutureWarnings
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-# Define HSV color ranges for different colors
-COLOR_RANGES = {
-    "red": ((0, 50, 50), (10, 255, 255)),
-    "green": ((40, 50, 50), (80, 255, 255)),
-    "blue": ((100, 50, 50), (140, 255, 255)),
-    "yellow": ((20, 50, 50), (30, 255, 255)),
-    "cyan": ((80, 50, 50), (100, 255, 255)),
-    "magenta": ((140, 50, 50), (170, 255, 255)),
-    "orange": ((10, 50, 50), (20, 255, 255)),
-    "purple": ((130, 50, 50), (160, 255, 255)),
-    "black": ((0, 0, 0), (180, 255, 50)),
-}
 
 def preprocess_image(image, color_name):
     """
@@ -34,9 +25,7 @@ def preprocess_image(image, color_name):
     if color_name.lower() not in COLOR_RANGES:
         raise ValueError(f"Unsupported color name '{color_name}'. Supported colors: {list(COLOR_RANGES.keys())}")
 
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    lower_bound, upper_bound = COLOR_RANGES[color_name.lower()]
-    mask = cv2.inRange(hsv_image, lower_bound, upper_bound)
+    mask = segment_colors(image, [color_name.lower()], COLOR_RANGES).mask(color_name.lower())
     result = cv2.bitwise_and(image, image, mask=mask)
     grayscale_result = cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
 
@@ -59,11 +48,8 @@ def find_longest_horizontal_line(processed_image, text_bounding_boxes):
     # Determine the minimum y-coordinate below which to search for lines
     min_y = max([box[2][1] for box in text_bounding_boxes], default=0)
     
-    # Perform edge detection
-    edges = cv2.Canny(processed_image, 50, 150)
-
-    # Use HoughLinesP for line detection
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=width//4, maxLineGap=20)
+    # Use HoughLinesP on the edges for line detection
+    lines = detect_hough(processed_image, threshold=50, min_line_length=width//4, max_line_gap=20, steps=(("canny", 50, 150),))
 
     # Copy of the original image to draw lines on
     lines_image = cv2.cvtColor(processed_image, cv2.COLOR_GRAY2BGR)
@@ -95,17 +81,18 @@ def find_longest_horizontal_line(processed_image, text_bounding_boxes):
 
     return longest_line, max_len
 
-def read_text(image):
+def read_text(image, ocr=None):
     """
     Read text from an image using EasyOCR.
 
     Args:
         image (numpy.ndarray): Image from which to read text.
+        ocr (OCRService, optional): OCR service to use. Defaults to the shared one.
 
     Returns:
         list: List of text detection results.
     """
-    reader = easyocr.Reader(['en'])
+    reader = ocr or get_ocr_service()
     results = reader.readtext(image)
     return results
 
@@ -119,8 +106,7 @@ def detect_symbols(roi):
     Returns:
         str: Detected symbol, either '"' or "'".
     """
-    edges = cv2.Canny(roi, 50, 150)
-    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=20, minLineLength=10, maxLineGap=3)
+    lines = detect_hough(roi, threshold=20, min_line_length=10, max_line_gap=3, steps=(("canny", 50, 150),))
 
     if lines is not None:
         if len(lines) == 2:
@@ -129,25 +115,29 @@ def detect_symbols(roi):
             return "'"
     return ""
 
-def get_horizontal_scale(image_path, scale_color):
+@traced()
+def get_horizontal_scale(image_path, scale_color, ocr=None, scale_dir=None, detect_quotes=True):
     """
     Process an image to find and annotate the longest horizontal line and text information.
 
     Args:
         image_path (str): Path to the image file.
         scale_color (str): Color of the horizontal scale in the image.
+        ocr (OCRService, optional): OCR service to use. Defaults to the shared one.
+        scale_dir (str, optional): Folder the horizontal scale images were saved to. Defaults to the one in the workspace of the current run.
+        detect_quotes (bool): Recover the foot/inch marks OCR tends to miss. Not needed for embedded PDF text.
 
     Returns:
         tuple: Length of the longest line and detected text information.
     """
-    image_path = f"public/horizontal_scales/horizontal_scale_{image_path}.png"
+    image_path = os.path.join(scale_dir or workspace_dir("horizontal_scales"), f"horizontal_scale_{image_path}.png")
     image = cv2.imread(image_path)
 
     # Preprocess the image
     processed_image, _ = preprocess_image(image, scale_color)
 
     # Read text from the processed image
-    text_results = read_text(processed_image)
+    text_results = read_text(processed_image, ocr)
 
     detected_texts = []
     text_bounding_boxes = []
@@ -167,7 +157,7 @@ def get_horizontal_scale(image_path, scale_color):
             roi = processed_image[expanded_top_left[1]:expanded_bottom_right[1], expanded_top_left[0]:expanded_bottom_right[0]]
 
             # Detect symbols in the ROI
-            symbol = detect_symbols(roi)
+            symbol = detect_symbols(roi) if detect_quotes else ""
 
             if symbol:
                 if text[-1] in {'"', "'"}:
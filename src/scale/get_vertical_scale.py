@@ -1,30 +1,20 @@
 import cv2
-import numpy as np
-import easyocr
 import warnings
 import os
+from src.data.helper.color_segmentation import SCALE_COLOR_RANGES as COLOR_RANGES, segment_colors
+from src.data.helper.line_detection import detect_hough, detect_lsd
+from src.ocr.ocr_service import get_ocr_service
+from src.pipeline.tracing import traced
+from src.pipeline.workspace import workspace_dir
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
-COLOR_RANGES = {
-    "red": ((0, 50, 50), (10, 255, 255)),  # Red hue range
-    "green": ((40, 50, 50), (80, 255, 255)),  # Green hue range
-    "blue": ((100, 50, 50), (140, 255, 255)),  # Blue hue range
-    "yellow": ((20, 50, 50), (30, 255, 255)),  # Yellow hue range
-    "cyan": ((80, 50, 50), (100, 255, 255)),  # Cyan hue range
-    "magenta": ((140, 50, 50), (170, 255, 255)),  # Magenta hue range
-    "orange": ((10, 50, 50), (20, 255, 255)),  # Orange hue range
-    "purple": ((130, 50, 50), (160, 255, 255)),  # Purple hue range
-    "black": ((0, 0, 0), (180, 255, 50)),  # Black hue range
-}
 
 def preprocess_image(image, color_name):
     if color_name.lower() not in COLOR_RANGES:
         raise ValueError(f"Unsupported color name '{color_name}'. Supported colors: {list(COLOR_RANGES.keys())}")
 
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    lower_bound, upper_bound = COLOR_RANGES[color_name.lower()]
-    mask = cv2.inRange(hsv_image, lower_bound, upper_bound)
+    mask = segment_colors(image, [color_name.lower()], COLOR_RANGES).mask(color_name.lower())
     
     if color_name.lower() == "black":
         mask = cv2.bitwise_not(mask)  # Invert the mask for black to keep non-black areas
@@ -37,8 +27,7 @@ def preprocess_image(image, color_name):
 
 def find_longest_vertical_line(processed_image, original_image, line_color):
     processed_image, _ = preprocess_image(original_image, line_color)
-    lsd = cv2.createLineSegmentDetector(0)
-    lines = lsd.detect(processed_image)[0]
+    lines = detect_lsd(processed_image)
 
     if lines is None:
         return None, None
@@ -66,11 +55,8 @@ def find_longest_vertical_line(processed_image, original_image, line_color):
 
 
 def detect_symbols(roi):
-    # Use edge detection
-    edges = cv2.Canny(roi, 50, 150)
-    
-    # Use Hough Line Transform to detect line
-    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=15, minLineLength=5, maxLineGap=3)
+    # Use Hough Line Transform on the edges to detect line
+    lines = detect_hough(roi, threshold=15, min_line_length=5, max_line_gap=3, steps=(("canny", 50, 150),))
 
     if lines is not None:
         if len(lines) == 2:
@@ -80,8 +66,9 @@ def detect_symbols(roi):
     return ""
 
 
-def get_vertical_scale(image_path, scale_color):
-    image_path = f"public/vertical_scales/vertical_scale_{image_path}.png"
+@traced()
+def get_vertical_scale(image_path, scale_color, ocr=None, scale_dir=None, detect_quotes=True):
+    image_path = os.path.join(scale_dir or workspace_dir("vertical_scales"), f"vertical_scale_{image_path}.png")
     original_image = cv2.imread(image_path)
 
     original_image = cv2.imread(image_path)
@@ -104,8 +91,8 @@ def get_vertical_scale(image_path, scale_color):
     else:
         print("No vertical line detected.")
     
-    # Initialize EasyOCR reader
-    reader = easyocr.Reader(['en'])
+    # Shared EasyOCR reader, loaded once per process
+    reader = ocr or get_ocr_service()
     
     # Perform OCR on the image
     results = reader.readtext(grayscale_image)
@@ -125,8 +112,8 @@ def get_vertical_scale(image_path, scale_color):
         # Extract the ROI
         roi = grayscale_image[expanded_top_left[1]:expanded_bottom_right[1], expanded_top_left[0]:expanded_bottom_right[0]]
 
-        # Detect symbols
-        symbol = detect_symbols(roi)
+        # Detect symbols, embedded PDF text already has them
+        symbol = detect_symbols(roi) if detect_quotes else ""
 
         if symbol:
             if text[-1] in {'"', "'"}:
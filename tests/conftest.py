@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules import each other as src.<package>, so the repo root has to be importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,49 @@
+import cv2
+import numpy as np
+import pytest
+from src.data.clean import clean_mask_image
+from src.detection.detect_roi import create_image_mask
+from src.pipeline.beam_pipeline import get_beam_masks
+
+COLORS_BGR = {"red": (0, 0, 255), "cyan": (255, 255, 0), "green": (0, 160, 0), "black": (0, 0, 0)}
+
+
+def sequential_masks(beam_image, beam_color, column_color):
+    # The chain get_beam_masks replaced: every stage segments its own input image
+    coloured_beam = clean_mask_image(create_image_mask(beam_image, beam_color))
+    coloured_column = clean_mask_image(create_image_mask(beam_image, column_color), type="column")
+    return coloured_beam, coloured_column
+
+
+def beam_image(seed):
+    """
+    White crop with broken horizontal bars, verticals and text-like strokes in red, cyan and other colors,
+    some of them crossing, so cleaning has lines to reconnect in every color.
+    """
+    rng = np.random.default_rng(seed)
+    image = np.full((240, 420, 3), 255, np.uint8)
+    for _ in range(40):
+        color = COLORS_BGR[rng.choice(list(COLORS_BGR))]
+        x, y = int(rng.integers(0, 400)), int(rng.integers(0, 230))
+        if rng.random() < 0.6:
+            # Horizontal bar with small gaps for the closing to bridge
+            end = min(419, x + int(rng.integers(30, 300)))
+            for start in range(x, end, 40):
+                cv2.line(image, (start, y), (min(end, start + int(rng.integers(28, 40))), y), color, int(rng.integers(1, 4)))
+        else:
+            cv2.line(image, (x, y), (x + int(rng.integers(-5, 5)), min(239, y + int(rng.integers(10, 80)))), color, 2)
+    # Anti-aliased text leaves pixels of mixed colors
+    cv2.putText(image, "2-20 (B)", (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 1.2, COLORS_BGR["red"], 2, cv2.LINE_AA)
+    cv2.putText(image, "8q 6\"C/C", (200, 200), cv2.FONT_HERSHEY_SIMPLEX, 1.0, COLORS_BGR["cyan"], 2, cv2.LINE_AA)
+    return image
+
+
+@pytest.mark.parametrize("beam_color, column_color", [("red", "cyan"), ("cyan", "red"), ("red", "red"), ("cyan", "cyan")])
+@pytest.mark.parametrize("seed", range(5))
+def test_get_beam_masks_matches_sequential_chain(seed, beam_color, column_color):
+    image = beam_image(seed)
+    expected_beam, expected_column = sequential_masks(image, beam_color, column_color)
+    coloured_beam, coloured_column = get_beam_masks(image, beam_color, column_color)
+
+    np.testing.assert_array_equal(coloured_beam, expected_beam)
+    np.testing.assert_array_equal(coloured_column, expected_column)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from src.benchmark.generator import PAGE_SIZES, ground_truth, layout_sheet, score_bars
+
+
+def bar_spacings(layout):
+    # Smallest distance between neighbouring bars of the same side of each beam, in pixels at the layout DPI
+    to_px = layout["dpi"] / 72
+    spacings = []
+    for beam in layout["beams"]:
+        for steel in ("Top Steel", "Bottom Steel"):
+            ys = sorted(bar["y"] for bar in beam["bars"] if bar["type"] == steel)
+            spacings.extend(np.diff(ys) * to_px)
+    return spacings
+
+
+@pytest.mark.parametrize("bars, bars_per_beam, page_size", [
+    (1, 8, "a4"),
+    (100, 8, "a1"),
+    (10000, 8, "a0"),
+    (10000, 16, "a0"),
+    (10000, 4, "a1"),
+])
+def test_layout_places_every_bar_apart_on_the_page(bars, bars_per_beam, page_size):
+    layout = layout_sheet(bars=bars, bars_per_beam=bars_per_beam, page_size=page_size)
+    width, height = PAGE_SIZES[page_size]
+
+    assert sum(len(beam["bars"]) for beam in layout["beams"]) == bars
+    assert min(bar_spacings(layout), default=12) >= 12 - 1e-6
+
+    boxes = np.array([beam["box"] for beam in layout["beams"]])
+    assert boxes[:, [0, 1]].min() >= 0
+    assert boxes[:, 2].max() <= width and boxes[:, 3].max() <= height
+
+    # Beams are in disjoint grid cells
+    a, b = boxes[:, None], boxes[None]
+    overlap = (np.minimum(a[..., 2], b[..., 2]) > np.maximum(a[..., 0], b[..., 0])) & \
+              (np.minimum(a[..., 3], b[..., 3]) > np.maximum(a[..., 1], b[..., 1]))
+    assert overlap.sum() == len(boxes)
+
+
+@pytest.mark.parametrize("bars, bars_per_beam, page_size", [(10000, 8, "a1"), (10000, 4, "a4"), (200, 200, "a4")])
+def test_layout_rejects_sheets_too_dense_for_the_page(bars, bars_per_beam, page_size):
+    with pytest.raises(ValueError):
+        layout_sheet(bars=bars, bars_per_beam=bars_per_beam, page_size=page_size)
+
+
+def test_layout_is_reproducible_from_its_seed():
+    assert ground_truth(layout_sheet(bars=50, seed=3)) == ground_truth(layout_sheet(bars=50, seed=3))
+    assert ground_truth(layout_sheet(bars=50, seed=3)) != ground_truth(layout_sheet(bars=50, seed=4))
+
+
+def test_score_bars_matches_within_tolerance_and_offset():
+    expected = [{"horizontal_bar": [100, 50, 400, 50]}, {"horizontal_bar": [100, 80, 300, 80]}]
+    # Detections in the coordinates of a crop at (90, 40), one drawn right to left, one spurious
+    predicted = [
+        {"horizontal_bar": [312, 10, 12, 10]},
+        {"horizontal_bar": [10, 42, 205, 42]},
+        {"horizontal_bar": [10, 200, 100, 200]},
+    ]
+
+    score = score_bars(predicted, expected, offset=(90, 40), tolerance=10)
+    assert score == {"matched": 2, "precision": 2 / 3, "recall": 1.0}
+
+    assert score_bars(predicted, expected, tolerance=10)["matched"] == 0
+    assert score_bars([], expected) == {"matched": 0, "precision": 1.0, "recall": 0.0}
+
+
+def test_score_bars_matches_each_expected_bar_once():
+    expected = [{"horizontal_bar": [0, 0, 100, 0]}]
+    predicted = [{"horizontal_bar": [0, 0, 100, 0]}, {"horizontal_bar": [2, 0, 98, 0]}]
+
+    assert score_bars(predicted, expected) == {"matched": 1, "precision": 0.5, "recall": 1.0}
@@ -0,0 +1,110 @@
+import random
+import pytest
+from src.data.helper.line_processing import merge_line_chains, remove_duplicate_lines
+
+
+def recursive_remove_duplicate_lines(lines, max_distance=20, max_y_diff=15, is_horizontal=True):
+    # The recursive merge merge_line_chains replaced, kept as the reference for its output
+    def merge_lines(lines, merged_lines):
+        for line in lines:
+            x1, y1, x2, y2 = line
+            merged = False
+            for i, merged_line in enumerate(merged_lines):
+                x3, y3, x4, y4 = merged_line
+
+                if is_horizontal:
+                    if ((abs(x1 - x4) < max_distance and abs(y1 - y4) < max_y_diff) or
+                        (abs(x2 - x3) < max_distance and abs(y2 - y3) < max_y_diff)):
+                        merged_lines[i] = [min(x1, x3), y1, max(x2, x4), y2]
+                        merged = True
+                        break
+                else:
+                    if ((abs(x1 - x3) < max_y_diff and abs(y1 - y3) < max_distance) or
+                        (abs(x2 - x4) < max_y_diff and abs(y2 - y4) < max_distance)):
+                        merged_lines[i] = [x1, min(y1, y3), x2, max(y2, y4)]
+                        merged = True
+                        break
+
+            if not merged:
+                merged_lines.append([x1, y1, x2, y2])
+
+        return merged_lines
+
+    merged_lines = merge_lines(lines, [])
+    if len(lines) == len(merged_lines):
+        return merged_lines
+    return recursive_remove_duplicate_lines(merged_lines, max_distance, max_y_diff, is_horizontal)
+
+
+def random_lines(seed, is_horizontal, count=120):
+    """
+    Lines along a few rows (columns for vertical lines) made of chains whose pieces touch, overlap or
+    leave small gaps, with reversed endpoints, offsets around the tolerance and some isolated lines.
+    Coordinates are on a half pixel grid so distances land exactly on the tolerances too.
+    """
+    rng = random.Random(seed)
+    lines = []
+    rows = [rng.uniform(0, 400) for _ in range(rng.randint(1, 6))]
+
+    while len(lines) < count:
+        if rng.random() < 0.1:
+            # Isolated line anywhere
+            start, offset = rng.uniform(0, 1000), rng.uniform(0, 400)
+            end = start + rng.uniform(1, 200)
+            start_offset, end_offset = offset, offset + rng.uniform(-5, 5)
+        else:
+            # Next piece of a chain along one of the rows
+            row = rng.choice(rows)
+            start = rng.uniform(0, 1000)
+            for _ in range(rng.randint(1, 5)):
+                end = start + rng.uniform(5, 150)
+                start_offset, end_offset = row + rng.uniform(-18, 18), row + rng.uniform(-18, 18)
+                lines.append(_line(rng, start, end, start_offset, end_offset, is_horizontal))
+                # Touching (0), overlapping (< 0) or with a gap around max_distance (> 0)
+                start = end + rng.choice([0, rng.uniform(-40, 0), rng.uniform(0, 30)])
+            continue
+        lines.append(_line(rng, start, end, start_offset, end_offset, is_horizontal))
+
+    rng.shuffle(lines)
+    return lines[:count]
+
+
+def _line(rng, start, end, start_offset, end_offset, is_horizontal):
+    start, end, start_offset, end_offset = (round(value * 2) / 2 for value in (start, end, start_offset, end_offset))
+    # LSD reports the two edges of a stroke in opposite directions
+    if rng.random() < 0.4:
+        start, end, start_offset, end_offset = end, start, end_offset, start_offset
+    if is_horizontal:
+        return [start, start_offset, end, end_offset]
+    return [start_offset, start, end_offset, end]
+
+
+@pytest.mark.parametrize("is_horizontal", [True, False])
+@pytest.mark.parametrize("max_distance, max_offset", [(20, 15), (15, 10)])
+@pytest.mark.parametrize("seed", range(40))
+def test_merge_line_chains_matches_recursive_merge(seed, max_distance, max_offset, is_horizontal):
+    lines = random_lines(seed, is_horizontal)
+    expected = recursive_remove_duplicate_lines([list(line) for line in lines], max_distance, max_offset, is_horizontal)
+    # The line sets are built to need merging, otherwise the comparison would prove little
+    assert len(expected) < len(lines)
+    assert merge_line_chains(lines, max_distance, max_offset, is_horizontal) == expected
+
+
+@pytest.mark.parametrize("is_horizontal", [True, False])
+def test_remove_duplicate_lines_matches_recursive_merge(is_horizontal):
+    lines = random_lines(1234, is_horizontal, count=400)
+    assert remove_duplicate_lines(lines, is_horizontal=is_horizontal) == recursive_remove_duplicate_lines(lines, is_horizontal=is_horizontal)
+
+
+def test_merge_line_chains_merges_chains():
+    # Touching pieces of a row merge, while a reversed piece only joins at its own start and end like before,
+    # and a far row stays apart
+    lines = [[0, 100, 50, 100], [50, 102, 120, 101], [200, 99, 110, 100], [0, 300, 40, 300]]
+    expected = [[0, 102, 120, 101], [200, 99, 110, 100], [0, 300, 40, 300]]
+    assert recursive_remove_duplicate_lines(lines) == expected
+    assert merge_line_chains(lines) == expected
+
+
+def test_merge_line_chains_empty():
+    assert merge_line_chains([]) == []
+    assert merge_line_chains([], is_horizontal=False) == []
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from src.detection.helper.tiling import fuse_detections, iter_tiles, predict_tiled
+
+
+def label_detector(padding=3):
+    """
+    Stand-in detector for images whose objects are painted with their own value in the first channel:
+    one class 0 box per value, padded like the loose boxes a real detector gives, clipped to the crop.
+    """
+    def predict_batch(crops):
+        results = []
+        for crop in crops:
+            labels = crop[:, :, 0]
+            detections = []
+            for value in np.unique(labels[labels > 0]):
+                ys, xs = np.nonzero(labels == value)
+                detections.append([max(0, xs.min() - padding), max(0, ys.min() - padding),
+                                   min(crop.shape[1], xs.max() + 1 + padding), min(crop.shape[0], ys.max() + 1 + padding), 0.9, 0])
+            results.append(np.array(detections, dtype=np.float32).reshape(-1, 6))
+        return results
+    return predict_batch
+
+
+def sorted_boxes(detections):
+    return sorted(tuple(int(value) for value in box[:4]) for box in detections)
+
+
+def test_stacked_objects_across_a_seam_stay_apart():
+    # Two beams on top of each other, both cut by the seams of the three tiles of the row.
+    # Their padded boxes overlap by a few pixels, yet they are two objects
+    image = np.zeros((1000, 2400, 3), dtype=np.uint8)
+    image[100:400, 100:2000, 0] = 1
+    image[400:700, 100:2000, 0] = 2
+    assert len(list(iter_tiles(1000, 2400, 1280, 256))) == 3
+
+    detections = predict_tiled(label_detector(), image, tile_size=1280, overlap=256)
+
+    assert sorted_boxes(detections) == [(97, 97, 2003, 403), (97, 397, 2003, 703)]
+
+
+def test_object_across_a_seam_is_fused():
+    image = np.zeros((1000, 2400, 3), dtype=np.uint8)
+    image[300:600, 200:2200, 0] = 1
+    # A small object inside the overlap band is seen whole by both tiles
+    image[800:850, 1150:1250, 0] = 2
+
+    detections = predict_tiled(label_detector(padding=0), image, tile_size=1280, overlap=256)
+
+    assert sorted_boxes(detections) == [(200, 300, 2200, 600), (1150, 800, 1250, 850)]
+
+
+def test_object_across_four_tiles_is_fused():
+    image = np.zeros((2400, 2400, 3), dtype=np.uint8)
+    image[1000:1400, 1000:1400, 0] = 1
+
+    detections = predict_tiled(label_detector(padding=0), image, tile_size=1280, overlap=256)
+
+    assert sorted_boxes(detections) == [(1000, 1000, 1400, 1400)]
+
+
+def test_seam_needs_different_tiles():
+    # The stacked boxes from the review, both flagged as cut on their right, in the same tile
+    detections = np.array([[100, 100, 1500, 400, 0.9, 0], [100, 397, 1500, 700, 0.9, 0]], dtype=np.float32)
+    windows = np.array([[0, 0, 1500, 1500]] * 2)
+    sides = np.array([[False, False, True, False]] * 2)
+
+    assert len(fuse_detections(detections, windows, sides)) == 2
+
+
+def red_detector(crops):
+    # One class 0 box around the red pixels of every crop
+    results = []
+    for crop in crops:
+        ys, xs = np.nonzero((crop[:, :, 0] > 200) & (crop[:, :, 1] < 80) & (crop[:, :, 2] < 80))
+        if len(xs) == 0:
+            results.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+        results.append(np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9, 0]], dtype=np.float32))
+    return results
+
+
+def test_page_raster_tiles_match_the_full_render():
+    fitz = pytest.importorskip("fitz")
+    from src.pdf_to_image.pdf_to_image import PageRaster, page_to_array
+
+    with fitz.open() as document:
+        page = document.new_page(width=1190, height=842)
+        page.draw_rect(fitz.Rect(100, 300, 1000, 340), color=(1, 0, 0), fill=(1, 0, 0))
+
+        full = page_to_array(page, 150)
+        raster = PageRaster(page, 150)
+        assert raster.shape == full.shape
+
+        window = raster[100:700, 500:1800]
+        assert window.shape == (600, 1300, 3)
+        assert np.abs(window.astype(int) - full[100:700, 500:1800]).max() <= 2
+
+        tiled = predict_tiled(red_detector, raster, tile_size=640, overlap=128)
+        expected = predict_tiled(red_detector, full, tile_size=640, overlap=128)
+        assert len(tiled) == len(expected) == 1
+        assert np.abs(tiled[:, :4] - expected[:, :4]).max() <= 1
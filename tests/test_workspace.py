@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.pipeline.workspace import RunContext, current_run
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_threads_see_the_run_they_are_handed(tmp_path):
+    with RunContext(str(tmp_path), "job") as run, ThreadPoolExecutor(2) as executor:
+        assert executor.submit(run.wrap(current_run)).result() is run
+        # Runs are per thread, a thread not handed the run falls back to the default one
+        assert executor.submit(current_run).result() is not run
+        assert current_run() is run
+
+
+def test_run_not_kept_is_removed_after_the_last_thread_leaves(tmp_path):
+    run = RunContext(str(tmp_path), "job", keep=False)
+    entered, release = threading.Event(), threading.Event()
+
+    def work():
+        entered.set()
+        release.wait(5)
+        return run.path("page", "result.txt")
+
+    with ThreadPoolExecutor(1) as executor:
+        with run:
+            future = executor.submit(run.wrap(work))
+            entered.wait(5)
+        assert os.path.isdir(run.workspace)
+
+        release.set()
+        assert future.result().startswith(run.workspace)
+    assert not os.path.exists(run.workspace)
+
+
+def test_default_run_is_removed_when_its_process_exits(tmp_path):
+    script = "from src.pipeline.workspace import current_run; print(current_run().directory('pages'))"
+    output = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": REPO_ROOT})
+
+    workspace = os.path.join(tmp_path, output.stdout.strip())
+    assert workspace.startswith(os.path.join(tmp_path, "public", "runs"))
+    assert not os.path.exists(workspace)
+    assert os.listdir(os.path.join(tmp_path, "public", "runs")) == []